@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Append-only Activity Store
+Segmented JSONL log with size-based rotation and a bounded retention window
+"""
+
+import fcntl
+import json
+import os
+import threading
+
+from atomic_store import write_bytes
+
+SEGMENT_BYTES = 4 * 1024 * 1024   # Rotate after ~4 MB
+MAX_SEGMENTS = 8                  # Retention window (oldest segments are dropped)
+SEGMENT_PREFIX = 'activity-'
+SEGMENT_SUFFIX = '.jsonl'
+TAIL_BLOCK = 64 * 1024
+
+
+class ActivityStore:
+    """Append-only activity log split into numbered JSONL segments.
+
+    Appends are single O_APPEND writes of one line, so concurrent writers
+    (threads or processes) never interleave partial records. Rotation and
+    retention run under an advisory lock on the directory.
+    """
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS,
+                 legacy_file=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.legacy_file = legacy_file
+        self._lock = threading.Lock()
+        self._fd = None
+        self._segment = None
+
+    # -------------------- segments --------------------
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f'{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}')
+
+    def segments(self):
+        """Segment numbers on disk, oldest first"""
+        numbers = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return numbers
+        for name in names:
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        numbers.sort()
+        return numbers
+
+    def _dir_lock(self):
+        fd = os.open(os.path.join(self.directory, '.lock'), os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _dir_unlock(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _open_active(self):
+        """Open the newest segment (creating the first one if needed)"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock_fd = self._dir_lock()
+        try:
+            numbers = self.segments()
+            if not numbers:
+                self._import_legacy()
+                numbers = self.segments() or [1]
+            self._switch_to(numbers[-1])
+        finally:
+            self._dir_unlock(lock_fd)
+
+    def _switch_to(self, number):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._segment = number
+        self._fd = os.open(self._segment_path(number), os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o644)
+
+    def _rotate(self):
+        """Start a new segment and drop segments outside the retention window"""
+        lock_fd = self._dir_lock()
+        try:
+            numbers = self.segments()
+            newest = numbers[-1] if numbers else self._segment
+            if newest > self._segment:
+                # Another writer already rotated - just follow it
+                self._switch_to(newest)
+                return
+            self._switch_to(newest + 1)
+            numbers.append(newest + 1)
+            for old in numbers[:-self.max_segments]:
+                try:
+                    os.remove(self._segment_path(old))
+                except FileNotFoundError:
+                    pass
+        finally:
+            self._dir_unlock(lock_fd)
+
+    def _import_legacy(self):
+        """One-time conversion of the old indent=2 JSON array into segment 1"""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        try:
+            with open(self.legacy_file, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Activity store: could not import {self.legacy_file}: {e}")
+            return
+        if not isinstance(entries, list):
+            return
+        write_bytes(self._segment_path(1), ''.join(
+            json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries
+        ).encode())
+        os.replace(self.legacy_file, self.legacy_file + '.imported')
+        print(f"📦 Imported {len(entries)} entries from {self.legacy_file}")
+
+    # -------------------- public API --------------------
+
+    def append(self, entry):
+        """Append one entry as a single JSON line"""
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode()
+        with self._lock:
+            if self._fd is None:
+                self._open_active()
+            elif os.fstat(self._fd).st_size >= self.segment_bytes:
+                self._rotate()
+            os.write(self._fd, line)
+
+    def tail(self, n=100):
+        """Last n entries, newest first, reading segments backwards"""
+        entries = []
+        for number in reversed(self.segments()):
+            for line in self._read_lines_backwards(self._segment_path(number)):
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # Torn or corrupt line
+                if len(entries) >= n:
+                    return entries
+        return entries
+
+    def _read_lines_backwards(self, path):
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            position = f.seek(0, os.SEEK_END)
+            remainder = b''
+            while position > 0:
+                step = min(TAIL_BLOCK, position)
+                position -= step
+                f.seek(position)
+                block = f.read(step) + remainder
+                lines = block.split(b'\n')
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    if line:
+                        yield line
+            if remainder:
+                yield remainder
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Atomic JSON State Files
+One crash-safe way to read and write every JSON state file
+
+write_json() writes a temp file in the same directory, fsyncs it and renames
+it over the target, so readers see either the old or the new file, never a
+truncated one. update_json() is read-modify-write under an advisory flock
+(<file>.lock), so processes sharing a file don't lose each other's changes. It
+never overwrites a file it cannot parse: that may be another writer's half-done
+write, and replacing it would lose everything else in the file.
+Files can optionally be stored as zlib-compressed compact JSON; read_json()
+detects the format by its header, so a file can switch formats freely.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+COMPRESSED_MAGIC = b'CJZ1'   # Header of the compressed format
+UNPARSEABLE_RETRIES = 5      # Re-reads of an unparseable file before update_json() gives up
+UNPARSEABLE_PAUSE = 0.1      # Seconds between them
+
+
+class UnparseableFile(ValueError):
+    """update_json() found a file it cannot parse, and left it alone"""
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_bytes(path, data):
+    """Atomically replace path with data (temp file + fsync + rename)"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.tmp.{os.getpid()}.{threading.get_ident()}")
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(directory)  # Make the rename itself durable
+
+
+def encode_json(data, indent=None, compress=False):
+    if compress:
+        return COMPRESSED_MAGIC + zlib.compress(json.dumps(data, separators=(',', ':')).encode(), 6)
+    if indent is None:
+        return json.dumps(data, separators=(',', ':')).encode()
+    return json.dumps(data, indent=indent).encode()
+
+
+def decode_json(raw):
+    if raw.startswith(COMPRESSED_MAGIC):
+        raw = zlib.decompress(raw[len(COMPRESSED_MAGIC):])
+    return json.loads(raw)
+
+
+def write_json(path, data, indent=None, compress=False):
+    """Atomically write data as JSON (compact unless indent is given, or zlib-compressed)"""
+    write_bytes(path, encode_json(data, indent, compress))
+
+
+def _read(path, default):
+    """(data, raw bytes of an unparseable file or None)"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return default, None
+    except OSError as e:
+        print(f"Could not read {path}: {e}")
+        return default, None
+    try:
+        return decode_json(raw), None
+    except (ValueError, zlib.error) as e:
+        print(f"⚠️ {path} could not be parsed ({e})")
+        return default, raw
+
+
+def read_json(path, default=None):
+    """Load a JSON state file; missing, unreadable or unparseable files give default
+
+    Reading never moves or changes the file: it may be caught mid-write by a
+    process that does not use write_json().
+    """
+    return _read(path, default)[0]
+
+
+@contextmanager
+def locked(path, shared=False):
+    """Advisory lock on <path>.lock across processes (and threads)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def update_json(path, update, default=None, indent=None, compress=False):
+    """Locked read-modify-write: update(data) returns the new data (or mutates it)
+
+    An existing file that won't parse is re-read a few times, in case another
+    process is mid-write. If it still won't parse, its bytes are kept in
+    <file>.corrupt and UnparseableFile is raised without writing anything.
+    """
+    with locked(path):
+        data, corrupt = _read(path, default)
+        for _ in range(UNPARSEABLE_RETRIES):
+            if corrupt is None:
+                break
+            time.sleep(UNPARSEABLE_PAUSE)
+            data, corrupt = _read(path, default)
+        if corrupt is not None:
+            write_bytes(path + '.corrupt', corrupt)
+            print(f"⚠️ Left the unparseable {path} alone, copy kept as {path}.corrupt")
+            raise UnparseableFile(f"{path} could not be parsed")
+        result = update(data)
+        if result is not None:
+            data = result
+        write_json(path, data, indent, compress)
+        return data
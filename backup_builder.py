@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Backup Builder
+Consistent online backups streamed as tar.gz (or tar.zst), full or incremental
+
+SQLite databases are copied with the sqlite3 backup API, PAGES_PER_STEP pages
+at a time with a short pause between steps. Writers keep going, and the copy
+is still one consistent snapshot. Other files are copied while being hashed.
+Each member is archived from its staged copy, in a temporary directory,
+because tar needs the size up front and the member must be exactly the bytes
+that were hashed, even if the original is rewritten meanwhile. The tar
+stream is compressed and written as it is produced, to a file or to an HTTP
+response, with at most QUEUE_CHUNKS blocks buffered. An error while writing a
+member aborts the archive rather than leave a truncated one behind.
+
+Every completed backup records path -> (size, mtime, sha256) in
+manifest.json. An incremental backup adds only files whose content hash
+differs from the manifest. Files whose size and mtime are unchanged are
+skipped without being read. The archive carries its own
+BACKUP-MANIFEST.json listing every file, unchanged ones included, so a
+restore can tell what to take from earlier archives.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import queue
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from atomic_store import read_json, write_json
+
+# Try to import zstandard, only needed for .tar.zst archives
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+BACKUP_DIR = '/home/madadmin/clawd/backups'
+MANIFEST_FILE = os.path.join(BACKUP_DIR, 'manifest.json')
+
+# Archive prefix -> directory
+BACKUP_SOURCES = [
+    ('dashboard', '/home/madadmin/clawd/cosmo-dashboard/data'),
+    ('data', '/home/madadmin/clawd/data'),
+]
+
+SKIP_SUFFIXES = ('-wal', '-shm', '-journal', '.lock', '.tmp', '.corrupt')
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+PAGES_PER_STEP = 256     # SQLite pages copied per backup step
+STEP_PAUSE = 0.005       # Seconds between steps, so writers get the lock
+MAX_RESTARTS = 3         # Stepped copies restarted by writers before copying in one step
+BLOCK_SIZE = 1024 * 1024
+QUEUE_CHUNKS = 16        # Compressed blocks buffered between builder and reader
+
+EXTENSIONS = {'gz': '.tar.gz', 'zst': '.tar.zst'}
+
+
+class BackupBusy(Exception):
+    """Another backup is being built"""
+
+
+def _is_sqlite(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(16) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+class _Restarted(Exception):
+    pass
+
+
+def snapshot_sqlite(path, dest, pages=PAGES_PER_STEP, pause=STEP_PAUSE):
+    """Consistent copy of a live database, a few pages at a time
+
+    A write from another connection restarts a stepped backup. If that keeps
+    happening, the copy is redone in one step. In WAL mode that only holds a
+    read snapshot, so writers are not blocked either way.
+    """
+    restarts = []
+
+    def progress(status, remaining, total):
+        if progress.last is not None and remaining > progress.last:
+            restarts.append(remaining)
+            if len(restarts) > MAX_RESTARTS:
+                raise _Restarted()
+        progress.last = remaining
+    progress.last = None
+
+    src = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=5.0)
+    try:
+        for step_pages in (pages, -1):
+            dst = sqlite3.connect(dest)
+            try:
+                src.backup(dst, pages=step_pages, progress=progress, sleep=pause)
+                return
+            except _Restarted:
+                pass
+            finally:
+                dst.close()
+    finally:
+        src.close()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def copy_hashed(path, dest):
+    """Copy path to dest, returning the SHA-256 of exactly the bytes copied"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as src, open(dest, 'wb') as dst:
+        for block in iter(lambda: src.read(BLOCK_SIZE), b''):
+            digest.update(block)
+            dst.write(block)
+    return digest.hexdigest()
+
+
+class _QueueWriter(io.RawIOBase):
+    """File-like sink handing written blocks to a bounded queue"""
+
+    def __init__(self, q, cancelled):
+        self.q = q
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def _put(self):
+        while True:
+            if self.cancelled.is_set():
+                raise BrokenPipeError('backup download cancelled')
+            try:
+                self.q.put(bytes(self.buffer), timeout=0.5)
+                break
+            except queue.Full:
+                pass
+        self.buffer.clear()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= BLOCK_SIZE:
+            self._put()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self._put()
+
+
+class _ArchiveStream:
+    """Iterable response body; close() stops the builder thread and frees the lock"""
+
+    def __init__(self, builder, name, incremental, compression):
+        self.builder = builder
+        self.name = name
+        self.q = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.cancelled = threading.Event()
+        self.result = {}
+        self.completed = False
+        self.closed = False
+        self.thread = threading.Thread(target=self._produce, args=(incremental, compression),
+                                       daemon=True)
+        self.thread.start()
+
+    def _produce(self, incremental, compression):
+        writer = _QueueWriter(self.q, self.cancelled)
+        try:
+            self.builder._write_archive(writer, compression, incremental, self.result)
+            writer.flush()
+            item = None
+        except BaseException as e:
+            item = e
+        while not self.cancelled.is_set():
+            try:
+                self.q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def __iter__(self):
+        while True:
+            item = self.q.get()
+            if item is None:
+                self.completed = True
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.completed:
+                self.builder._commit_manifest(self.result, self.name)
+            else:
+                self.cancelled.set()   # The client went away: abandon the archive
+                self.thread.join()
+        finally:
+            self.builder._lock.release()
+
+
+class BackupBuilder:
+    """Builds backup archives of BACKUP_SOURCES"""
+
+    def __init__(self, sources=BACKUP_SOURCES, backup_dir=BACKUP_DIR, manifest_file=MANIFEST_FILE):
+        self.sources = sources
+        self.backup_dir = backup_dir
+        self.manifest_file = manifest_file
+        self._lock = threading.Lock()
+
+    def _files(self):
+        """(archive name, path) for every file to consider, sorted"""
+        for prefix, root in self.sources:
+            for directory, dirs, names in os.walk(root):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(names):
+                    if name.startswith('.') or name.endswith(SKIP_SUFFIXES):
+                        continue
+                    path = os.path.join(directory, name)
+                    if os.path.isfile(path):
+                        yield f"{prefix}/{os.path.relpath(path, root)}", path
+
+    def _write_archive(self, out, compression, incremental, result):
+        """Write the whole archive to out (a binary file object)"""
+        previous = (read_json(self.manifest_file) or {}).get('files', {}) if incremental else {}
+        files = {}
+        added = 0
+        if compression == 'zst':
+            if not HAS_ZSTD:
+                raise ValueError('zstandard is not installed')
+            compressor = zstandard.ZstdCompressor(level=3).stream_writer(out, closefd=False)
+            tar = tarfile.open(fileobj=compressor, mode='w|')
+        else:
+            compressor = gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6)
+            tar = tarfile.open(fileobj=compressor, mode='w|')
+
+        try:
+            with tempfile.TemporaryDirectory(prefix='cosmo-backup-') as staging:
+                staged = os.path.join(staging, 'member')
+                for arcname, path in self._files():
+                    try:
+                        st = os.stat(path)
+                        old = previous.get(arcname)
+                        if _is_sqlite(path):
+                            snapshot_sqlite(path, staged)
+                            sha256 = file_sha256(staged)
+                        elif old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+                            files[arcname] = old   # Unchanged stat: in an earlier archive, not re-read
+                            continue
+                        else:
+                            sha256 = copy_hashed(path, staged)
+                        entry = {'size': os.path.getsize(staged), 'mtime_ns': st.st_mtime_ns,
+                                 'sha256': sha256}
+                    except BrokenPipeError:
+                        raise
+                    except (OSError, sqlite3.Error) as e:
+                        print(f"⚠️ Backup skipped {path}: {e}")
+                        continue
+                    try:
+                        if old and old['sha256'] == sha256:
+                            files[arcname] = entry
+                            continue
+                        # The staged copy cannot change under us, so the member is exactly
+                        # what was hashed. Any error from here on aborts the archive.
+                        info = tarfile.TarInfo(arcname)
+                        info.size = entry['size']
+                        info.mtime = int(st.st_mtime)
+                        info.mode = st.st_mode & 0o777
+                        with open(staged, 'rb') as f:
+                            tar.addfile(info, f)
+                        files[arcname] = entry
+                        added += 1
+                    finally:
+                        os.unlink(staged)
+
+            manifest = {
+                'created': datetime.now().isoformat(),
+                'incremental': incremental,
+                'base': (read_json(self.manifest_file) or {}).get('archive') if incremental else None,
+                'files': files
+            }
+            data = json.dumps(manifest, indent=2).encode()
+            info = tarfile.TarInfo('BACKUP-MANIFEST.json')
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            tar.close()
+        except BaseException:
+            try:
+                tar.close()   # Marks the tar stream closed; the output is abandoned
+            except Exception:
+                pass
+            raise
+        if compression == 'zst':
+            compressor.flush(zstandard.FLUSH_FRAME)
+        else:
+            compressor.close()   # Writes the gzip trailer; out stays open
+        result.update({'files': len(files), 'added': added, 'manifest': manifest})
+
+    def _commit_manifest(self, result, archive):
+        manifest = dict(result['manifest'], archive=archive)
+        write_json(self.manifest_file, manifest, indent=2)
+
+    def _acquire(self):
+        if not self._lock.acquire(blocking=False):
+            raise BackupBusy('A backup is already running')
+
+    def build(self, incremental=False, compression='gz'):
+        """Write an archive into backup_dir; returns its name, size and counts"""
+        if compression not in EXTENSIONS:
+            raise ValueError(f'unknown compression: {compression}')
+        self._acquire()
+        try:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            kind = 'incremental' if incremental else 'full'
+            name = f"cosmo-{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}{EXTENSIONS[compression]}"
+            path = os.path.join(self.backup_dir, name)
+            tmp = os.path.join(self.backup_dir, f".{name}.tmp")
+            start = time.time()
+            result = {}
+            try:
+                with open(tmp, 'wb') as f:
+                    self._write_archive(f, compression, incremental, result)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            self._commit_manifest(result, name)
+            return {
+                'name': name,
+                'path': path,
+                'size': os.path.getsize(path),
+                'files': result['files'],
+                'added': result['added'],
+                'incremental': incremental,
+                'seconds': round(time.time() - start, 2)
+            }
+        finally:
+            self._lock.release()
+
+    def stream(self, incremental=False, compression='gz'):
+        """Archive as an iterable of compressed blocks, for an HTTP response body
+
+        The caller must close() it (WSGI servers do). The manifest is only
+        updated when the whole archive was sent.
+        """
+        if compression not in EXTENSIONS:
+            raise ValueError(f'unknown compression: {compression}')
+        if compression == 'zst' and not HAS_ZSTD:
+            raise ValueError('zstandard is not installed')
+        self._acquire()
+        kind = 'incremental' if incremental else 'full'
+        name = f"cosmo-{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}{EXTENSIONS[compression]}"
+        return _ArchiveStream(self, name, incremental, compression)
+
+
+builder = BackupBuilder()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Upload Blob Store
+Content-addressed storage for uploads with a SQLite metadata index
+
+Each distinct file content is stored once, as <upload folder>/.blobs/ab/<sha256>.
+Every upload still gets its own <id>.<ext> name in the upload folder, as the
+download URLs and Cosmo's notifications expect. That name is a hard link to
+the blob, so a duplicate upload costs one directory entry and one index row,
+not another copy. The index (uploads.db) keeps the original filename, size,
+mime type, hash, uploader and time. Listings come from the file catalogue,
+which follows the directory itself (files other tools drop in or delete
+included) and takes indexed files' times from upload_times(): linked files
+share the blob's mtime.
+
+Content is hashed while it streams in: add_stream() hashes as it writes, and
+add_file() takes the hash the chunked uploader already computed. Files that
+were in the upload folder before the index existed are imported once.
+"""
+
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+import uuid
+
+from db_pool import connection
+
+BLOB_DB = '/home/madadmin/clawd/data/uploads.db'
+READ_SIZE = 1024 * 1024   # Bytes per read while hashing
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Deduplicating store behind one upload folder"""
+
+    def __init__(self, upload_folder, db_path=BLOB_DB):
+        self.upload_folder = upload_folder
+        self.blob_dir = os.path.join(upload_folder, '.blobs')
+        self.db_path = db_path
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    def _ensure_ready(self):
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    self._init_db()
+
+    def _connection(self):
+        self._ensure_ready()
+        return connection(self.db_path)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with connection(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS uploads (
+                    stored_name TEXT PRIMARY KEY,
+                    original_name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mime TEXT,
+                    sha256 TEXT NOT NULL,
+                    uploader TEXT,
+                    created REAL NOT NULL
+                )
+            ''')
+            conn.execute('DROP INDEX IF EXISTS idx_uploads_created')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_recent ON uploads(created, stored_name)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads(sha256)')
+            empty = conn.execute('SELECT 1 FROM uploads LIMIT 1').fetchone() is None
+        self._ready = True
+        if empty:
+            self._import_existing()
+
+    def _import_existing(self):
+        """One-time indexing of files uploaded before the store existed"""
+        try:
+            names = os.listdir(self.upload_folder)
+        except OSError:
+            return
+        imported = 0
+        for name in names:
+            path = os.path.join(self.upload_folder, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            try:
+                st = os.stat(path)
+                sha256 = file_sha256(path)
+                self._link_blob(path, sha256, keep_source=True)
+                self._index(name, name, st.st_size, sha256, None, st.st_mtime)
+                imported += 1
+            except OSError as e:
+                print(f"Blob store: could not import {name}: {e}")
+        if imported:
+            print(f"📦 Indexed {imported} existing uploads in {self.db_path}")
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def _link_blob(self, source, sha256, keep_source=False):
+        """Make source's content the blob for sha256 (or drop it if the blob exists)
+
+        With keep_source the file stays where it is; an existing duplicate is
+        swapped for a hard link to the blob so only one copy remains on disk.
+        """
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            if keep_source:
+                if not os.path.samefile(source, blob):
+                    tmp = f"{source}.link.{uuid.uuid4().hex}"
+                    os.link(blob, tmp)
+                    os.replace(tmp, source)
+            else:
+                os.unlink(source)
+            return blob
+        if keep_source:
+            try:
+                os.link(source, blob)
+            except FileExistsError:
+                return self._link_blob(source, sha256, keep_source)
+        else:
+            os.replace(source, blob)   # Same content either way if two uploads race
+        return blob
+
+    def _index(self, stored_name, original_name, size, sha256, uploader, created=None):
+        mime = mimetypes.guess_type(original_name)[0] or 'application/octet-stream'
+        with self._connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO uploads
+                    (stored_name, original_name, size, mime, sha256, uploader, created)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (stored_name, original_name, size, mime, sha256, uploader,
+                  created if created is not None else time.time()))
+
+    def _publish(self, source, original_name, size, sha256, uploader):
+        self._ensure_ready()   # Import older files before adding new ones
+        ext = original_name.rsplit('.', 1)[1].lower() if '.' in original_name else 'bin'
+        stored_name = f"{uuid.uuid4()}.{ext}"
+        path = os.path.join(self.upload_folder, stored_name)
+        with self._connection() as conn:
+            duplicate = conn.execute('SELECT 1 FROM uploads WHERE sha256=? LIMIT 1',
+                                     (sha256,)).fetchone() is not None
+        blob = self._link_blob(source, sha256)
+        # Indexed before the name appears, so a listing never sees it without its upload time
+        self._index(stored_name, original_name, size, sha256, uploader)
+        try:
+            os.link(blob, path)
+        except OSError:
+            with self._connection() as conn:
+                conn.execute('DELETE FROM uploads WHERE stored_name=?', (stored_name,))
+            raise
+        return {
+            'filename': original_name,
+            'stored_name': stored_name,
+            'path': path,
+            'size': size,
+            'sha256': sha256,
+            'duplicate': duplicate
+        }
+
+    def add_file(self, source, original_name, sha256=None, uploader=None):
+        """Store a finished file (moved into the store, or dropped if a duplicate)"""
+        size = os.path.getsize(source)
+        return self._publish(source, original_name, size, sha256 or file_sha256(source), uploader)
+
+    def add_stream(self, stream, original_name, uploader=None):
+        """Store a file-like object, hashing it while it is written"""
+        tmp_dir = os.path.join(self.blob_dir, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp = os.path.join(tmp_dir, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, 'wb') as f:
+                for block in iter(lambda: stream.read(READ_SIZE), b''):
+                    f.write(block)
+                    digest.update(block)
+                    size += len(block)
+            return self._publish(tmp, original_name, size, digest.hexdigest(), uploader)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def lookup(self, stored_names):
+        """{stored name: index row as dict} for the given names"""
+        stored_names = list(stored_names)
+        found = {}
+        with self._connection() as conn:
+            for start in range(0, len(stored_names), 500):
+                chunk = stored_names[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT * FROM uploads WHERE stored_name IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update((row['stored_name'], dict(row)) for row in rows)
+        return found
+
+    def upload_times(self, entries):
+        """FileCatalog time source: [(name, size, mtime)] with mtime replaced by the upload time
+
+        A duplicate upload is a hard link to an older blob and shares its
+        mtime, so indexed files are listed by when they were uploaded. Files
+        the index does not know (dropped in by other tools) keep their mtime.
+        """
+        indexed = self.lookup(name for name, _, _ in entries)
+        return [(name, size, indexed[name]['created'] if name in indexed else mtime)
+                for name, size, mtime in entries]
+
+    def remove(self, stored_name):
+        """Delete one upload; the blob goes with its last reference"""
+        with self._connection() as conn:
+            row = conn.execute('SELECT sha256 FROM uploads WHERE stored_name=?',
+                               (stored_name,)).fetchone()
+            if row is None:
+                return False
+            conn.execute('DELETE FROM uploads WHERE stored_name=?', (stored_name,))
+            remaining = conn.execute('SELECT COUNT(*) FROM uploads WHERE sha256=?',
+                                     (row['sha256'],)).fetchone()[0]
+        for path in [os.path.join(self.upload_folder, stored_name)] + \
+                ([self.blob_path(row['sha256'])] if remaining == 0 else []):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return True
+
+    def stats(self):
+        with self._connection() as conn:
+            row = conn.execute('''
+                SELECT COUNT(*), COUNT(DISTINCT sha256), COALESCE(SUM(size), 0) FROM uploads
+            ''').fetchone()
+            unique_bytes = conn.execute('''
+                SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM uploads GROUP BY sha256)
+            ''').fetchone()[0]
+        return {'uploads': row[0], 'unique': row[1], 'bytes': row[2], 'unique_bytes': unique_bytes}
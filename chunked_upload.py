@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Chunked Uploads
+Resumable uploads streamed to disk with inline SHA-256 (server.py and file_server.py)
+
+Protocol:
+    POST   /api/upload/init            {"filename", "size", "sha256"?} -> {"upload_id", "offset", "chunk_size"}
+    GET    /api/upload/<id>            -> {"offset", "size"}   (where to resume)
+    PUT    /api/upload/<id>?offset=N   raw bytes of the next chunk -> {"offset"}
+    POST   /api/upload/<id>/finalize   -> {"success", "path", "size", "sha256", ...}
+    DELETE /api/upload/<id>            abort
+
+A chunk's body is read from the request stream and written straight to
+<upload folder>/.partial/<id>.<ext>, with no multipart parsing or temp copy.
+Finalize renames the file into the upload folder on the same filesystem, or
+hands it to a BlobStore, which already has its hash.
+Whatever reached the disk before a dropped connection counts, so the file's
+size is the resume offset, and a PUT at any other offset gets 409 with the
+real one. The SHA-256 is updated as bytes are written. Only an upload
+resumed after a server restart is re-read once at finalize. MAX_ACTIVE
+chunks are written at a time; more get 503 with Retry-After.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+
+from atomic_store import read_json, write_json
+
+CHUNK_SIZE = 8 * 1024 * 1024        # Suggested chunk size for clients
+READ_SIZE = 256 * 1024              # Bytes read from the request stream at a time
+MAX_ACTIVE = 4                      # Chunks being written concurrently
+MAX_UPLOAD_SIZE = 4 * 1024 ** 3     # 4 GB per file
+STALE_AFTER = 24 * 3600             # Unfinished uploads idle for a day are removed
+SHA256_HEX = re.compile(r'[0-9a-fA-F]{64}')
+
+
+class UploadError(Exception):
+    """Rejected upload request, carries the HTTP status"""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class UploadManager:
+    """Chunked uploads into one folder"""
+
+    def __init__(self, upload_folder, allowed=None, max_active=MAX_ACTIVE, max_size=MAX_UPLOAD_SIZE,
+                 store=None):
+        self.upload_folder = upload_folder
+        self.store = store      # BlobStore that finished uploads are handed to (optional)
+        self.partial_dir = os.path.join(upload_folder, '.partial')
+        self.allowed = allowed
+        self.max_size = max_size
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+        self._busy = set()      # Upload ids with a chunk in progress
+        self._hashes = {}       # Upload id -> (hashed bytes, sha256 object)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.partial_dir, f"{upload_id}.json")
+
+    def _load(self, upload_id):
+        try:
+            uuid.UUID(upload_id)
+        except ValueError:
+            raise UploadError('Unknown upload', 404)
+        meta = read_json(self._meta_path(upload_id))
+        if not meta:
+            raise UploadError('Unknown upload', 404)
+        return meta
+
+    def _offset(self, meta):
+        try:
+            return os.path.getsize(meta['partial'])
+        except OSError:
+            return 0
+
+    def init(self, filename, size, sha256=None, uploader=None):
+        if not filename or '.' not in filename:
+            raise UploadError('No file selected')
+        ext = filename.rsplit('.', 1)[1].lower()
+        if self.allowed is not None and ext not in self.allowed:
+            raise UploadError('File type not allowed')
+        if not isinstance(size, int) or size < 0 or size > self.max_size:
+            raise UploadError('Invalid file size')
+        if sha256 is not None and not (isinstance(sha256, str) and SHA256_HEX.fullmatch(sha256)):
+            raise UploadError('sha256 must be 64 hex characters')
+        self.cleanup()
+
+        upload_id = str(uuid.uuid4())
+        os.makedirs(self.partial_dir, exist_ok=True)
+        meta = {
+            'id': upload_id,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'uploader': uploader,
+            'partial': os.path.join(self.partial_dir, f"{upload_id}.{ext}"),
+            'path': os.path.join(self.upload_folder, f"{upload_id}.{ext}"),
+            'created': time.time()
+        }
+        open(meta['partial'], 'wb').close()
+        write_json(self._meta_path(upload_id), meta)
+        with self._lock:
+            self._hashes[upload_id] = (0, hashlib.sha256())
+        return {'upload_id': upload_id, 'offset': 0, 'size': size, 'chunk_size': CHUNK_SIZE}
+
+    def status(self, upload_id):
+        meta = self._load(upload_id)
+        return {'upload_id': upload_id, 'offset': self._offset(meta), 'size': meta['size']}
+
+    def write_chunk(self, upload_id, offset, stream, length=None):
+        """Append the request body at offset; returns the new offset"""
+        meta = self._load(upload_id)
+        if not self._slots.acquire(blocking=False):
+            raise UploadError('Too many uploads in progress', 503, retry_after=2)
+        try:
+            with self._lock:
+                if upload_id in self._busy:
+                    raise UploadError('A chunk for this upload is already in progress', 409)
+                self._busy.add(upload_id)
+            try:
+                return self._write(upload_id, meta, offset, stream, length)
+            finally:
+                with self._lock:
+                    self._busy.discard(upload_id)
+        finally:
+            self._slots.release()
+
+    def _write(self, upload_id, meta, offset, stream, length):
+        current = self._offset(meta)
+        if offset != current:
+            raise UploadError('Offset mismatch', 409, offset=current)
+        remaining = meta['size'] - current
+        if length is not None and length > remaining:
+            raise UploadError('Chunk exceeds declared size', 413, offset=current)
+
+        with self._lock:
+            hashed, digest = self._hashes.get(upload_id, (None, None))
+        if hashed != current:
+            digest = None   # Resumed after a restart: hashed from disk at finalize
+
+        with open(meta['partial'], 'r+b') as f:
+            f.seek(current)
+            try:
+                while remaining > 0:
+                    data = stream.read(min(READ_SIZE, remaining))
+                    if not data:
+                        break
+                    f.write(data)
+                    if digest is not None:
+                        digest.update(data)
+                    remaining -= len(data)
+                    current += len(data)
+            finally:
+                # Keep what arrived, even if the client disconnected mid-chunk
+                f.flush()
+                os.fsync(f.fileno())
+                with self._lock:
+                    if digest is not None:
+                        self._hashes[upload_id] = (current, digest)
+                    else:
+                        self._hashes.pop(upload_id, None)
+        if stream.read(1):
+            raise UploadError('Chunk exceeds declared size', 413, offset=current)
+        return current
+
+    def _file_sha256(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def finalize(self, upload_id):
+        """Verify size and checksum and move the file into the upload folder"""
+        self._load(upload_id)
+        with self._lock:
+            if upload_id in self._busy:
+                raise UploadError('A chunk or finalize for this upload is still in progress', 409)
+            self._busy.add(upload_id)
+            hashed, digest = self._hashes.pop(upload_id, (None, None))
+        try:
+            meta = self._load(upload_id)   # A finalize that just finished removed it
+            return self._finalize(upload_id, meta, hashed, digest)
+        finally:
+            with self._lock:
+                self._busy.discard(upload_id)
+
+    def _finalize(self, upload_id, meta, hashed, digest):
+        size = self._offset(meta)
+        if size != meta['size']:
+            raise UploadError('Upload incomplete', 409, offset=size)
+        sha256 = digest.hexdigest() if hashed == size else self._file_sha256(meta['partial'])
+        if meta['sha256'] and meta['sha256'] != sha256:
+            self.abort(upload_id)
+            raise UploadError('Checksum mismatch', 422, sha256=sha256)
+
+        if self.store is not None:
+            info = self.store.add_file(meta['partial'], meta['filename'], sha256, meta.get('uploader'))
+        else:
+            os.replace(meta['partial'], meta['path'])
+            info = {'filename': meta['filename'], 'path': meta['path'], 'size': size, 'sha256': sha256}
+        try:
+            os.unlink(self._meta_path(upload_id))
+        except OSError:
+            pass
+        return info
+
+    def abort(self, upload_id):
+        meta = self._load(upload_id)
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+        for path in (meta['partial'], self._meta_path(upload_id)):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def cleanup(self, max_age=STALE_AFTER):
+        """Remove unfinished uploads that received no data for max_age
+
+        The metadata file is written once at init, so staleness is judged by
+        the partial file, which every chunk touches. Both go together.
+        """
+        try:
+            names = os.listdir(self.partial_dir)
+        except OSError:
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        uploads = {}    # upload id -> [paths]
+        for name in names:
+            if not name.startswith('.'):
+                uploads.setdefault(name.split('.', 1)[0], []).append(os.path.join(self.partial_dir, name))
+        for upload_id, paths in uploads.items():
+            with self._lock:
+                if upload_id in self._busy:
+                    continue
+            meta = read_json(self._meta_path(upload_id)) or {}
+            data_paths = [path for path in paths if path != self._meta_path(upload_id)]
+            try:
+                last = max(os.path.getmtime(path) for path in (data_paths or paths))
+            except (OSError, ValueError):
+                continue
+            if last >= cutoff:
+                continue
+            for path in set(paths) | ({meta['partial']} if meta.get('partial') else set()):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            with self._lock:
+                self._hashes.pop(upload_id, None)
+            removed += 1
+        return removed
+
+
+def register_routes(app, manager, on_complete=None):
+    """Add the chunked upload endpoints to a Flask app
+
+    on_complete(info) runs after a successful finalize (logging, notifications).
+    """
+    from flask import request, jsonify
+
+    def error_response(e):
+        body = {'success': False, 'error': str(e)}
+        body.update(e.extra)
+        response = jsonify(body)
+        response.status_code = e.status
+        if 'retry_after' in e.extra:
+            response.headers['Retry-After'] = str(e.extra['retry_after'])
+        return response
+
+    def upload_init():
+        data = request.get_json(silent=True) or {}
+        try:
+            uploader = request.headers.get('X-Uploader') or request.remote_addr
+            return jsonify(manager.init(data.get('filename'), data.get('size'), data.get('sha256'),
+                                        uploader))
+        except UploadError as e:
+            return error_response(e)
+
+    def upload_status(upload_id):
+        try:
+            return jsonify(manager.status(upload_id))
+        except UploadError as e:
+            return error_response(e)
+
+    def upload_chunk(upload_id):
+        try:
+            offset = int(request.args.get('offset', ''))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'offset is required'}), 400
+        try:
+            new_offset = manager.write_chunk(upload_id, offset, request.stream, request.content_length)
+            return jsonify({'upload_id': upload_id, 'offset': new_offset})
+        except UploadError as e:
+            return error_response(e)
+
+    def upload_finalize(upload_id):
+        try:
+            info = manager.finalize(upload_id)
+        except UploadError as e:
+            return error_response(e)
+        if on_complete:
+            on_complete(info)
+        info.update({'success': True, 'message': 'File uploaded successfully'})
+        return jsonify(info)
+
+    def upload_abort(upload_id):
+        try:
+            manager.abort(upload_id)
+            return jsonify({'success': True})
+        except UploadError as e:
+            return error_response(e)
+
+    app.add_url_rule('/api/upload/init', 'upload_init', upload_init, methods=['POST'])
+    app.add_url_rule('/api/upload/<upload_id>', 'upload_status', upload_status, methods=['GET'])
+    app.add_url_rule('/api/upload/<upload_id>', 'upload_chunk', upload_chunk, methods=['PUT'])
+    app.add_url_rule('/api/upload/<upload_id>', 'upload_abort', upload_abort, methods=['DELETE'])
+    app.add_url_rule('/api/upload/<upload_id>/finalize', 'upload_finalize', upload_finalize,
+                     methods=['POST'])
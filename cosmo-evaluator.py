@@ -4,76 +4,32 @@ Cosmo's Project/Idea/Task Evaluator
 Reads notifications and sends Discord messages with my thoughts
 """
 
-import json
-import os
 import time
-import urllib.request
 from datetime import datetime
 
+from atomic_store import update_json, UnparseableFile
+from dedup_store import DedupStore
+from keyword_classifier import get_classifier
+from notification_queue import NotificationQueue, TOPIC_PENDING
+from discord_outbox import outbox
+
 NOTIFICATIONS_FILE = '/home/madadmin/clawd/data/pending-notification.json'
 PROCESSED_FILE = '/tmp/cosmo-processed-notifications.json'
+ALERTS_FILE = '/home/madadmin/clawd/data/cosmo-alerts.json'
 DISCORD_CHANNEL = '1466517317403021362'
+CONSUMER = 'cosmo-evaluator'
+BATCH_SIZE = 100
 
-def load_processed():
-    """Load already processed notification IDs"""
-    if os.path.exists(PROCESSED_FILE):
-        try:
-            with open(PROCESSED_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_processed(processed):
-    """Save processed notification IDs"""
-    with open(PROCESSED_FILE, 'w') as f:
-        json.dump(processed, f)
+queue = NotificationQueue(TOPIC_PENDING, legacy_file=NOTIFICATIONS_FILE)
+processed = DedupStore(CONSUMER, legacy_file=PROCESSED_FILE)
 
 def send_discord_message(message):
-    """Send message to Discord via Clawdbot Gateway"""
+    """Queue a message for Discord (delivered by the outbox worker)"""
     try:
-        # Use Clawdbot's message tool via API
-        import subprocess
-        
-        # Create a temporary script to send the message
-        script = f'''
-import sys
-sys.path.insert(0, '/home/madadmin/.clawdbot')
-
-# Simple Discord webhook approach
-import urllib.request
-import json
-
-webhook_url = "https://discord.com/api/v10/channels/{DISCORD_CHANNEL}/messages"
-
-# Get bot token from clawdbot config
-import json
-with open('/home/madadmin/.clawdbot/clawdbot.json') as f:
-    config = json.load(f)
-token = config.get('channels', {{}}).get('discord', {{}}).get('token', '')
-
-if token:
-    data = json.dumps({{"content": {repr(message)}}}).encode()
-    req = urllib.request.Request(
-        webhook_url,
-        data=data,
-        headers={{
-            'Content-Type': 'application/json',
-            'Authorization': f'Bot {{token}}'
-        }},
-        method='POST'
-    )
-    urllib.request.urlopen(req)
-    print("Sent!")
-else:
-    print("No token found")
-'''
-        
-        result = subprocess.run(['python3', '-c', script], 
-                              capture_output=True, text=True, timeout=10)
-        return result.returncode == 0
+        outbox.enqueue(DISCORD_CHANNEL, message)
+        return True
     except Exception as e:
-        print(f"Error sending Discord: {e}")
+        print(f"Error queueing Discord message: {e}")
         return False
 
 def evaluate_project(project):
@@ -81,37 +37,11 @@ def evaluate_project(project):
     name = project.get('name', 'Unnamed Project')
     desc = project.get('description', '')
     
-    # Simple keyword-based analysis
-    desc_lower = desc.lower()
-    
-    complexity = 'low'
-    priority = 'low'
-    opinion = ''
-    
-    # Analyze complexity
-    if any(word in desc_lower for word in ['ai', 'ml', 'machine learning', 'neural', 'model']):
-        complexity = 'high'
-        opinion = "🧠 This involves AI/ML - complex implementation requiring expertise and compute resources."
-    elif any(word in desc_lower for word in ['automation', 'bot', 'script', 'cron', 'monitor']):
-        complexity = 'low'
-        opinion = "🤖 Automation task - straightforward to implement with existing tools and scripts."
-    elif any(word in desc_lower for word in ['integration', 'api', 'webhook', 'discord', 'slack']):
-        complexity = 'medium'
-        opinion = "🔌 Integration work - need to handle auth, rate limits, and error handling."
-    elif any(word in desc_lower for word in ['ui', 'frontend', 'design', 'css', 'react']):
-        complexity = 'medium'
-        opinion = "🎨 Frontend work - requires attention to UX, responsive design, and browser compatibility."
-    elif 'youtube' in desc_lower or 'automation' in desc_lower:
-        complexity = 'medium'
-        opinion = "📺 YouTube automation - solid business model with proven passive income potential."
-    else:
-        opinion = "📋 Standard development task - manageable with current stack and expertise."
-    
-    # Analyze priority
-    if any(word in desc_lower for word in ['urgent', 'critical', 'asap', 'security', 'bug', 'broken']):
-        priority = 'high'
-    elif any(word in desc_lower for word in ['revenue', 'money', 'income', 'business', 'automation']):
-        priority = 'medium'
+    # Keyword rules from evaluator_rules.json, matched in one pass
+    result = get_classifier().classify(desc)
+    complexity = result['complexity'].get('level', 'low')
+    priority = result['priority'].get('level', 'low')
+    opinion = result['complexity'].get('opinion', '')
     
     return complexity, priority, opinion
 
@@ -132,28 +62,22 @@ def evaluate_task(task):
     return priority, f"✅ Task for {project} project. {priority.upper()} priority."
 
 def process_notifications():
-    """Process pending notifications"""
-    if not os.path.exists(NOTIFICATIONS_FILE):
-        return
-    
-    try:
-        with open(NOTIFICATIONS_FILE, 'r') as f:
-            notifications = json.load(f)
-    except:
-        return
-    
-    if not isinstance(notifications, list):
+    """Process notifications queued since the last run"""
+    batch = queue.consume(CONSUMER, limit=BATCH_SIZE)
+    if not batch:
         return
     
-    processed = load_processed()
+    # Create unique ID for each notification and look them all up at once
+    ids = [f"{notif.get('type')}_{notif.get('timestamp')}" for _, notif in batch]
+    seen = processed.seen(ids)
     new_processed = []
+    done = None   # Offset of the last notification dealt with
     
-    for notif in notifications:
-        # Create unique ID for this notification
-        notif_id = f"{notif.get('type')}_{notif.get('timestamp')}"
-        
-        if notif_id in processed:
+    for (offset, notif), notif_id in zip(batch, ids):
+        if notif_id in seen:
+            done = offset
             continue
+        seen.add(notif_id)
         
         notif_type = notif.get('type', '')
         message = ''
@@ -209,41 +133,40 @@ Priority: {priority.upper()}
             # send_discord_message(message)
             
             # Write to a file that Cosmo can read
-            alert_file = '/home/madadmin/clawd/data/cosmo-alerts.json'
-            alerts = []
-            if os.path.exists(alert_file):
-                try:
-                    with open(alert_file, 'r') as f:
-                        alerts = json.load(f)
-                except:
-                    alerts = []
-            
-            if not isinstance(alerts, list):
-                alerts = []
-            
-            alerts.append({
+            alert = {
                 'type': notif_type,
                 'timestamp': datetime.now().isoformat(),
                 'message': message,
                 'channel': DISCORD_CHANNEL
-            })
-            
-            with open(alert_file, 'w') as f:
-                json.dump(alerts, f, indent=2)
+            }
+            try:
+                update_json(ALERTS_FILE,
+                            lambda alerts: (alerts if isinstance(alerts, list) else []) + [alert],
+                            default=[], indent=2)
+            except UnparseableFile as e:
+                # Leave this one and the rest of the batch for the next run
+                print(f"⚠️ Alert not saved, will retry: {e}")
+                break
             
             print(f"✅ Alert saved for {notif_type}")
         
         new_processed.append(notif_id)
+        done = offset
     
-    # Save processed IDs
-    processed.extend(new_processed)
-    save_processed(processed)
+    # Save processed IDs, then acknowledge everything dealt with at once
+    processed.add_many(new_processed)
+    if done is not None:
+        queue.ack(CONSUMER, done)
+    queue.prune()
 
 if __name__ == '__main__':
     print("🚀 Cosmo Evaluator Started")
     print("⏰ Checking every 30 seconds...")
     print("")
     
+    # Deliver anything queued for Discord in the background
+    outbox.start()
+    
     # Initial check
     process_notifications()
     
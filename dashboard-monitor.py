@@ -1,140 +1,161 @@
 #!/usr/bin/env python3
 """
 Lightweight database monitor for Cosmo Dashboard
-Checks for new projects/tasks/ideas every 30 seconds
+Watches for new projects/tasks/ideas and queues a notification for each
+
+Keeps one read-only connection open and polls PRAGMA data_version, which
+changes only when another connection commits. The tables are queried only
+after a change, so new rows reach Cosmo within about a second while an idle
+database costs one pragma per poll.
 """
 
-import sqlite3
-import json
 import os
+import sqlite3
 import time
 from datetime import datetime
 
+from atomic_store import read_json, write_json
+from notification_queue import NotificationQueue, TOPIC_PENDING
+
 DB_PATH = '/home/madadmin/clawd/cosmo-dashboard/data/dashboard.db'
 STATE_FILE = '/tmp/dashboard-monitor-state.json'
 NOTIFICATIONS_FILE = '/home/madadmin/clawd/data/pending-notification.json'
+POLL_INTERVAL = 0.5    # Seconds between data_version checks
+RETRY_INTERVAL = 5     # Seconds to wait after a database error
+MAX_BATCH = int(os.environ.get('DASHBOARD_MONITOR_MAX_BATCH', 500))  # Notifications per transaction
+
+queue = NotificationQueue(TOPIC_PENDING, legacy_file=NOTIFICATIONS_FILE)
 
 def load_state():
     """Load last known state"""
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return {'last_project_id': 0, 'last_task_id': 0, 'last_idea_id': 0}
+    return read_json(STATE_FILE) or {'last_project_id': 0, 'last_task_id': 0, 'last_idea_id': 0}
 
 def save_state(state):
     """Save current state"""
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f)
+    write_json(STATE_FILE, state)
 
-def write_notification(notification):
-    """Write notification for Cosmo to pick up"""
-    notifications = []
-    if os.path.exists(NOTIFICATIONS_FILE):
-        try:
-            with open(NOTIFICATIONS_FILE, 'r') as f:
-                notifications = json.load(f)
-        except:
-            notifications = []
+def open_connection():
+    """Read-only connection kept open across polls (data_version is per connection)"""
+    conn = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def project_notification(project):
+    return {
+        'type': 'new_project',
+        'timestamp': datetime.now().isoformat(),
+        'project': {
+            'id': project['id'],
+            'name': project['name'],
+            'description': project['description'],
+            'status': project['status']
+        },
+        'message': f"📁 New project created: **{project['name']}**\nStatus: {project['status']}\nCheck dashboard to evaluate!"
+    }
+
+def task_notification(task):
+    return {
+        'type': 'new_task',
+        'timestamp': datetime.now().isoformat(),
+        'task': {
+            'id': task['id'],
+            'title': task['title'],
+            'project': task['project'],
+            'priority': task['priority']
+        },
+        'message': f"✅ New task created: **{task['title']}**\nProject: {task['project']}\nPriority: {task['priority']}"
+    }
+
+def idea_notification(idea):
+    return {
+        'type': 'new_idea',
+        'timestamp': datetime.now().isoformat(),
+        'idea': {
+            'id': idea['id'],
+            'title': idea['title'],
+            'priority': idea['priority']
+        },
+        'message': f"💡 New idea: **{idea['title']}**\nPriority: {idea['priority']}"
+    }
+
+# (state key, label, query, notification builder); the second column is the display name
+SCANS = (
+    ('last_project_id', 'project',
+     'SELECT id, name, description, status FROM projects WHERE id > ? ORDER BY id LIMIT ?', project_notification),
+    ('last_task_id', 'task',
+     'SELECT id, title, project, priority FROM tasks WHERE id > ? ORDER BY id LIMIT ?', task_notification),
+    ('last_idea_id', 'idea',
+     'SELECT id, title, priority FROM ideas WHERE id > ? ORDER BY id LIMIT ?', idea_notification),
+)
+
+def check_database(conn, state, max_batch=MAX_BATCH):
+    """Queue notifications for rows added since the last check in one transaction
+
+    Returns True when more new rows are waiting than fit in one batch.
+    """
+    started = time.perf_counter()
+    events = []
+    last_ids = {}
+    more = False
     
-    # Ensure it's a list
-    if not isinstance(notifications, list):
-        notifications = []
+    for key, label, query, build in SCANS:
+        budget = max_batch - len(events)
+        if budget <= 0:
+            more = True
+            break
+        rows = conn.execute(query, (state[key], budget)).fetchall()
+        more = more or len(rows) == budget
+        for row in rows:
+            print(f"🔔 New {label} detected: {row[1]}")
+            events.append(build(row))
+            last_ids[key] = row['id']
     
-    notifications.append(notification)
+    if not events:
+        return False
+    queried = time.perf_counter()
     
-    os.makedirs(os.path.dirname(NOTIFICATIONS_FILE), exist_ok=True)
-    with open(NOTIFICATIONS_FILE, 'w') as f:
-        json.dump(notifications, f, indent=2)
+    # One INSERT transaction for the whole scan, then one state write
+    queue.enqueue_many(events)
+    for key, last_id in last_ids.items():
+        state[key] = max(state[key], last_id)
+    save_state(state)
+    finished = time.perf_counter()
+    
+    print(f"✅ Queued {len(events)} new items in {(finished - started) * 1000:.1f} ms "
+          f"(query {(queried - started) * 1000:.1f} ms, queue+state {(finished - queried) * 1000:.1f} ms)")
+    return more
 
-def check_database():
-    """Check database for new entries"""
+def watch():
+    """Poll data_version and scan the tables only when it changes"""
     state = load_state()
-    
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Check for new projects
-        cursor.execute('SELECT * FROM projects WHERE id > ? ORDER BY id DESC', (state['last_project_id'],))
-        new_projects = cursor.fetchall()
-        
-        for project in new_projects:
-            print(f"🔔 New project detected: {project['name']}")
-            write_notification({
-                'type': 'new_project',
-                'timestamp': datetime.now().isoformat(),
-                'project': {
-                    'id': project['id'],
-                    'name': project['name'],
-                    'description': project['description'],
-                    'status': project['status']
-                },
-                'message': f"📁 New project created: **{project['name']}**\nStatus: {project['status']}\nCheck dashboard to evaluate!"
-            })
-            state['last_project_id'] = max(state['last_project_id'], project['id'])
-        
-        # Check for new tasks
-        cursor.execute('SELECT * FROM tasks WHERE id > ? ORDER BY id DESC', (state['last_task_id'],))
-        new_tasks = cursor.fetchall()
-        
-        for task in new_tasks:
-            print(f"🔔 New task detected: {task['title']}")
-            write_notification({
-                'type': 'new_task',
-                'timestamp': datetime.now().isoformat(),
-                'task': {
-                    'id': task['id'],
-                    'title': task['title'],
-                    'project': task['project'],
-                    'priority': task['priority']
-                },
-                'message': f"✅ New task created: **{task['title']}**\nProject: {task['project']}\nPriority: {task['priority']}"
-            })
-            state['last_task_id'] = max(state['last_task_id'], task['id'])
-        
-        # Check for new ideas
-        cursor.execute('SELECT * FROM ideas WHERE id > ? ORDER BY id DESC', (state['last_idea_id'],))
-        new_ideas = cursor.fetchall()
-        
-        for idea in new_ideas:
-            print(f"🔔 New idea detected: {idea['title']}")
-            write_notification({
-                'type': 'new_idea',
-                'timestamp': datetime.now().isoformat(),
-                'idea': {
-                    'id': idea['id'],
-                    'title': idea['title'],
-                    'priority': idea['priority']
-                },
-                'message': f"💡 New idea: **{idea['title']}**\nPriority: {idea['priority']}"
-            })
-            state['last_idea_id'] = max(state['last_idea_id'], idea['id'])
-        
-        conn.close()
-        save_state(state)
-        
-        total_new = len(new_projects) + len(new_tasks) + len(new_ideas)
-        if total_new > 0:
-            print(f"✅ Found {total_new} new items")
-        
-    except Exception as e:
-        print(f"❌ Error checking database: {e}")
+    conn = None
+    last_version = None
+    more = False
+    while True:
+        try:
+            if conn is None:
+                conn = open_connection()
+                last_version = None
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if version != last_version or more:
+                more = check_database(conn, state)
+                last_version = version
+                if more:
+                    continue  # Next batch right away
+        except Exception as e:
+            print(f"❌ Error checking database: {e}")
+            if conn is not None:
+                conn.close()
+                conn = None
+            time.sleep(RETRY_INTERVAL)
+            continue
+        time.sleep(POLL_INTERVAL)
 
 if __name__ == '__main__':
     print("🚀 Dashboard Monitor Started")
     print(f"📊 Watching: {DB_PATH}")
-    print(f"🔔 Notifications: {NOTIFICATIONS_FILE}")
-    print("⏰ Checking every 30 seconds...")
+    print(f"🔔 Notifications: {queue.db_path} ({queue.topic}), up to {MAX_BATCH} per batch")
+    print(f"⏰ Checking for changes every {POLL_INTERVAL} seconds...")
     print("")
     
-    # Initial check
-    check_database()
-    
-    # Loop forever
-    while True:
-        time.sleep(30)
-        check_database()
+    watch()
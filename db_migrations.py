@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Schema Migrations
+Numbered schema changes tracked in PRAGMA user_version
+
+Each database records the last migration applied in its header, so a startup
+with nothing pending costs one PRAGMA read. Pending migrations run in order,
+each in its own BEGIN IMMEDIATE transaction that also bumps user_version.
+A migration is applied completely or not at all, and processes starting
+together apply it once.
+
+Online migrations (online=True) run outside a transaction and do their work
+in small batches with backfill(), so readers and writers are only held up
+for one batch at a time. They must be safe to re-run, because user_version
+only moves once they finish.
+"""
+
+import time
+
+from db_pool import connection
+
+BACKFILL_BATCH = 1000    # Rows updated per backfill transaction
+BACKFILL_PAUSE = 0.01    # Seconds between batches, so other writers get the lock
+
+
+class Migration:
+    """One schema change: apply(conn) for transactional, apply(db_path) for online"""
+
+    def __init__(self, version, name, apply, online=False):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        self.online = online
+
+
+def schema_version(db_path):
+    with connection(db_path) as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _set_version(conn, version):
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def migrate(db_path, migrations):
+    """Apply pending migrations in version order; returns the schema version"""
+    start = time.perf_counter()
+    current = schema_version(db_path)
+    pending = sorted((m for m in migrations if m.version > current), key=lambda m: m.version)
+    if not pending:
+        return current
+
+    for migration in pending:
+        step_start = time.perf_counter()
+        if migration.online:
+            migration.apply(db_path)
+            with connection(db_path) as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                if conn.execute('PRAGMA user_version').fetchone()[0] < migration.version:
+                    _set_version(conn, migration.version)
+        else:
+            with connection(db_path) as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                # Another process may have applied it while we waited for the lock
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= migration.version:
+                    continue
+                migration.apply(conn)
+                _set_version(conn, migration.version)
+        elapsed = (time.perf_counter() - step_start) * 1000
+        print(f"🗄️ Migration {migration.version} ({migration.name}) applied in {elapsed:.0f}ms")
+
+    version = schema_version(db_path)
+    print(f"✅ Schema at version {version} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+    return version
+
+
+def add_column(conn, table, column, definition):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def backfill(db_path, table, assignments, where, params=(), batch_size=BACKFILL_BATCH,
+             pause=BACKFILL_PAUSE):
+    """UPDATE table SET assignments WHERE where, batch_size rows per transaction
+
+    where must stop matching a row once it is updated (e.g. "col IS NULL"),
+    otherwise the loop never ends. Returns the number of rows updated.
+    """
+    total = 0
+    while True:
+        with connection(db_path) as conn:
+            count = conn.execute(f'''
+                UPDATE {table} SET {assignments}
+                WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)
+            ''', tuple(params) + (batch_size,)).rowcount
+        total += count
+        if count < batch_size:
+            return total
+        time.sleep(pause)
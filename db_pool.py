@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - SQLite Connection Pool
+Keeps tuned, reusable connections per database instead of connect/close per request
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+MAX_IDLE = 8                      # Idle connections kept per database
+CACHED_STATEMENTS = 256           # Prepared-statement cache per connection
+MMAP_SIZE = 256 * 1024 * 1024     # 256 MB memory-mapped reads
+BUSY_TIMEOUT = 5.0                # Seconds to wait on a locked database
+
+
+class ConnectionPool:
+    """Pool of configured connections to a single SQLite database.
+
+    A thread keeps the same connection for the whole of its outermost
+    `connection()` block, so nested helpers (add_log inside a route, etc.)
+    share it instead of opening another one.
+    """
+
+    def __init__(self, path, read_only=False, max_idle=MAX_IDLE):
+        self.path = path
+        self.read_only = read_only
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {
+            'hits': 0,        # Checkout served by an idle connection
+            'misses': 0,      # Checkout had to open a new connection
+            'reentrant': 0,   # Nested checkout reused the thread's connection
+            'opened': 0,
+            'closed': 0,
+            'errors': 0
+        }
+
+    def _open(self):
+        """Open a connection and apply per-connection tuning once"""
+        if self.read_only:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True,
+                                   timeout=BUSY_TIMEOUT,
+                                   check_same_thread=False,
+                                   cached_statements=CACHED_STATEMENTS)
+        else:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                                   check_same_thread=False,
+                                   cached_statements=CACHED_STATEMENTS)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        conn.row_factory = sqlite3.Row
+        with self._lock:
+            self.stats['opened'] += 1
+        return conn
+
+    def _checkout(self):
+        with self._lock:
+            if self._idle:
+                self.stats['hits'] += 1
+                return self._idle.pop()
+            self.stats['misses'] += 1
+        return self._open()
+
+    def _checkin(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self.stats['closed'] += 1
+        conn.close()
+
+    def _discard(self, conn):
+        with self._lock:
+            self.stats['errors'] += 1
+            self.stats['closed'] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; commits on success, rolls back on error"""
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            with self._lock:
+                self.stats['reentrant'] += 1
+            yield conn
+            return
+
+        conn = self._checkout()
+        local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            local.conn = None
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                raise
+            self._checkin(conn)
+            raise
+        local.conn = None
+        self._checkin(conn)
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.stats['closed'] += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def snapshot(self):
+        """Current counters plus derived hit ratio"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['idle'] = len(self._idle)
+        checkouts = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / checkouts, 3) if checkouts else 0
+        stats['read_only'] = self.read_only
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path, read_only=False):
+    """Get (or lazily create) the pool for a database path"""
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = ConnectionPool(path, read_only=read_only)
+                _pools[path] = pool
+    return pool
+
+
+def connection(path, read_only=False):
+    """Shortcut: `with connection(DB_PATH) as conn:`"""
+    return get_pool(path, read_only).connection()
+
+
+def pool_stats():
+    """Hit/miss stats for every pool, keyed by database path"""
+    return {path: pool.snapshot() for path, pool in list(_pools.items())}
+
+
+def close_all():
+    """Close idle connections in every pool"""
+    for pool in list(_pools.values()):
+        pool.close()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Dedup Store
+Bounded "already processed" sets on SQLite, shared by the monitors and evaluators
+
+Each namespace is a set of IDs in one indexed table, so a membership check is
+a primary-key lookup instead of a scan of an ever-growing JSON list, and
+adding IDs writes only the new rows. IDs older than max_age are evicted, and
+each namespace keeps at most max_entries of the newest IDs. Eviction runs at
+most once per PRUNE_INTERVAL and deletes through the (namespace, added)
+index, so the cost per cycle stays flat no matter how long the process runs.
+"""
+
+import os
+import time
+
+from atomic_store import read_json
+from db_pool import connection
+
+DEDUP_DB = '/home/madadmin/clawd/data/dedup.db'
+
+MAX_AGE = 30 * 86400      # Seconds an ID is remembered
+MAX_ENTRIES = 20000       # IDs kept per namespace
+PRUNE_INTERVAL = 3600     # Seconds between eviction passes
+QUERY_CHUNK = 500         # IDs per IN (...) lookup (SQLite variable limit)
+
+
+class DedupStore:
+    """One namespace of processed IDs with set semantics"""
+
+    def __init__(self, namespace, db_path=DEDUP_DB, max_age=MAX_AGE,
+                 max_entries=MAX_ENTRIES, legacy_file=None):
+        self.namespace = namespace
+        self.db_path = db_path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.legacy_file = legacy_file
+        self._ready = False
+        self._last_prune = 0
+
+    def _connection(self):
+        if not self._ready:
+            self._init_db()
+        return connection(self.db_path)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with connection(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS seen (
+                    namespace TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    added REAL NOT NULL,
+                    PRIMARY KEY (namespace, id)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_seen_added ON seen(namespace, added)')
+        self._ready = True
+        self._import_legacy()
+
+    def _import_legacy(self):
+        """One-time import of the old JSON list of processed IDs"""
+        if not self.legacy_file:
+            return
+        imported = self.legacy_file + '.imported'
+        try:
+            # Renaming first means only one process ever imports the file
+            os.replace(self.legacy_file, imported)
+        except FileNotFoundError:
+            return
+        ids = read_json(imported, [])
+        if not isinstance(ids, list):
+            ids = []
+        self.add_many(ids)
+        print(f"📦 Imported {len(ids)} processed IDs from {self.legacy_file}")
+
+    def __contains__(self, item_id):
+        with self._connection() as conn:
+            row = conn.execute('SELECT 1 FROM seen WHERE namespace=? AND id=?',
+                               (self.namespace, str(item_id))).fetchone()
+        return row is not None
+
+    def seen(self, ids):
+        """The subset of ids that were already added"""
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        found = set()
+        with self._connection() as conn:
+            for start in range(0, len(ids), QUERY_CHUNK):
+                chunk = ids[start:start + QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT id FROM seen WHERE namespace=? AND id IN ({','.join('?' * len(chunk))})",
+                    [self.namespace] + chunk
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def add(self, item_id):
+        self.add_many([item_id])
+
+    def add_many(self, ids):
+        """Remember ids (re-adding an ID refreshes its age)"""
+        now = time.time()
+        rows = [(self.namespace, str(i), now) for i in ids if i is not None]
+        if rows:
+            with self._connection() as conn:
+                conn.executemany('INSERT OR REPLACE INTO seen (namespace, id, added) VALUES (?, ?, ?)',
+                                 rows)
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            self.prune()
+        return len(rows)
+
+    def prune(self):
+        """Evict IDs past max_age and all but the newest max_entries; returns rows removed"""
+        self._last_prune = time.time()
+        removed = 0
+        with self._connection() as conn:
+            if self.max_age:
+                removed += conn.execute('DELETE FROM seen WHERE namespace=? AND added < ?',
+                                        (self.namespace, self._last_prune - self.max_age)).rowcount
+            if self.max_entries:
+                row = conn.execute('''
+                    SELECT added FROM seen WHERE namespace=?
+                    ORDER BY added DESC LIMIT 1 OFFSET ?
+                ''', (self.namespace, self.max_entries)).fetchone()
+                if row is not None:
+                    # Strictly older: IDs added in the same batch share a timestamp
+                    removed += conn.execute('DELETE FROM seen WHERE namespace=? AND added < ?',
+                                            (self.namespace, row[0])).rowcount
+        return removed
+
+    def __len__(self):
+        with self._connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM seen WHERE namespace=?',
+                                (self.namespace,)).fetchone()[0]
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Cosmo Discord Outbox
+Durable, asynchronous delivery of Discord channel messages
+
+Request handlers call enqueue(), which is one SQLite INSERT, and return
+immediately. A background worker claims due messages under a short lease,
+so several processes can share one outbox without double-sending. Messages
+over the 2000-char limit are split into several posts when queued, and
+bursts to the same channel are coalesced into as few posts as the limit
+allows. Everything goes over one kept-alive HTTPS connection. 429s defer
+the channel (or everything, for global limits) by retry_after without
+counting as a failure, and so does a missing bot token. 5xx and network
+errors back off exponentially.
+
+Set DISCORD_API_BASE (e.g. http://127.0.0.1:9999/api/v10) to point the
+worker at a local stand-in server.
+"""
+
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+from itertools import count
+
+from db_pool import connection
+
+OUTBOX_DB = '/home/madadmin/clawd/data/discord-outbox.db'
+API_BASE = os.environ.get('DISCORD_API_BASE', 'https://discord.com/api/v10')
+CLAWDBOT_CONFIG = '/home/madadmin/.clawdbot/clawdbot.json'
+TOKEN_FILE = '/home/madadmin/.clawdbot/discord_token.txt'
+
+MAX_CONTENT = 2000        # Discord message length limit
+BATCH_SIZE = 20           # Messages claimed per round
+LEASE_SECONDS = 60        # A crashed worker's claim expires after this
+MAX_ATTEMPTS = 8          # Transient failures before a message is given up
+MAX_BACKOFF = 300         # Seconds
+POLL_INTERVAL = 5         # Idle check for messages queued by other processes
+NO_TOKEN_WAIT = 60        # Seconds everything waits while no bot token is configured
+REQUEST_TIMEOUT = 15
+KEEP_SENT = 7 * 86400     # Seconds delivered messages are kept for stats
+
+
+def split_content(content, limit=MAX_CONTENT):
+    """Pieces of at most limit chars, broken at a line end or space where possible"""
+    pieces = []
+    while len(content) > limit:
+        cut = content.rfind('\n', 0, limit + 1)
+        if cut <= 0:
+            cut = content.rfind(' ', 0, limit + 1)
+        if cut <= 0:
+            pieces.append(content[:limit])
+            content = content[limit:]
+        else:
+            pieces.append(content[:cut])
+            content = content[cut + 1:]   # Drop the separator itself
+    pieces.append(content)
+    return pieces
+
+
+class TokenCache:
+    """Bot token from the clawdbot config (or token file), re-read only when they change"""
+
+    def __init__(self, paths=(CLAWDBOT_CONFIG, TOKEN_FILE)):
+        self.paths = paths
+        self._key = None
+        self._token = None
+
+    def _signature(self):
+        sig = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                sig.append((st.st_ino, st.st_mtime_ns))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def get(self):
+        key = self._signature()
+        if key != self._key:
+            self._key = key
+            self._token = self._load()
+        return self._token
+
+    def _load(self):
+        config_path, token_path = self.paths
+        try:
+            with open(config_path) as f:
+                token = json.load(f).get('channels', {}).get('discord', {}).get('token')
+            if token:
+                return token
+        except Exception as e:
+            print(f"Could not read clawdbot config: {e}")
+        try:
+            with open(token_path) as f:
+                return f.read().strip() or None
+        except Exception as e:
+            print(f"Failed to read Discord token: {e}")
+            return None
+
+
+class DiscordOutbox:
+    """SQLite-backed Discord message outbox with a background sender"""
+
+    def __init__(self, db_path=OUTBOX_DB, api_base=API_BASE, token=None):
+        self.db_path = db_path
+        self.api_base = api_base.rstrip('/')
+        self.token = token if token is not None else TokenCache()
+        self._ready = False
+        self._http = None
+        self._claims = count(1)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def _connection(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            with connection(self.db_path) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        channel TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        mentions TEXT,
+                        created REAL NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt REAL NOT NULL DEFAULT 0,
+                        lease_owner TEXT,
+                        lease_until REAL,
+                        sent_at REAL,
+                        last_error TEXT
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_channel ON outbox(channel, status)')
+            self._ready = True
+        return connection(self.db_path)
+
+    # -------------------- producers --------------------
+
+    def enqueue(self, channel, content, mentions=None):
+        """Queue a message for delivery, returns its outbox id
+
+        A message over MAX_CONTENT is queued as several, in order; the id is
+        that of the first part.
+        """
+        now = time.time()
+        mentions = json.dumps(mentions) if mentions else None
+        with self._connection() as conn:
+            ids = [conn.execute(
+                'INSERT INTO outbox (channel, content, mentions, created) VALUES (?, ?, ?, ?)',
+                (str(channel), piece, mentions, now)
+            ).lastrowid for piece in split_content(content)]
+        self._wake.set()
+        return ids[0]
+
+    # -------------------- worker --------------------
+
+    def start(self):
+        """Start the background sender (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='discord-outbox')
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()   # Before claiming, so an enqueue during the round is not missed
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                print(f"Discord outbox error: {e}")
+                handled = 0
+            if not handled:
+                self._wake.wait(self._idle_wait())
+
+    def _idle_wait(self):
+        """Sleep until the next deferred message is due (or the poll interval)"""
+        try:
+            with self._connection() as conn:
+                due = conn.execute(
+                    "SELECT MIN(next_attempt) FROM outbox WHERE status='pending'"
+                ).fetchone()[0]
+        except Exception:
+            return POLL_INTERVAL
+        if due is None:
+            return POLL_INTERVAL
+        return min(max(due - time.time(), 0.05), POLL_INTERVAL)
+
+    def run_once(self):
+        """Claim one batch of due messages and deliver it; returns messages handled"""
+        if time.time() - self._pruned_at > 3600:
+            self._pruned_at = time.time()
+            self.prune()
+        rows = self._claim()
+        if not rows:
+            return 0
+        token = self.token.get() if isinstance(self.token, TokenCache) else self.token
+        if not token:
+            # Not the messages' fault: wait for a token without using up attempts
+            print(f"No Discord token available, holding {len(rows)} messages")
+            self._release([row['id'] for row in rows])
+            self._defer(None, NO_TOKEN_WAIT)
+            return 0
+        held = set()   # Channels deferred this round; their later posts must wait too
+        for channel, ids, payload in self._coalesce(rows):
+            if channel in held or '*' in held:
+                self._release(ids)
+            else:
+                outcome = self._deliver(channel, ids, payload, token)
+                if outcome != 'sent':
+                    held.add('*' if outcome == 'global' else channel)
+        return len(rows)
+
+    def _claim(self):
+        now = time.time()
+        owner = f"{os.getpid()}:{threading.get_ident()}:{next(self._claims)}"
+        with self._connection() as conn:
+            # One UPDATE, so two workers can never claim the same row
+            conn.execute('''
+                UPDATE outbox SET lease_owner=?, lease_until=?
+                WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE status='pending' AND next_attempt <= ?
+                      AND (lease_until IS NULL OR lease_until < ?)
+                    ORDER BY id LIMIT ?
+                )
+            ''', (owner, now + LEASE_SECONDS, now, now, BATCH_SIZE))
+            return conn.execute(
+                'SELECT id, channel, content, mentions, attempts FROM outbox WHERE lease_owner=? ORDER BY id',
+                (owner,)
+            ).fetchall()
+
+    def _coalesce(self, rows):
+        """Merge consecutive messages per channel into posts of at most MAX_CONTENT chars"""
+        groups = []
+        current = {}
+        for row in rows:
+            channel = row['channel']
+            mentions = json.loads(row['mentions']) if row['mentions'] else []
+            group = current.get(channel)
+            if group and len(group['content']) + 2 + len(row['content']) <= MAX_CONTENT:
+                group['content'] += '\n\n' + row['content']
+                group['ids'].append(row['id'])
+                group['mentions'].update(mentions)
+                continue
+            group = {'channel': channel, 'ids': [row['id']], 'content': row['content'],
+                     'mentions': set(mentions)}
+            current[channel] = group
+            groups.append(group)
+
+        for group in groups:
+            payload = {'content': group['content']}
+            if group['mentions']:
+                payload['allowed_mentions'] = {'users': sorted(group['mentions'])}
+            yield group['channel'], group['ids'], payload
+
+    def _deliver(self, channel, ids, payload, token):
+        """Post one coalesced message; returns sent / limited / global / retry / failed"""
+        try:
+            status, headers, body = self._post(f'/channels/{channel}/messages', payload, token)
+        except Exception as e:
+            self._retry(channel, ids, f"{type(e).__name__}: {e}")
+            return 'retry'
+
+        if 200 <= status < 300:
+            self._mark(ids, 'sent')
+            print(f"Discord message sent to channel {channel} ({len(ids)} queued)")
+            # Stay inside the bucket instead of waiting to be told off with a 429
+            if headers.get('X-RateLimit-Remaining') == '0':
+                self._defer(channel, float(headers.get('X-RateLimit-Reset-After') or 1))
+            return 'sent'
+        if status == 429:
+            try:
+                info = json.loads(body)
+            except ValueError:
+                info = {}
+            retry_after = float(info.get('retry_after') or headers.get('Retry-After') or 1)
+            is_global = info.get('global') or headers.get('X-RateLimit-Global') == 'true'
+            print(f"Discord rate limited ({'global' if is_global else channel}), retrying in {retry_after}s")
+            self._release(ids)
+            self._defer(None if is_global else channel, retry_after)
+            return 'global' if is_global else 'limited'
+        if status >= 500:
+            self._retry(channel, ids, f"HTTP {status}: {body[:200].decode(errors='replace')}")
+            return 'retry'
+        print(f"Discord API error: {status} - {body[:500].decode(errors='replace')}")
+        self._mark(ids, 'failed', f"HTTP {status}: {body[:500].decode(errors='replace')}")
+        return 'failed'
+
+    def _post(self, path, payload, token):
+        """POST over the shared keep-alive connection, reconnecting once if it went stale"""
+        url = urllib.parse.urlsplit(self.api_base)
+        body = json.dumps(payload).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bot {token}',
+            'User-Agent': 'CosmoDashboard (discord_outbox, 1.0)'
+        }
+        for attempt in (1, 2):
+            if self._http is None:
+                conn_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+                self._http = conn_class(url.netloc, timeout=REQUEST_TIMEOUT)
+            try:
+                self._http.request('POST', url.path + path, body=body, headers=headers)
+                response = self._http.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._close_http()
+                if attempt == 2:
+                    raise
+                continue
+            except Exception:
+                self._close_http()
+                raise
+            if response.will_close:
+                self._close_http()
+            return response.status, response.headers, data
+
+    def _close_http(self):
+        if self._http is not None:
+            try:
+                self._http.close()
+            except Exception:
+                pass
+            self._http = None
+
+    # -------------------- state changes --------------------
+
+    def _mark(self, ids, status, error=None):
+        marks = ','.join('?' * len(ids))
+        with self._connection() as conn:
+            conn.execute(
+                f'UPDATE outbox SET status=?, sent_at=?, last_error=?, lease_owner=NULL, lease_until=NULL WHERE id IN ({marks})',
+                [status, time.time() if status == 'sent' else None, error] + list(ids)
+            )
+
+    def _release(self, ids):
+        marks = ','.join('?' * len(ids))
+        with self._connection() as conn:
+            conn.execute(f'UPDATE outbox SET lease_owner=NULL, lease_until=NULL WHERE id IN ({marks})', list(ids))
+
+    def _defer(self, channel, seconds):
+        """Push back every pending message for a channel (all channels if None), keeping order"""
+        until = time.time() + seconds
+        with self._connection() as conn:
+            if channel is None:
+                conn.execute("UPDATE outbox SET next_attempt=MAX(next_attempt, ?) WHERE status='pending'", (until,))
+            else:
+                conn.execute("UPDATE outbox SET next_attempt=MAX(next_attempt, ?) WHERE status='pending' AND channel=?",
+                             (until, channel))
+
+    def _retry(self, channel, ids, error):
+        """Transient failure: count an attempt, back off exponentially, give up after MAX_ATTEMPTS"""
+        print(f"Failed to send Discord message: {error}")
+        marks = ','.join('?' * len(ids))
+        with self._connection() as conn:
+            conn.execute(
+                f'UPDATE outbox SET attempts=attempts+1, last_error=?, lease_owner=NULL, lease_until=NULL WHERE id IN ({marks})',
+                [error] + list(ids)
+            )
+            attempts = conn.execute(f'SELECT MAX(attempts) FROM outbox WHERE id IN ({marks})', list(ids)).fetchone()[0]
+            if attempts >= MAX_ATTEMPTS:
+                conn.execute(f"UPDATE outbox SET status='failed' WHERE id IN ({marks})", list(ids))
+                return
+        self._defer(channel, min(2 ** attempts, MAX_BACKOFF))
+
+    # -------------------- maintenance --------------------
+
+    def stats(self):
+        """Message counts by status plus the oldest pending message's age"""
+        with self._connection() as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall())
+            oldest = conn.execute("SELECT MIN(created) FROM outbox WHERE status='pending'").fetchone()[0]
+        return {
+            'pending': counts.get('pending', 0),
+            'sent': counts.get('sent', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_pending_age': round(time.time() - oldest, 1) if oldest else 0
+        }
+
+    def prune(self, keep_seconds=KEEP_SENT):
+        """Drop delivered messages older than keep_seconds"""
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM outbox WHERE status='sent' AND sent_at < ?",
+                                  (time.time() - keep_seconds,))
+            return cursor.rowcount
+
+
+outbox = DiscordOutbox()
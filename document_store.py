@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Revisioned JSON Documents
+dashboard-data.json / ideas.json kept in memory, changed by JSON Patch
+
+Every change bumps the document's revision. A patch is appended to a small
+journal next to the snapshot (<file>.journal, one compact JSON line per
+revision), so disk writes scale with the change, not the document. After
+COMPACT_OPS patches, or once the journal outgrows the snapshot, the snapshot
+is rewritten compactly with atomic_store (temp file + fsync + rename) and the
+journal starts over. Writers hold the file's advisory lock. The journal
+header records the snapshot it applies to. If someone else replaces the
+snapshot, the stale journal is ignored.
+
+Processes that only read the file should use load_document(), which replays
+the journal. snapshot_is_current() tells a reader when the snapshot file can
+be parsed on its own.
+"""
+
+import json
+import os
+import threading
+
+from atomic_store import locked, write_bytes
+from json_patch import apply_patch
+
+COMPACT_OPS = 500   # Journal entries before the snapshot is rewritten
+
+
+class RevisionConflict(Exception):
+    """The client's revision is not the current one"""
+
+    def __init__(self, current):
+        super().__init__(f"revision conflict (current revision is {current})")
+        self.current = current
+
+
+def encode(doc):
+    """Compact UTF-8 JSON"""
+    return json.dumps(doc, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _stat_key(st):
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def _read_journal(path):
+    """(header, [entries], bytes of intact lines); a torn last line is dropped"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None, [], 0
+    header = None
+    entries = []
+    good = 0
+    for line in raw.splitlines(keepends=True):
+        if not line.endswith(b'\n'):
+            break
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+        if header is None:
+            header = record
+        else:
+            entries.append(record)
+        good += len(line)
+    return header, entries, good
+
+
+def _load(path, default):
+    """(rev, document, journal) from snapshot + journal
+
+    journal is (entries, intact bytes) when it applies to this snapshot, else None
+    """
+    try:
+        with open(path, 'rb') as f:
+            doc = json.loads(f.read() or b'null')
+        st = os.stat(path)
+    except FileNotFoundError:
+        doc, st = default(), None
+    if doc is None:
+        doc = default()
+
+    header, entries, good = _read_journal(path + '.journal')
+    if header is None:
+        return 0, doc, None
+    base = header.get('base', 0)
+    if st is None or header.get('snapshot') != _stat_key(st):
+        # Snapshot was replaced behind our back: it already is the newest state
+        return base + len(entries) + 1, doc, None
+    for entry in entries:
+        doc = apply_patch(doc, entry['ops'])
+    return base + len(entries), doc, (entries, good)
+
+
+def snapshot_is_current(path):
+    """True when the snapshot file alone is the newest state (no journal entries apply)"""
+    header, entries, _ = _read_journal(path + '.journal')
+    if header is None or not entries:
+        return True
+    try:
+        return header.get('snapshot') != _stat_key(os.stat(path))
+    except OSError:
+        return True
+
+
+def load_document(path, default=dict):
+    """Read-only view of a store-managed file (snapshot with its journal replayed)"""
+    return _load(path, default)[1]
+
+
+class DocumentStore:
+    """A JSON document with a revision number, patched in place"""
+
+    def __init__(self, path, default=dict, compact_ops=COMPACT_OPS):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.default = default
+        self.compact_ops = compact_ops
+        self.rev = 0
+        self.doc = None
+        self._lock = threading.Lock()
+        self._signature = None
+        self._journal_ops = 0
+        self._encoded = None
+
+    def _disk_signature(self):
+        sig = []
+        for path in (self.path, self.journal_path):
+            try:
+                sig.append(tuple(_stat_key(os.stat(path))))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _refresh(self, holding_lock=False):
+        """(Re)load when the files changed outside this store"""
+        if self.doc is not None and self._disk_signature() == self._signature:
+            return
+        rev, doc, journal = _load(self.path, self.default)
+        if journal is not None and os.path.getsize(self.journal_path) > journal[1]:
+            # A torn final line, or a writer mid-append: only cut it under the
+            # file lock, after reading the journal again there
+            if holding_lock:
+                self._truncate_journal(journal[1])
+            else:
+                with locked(self.path):
+                    rev, doc, journal = _load(self.path, self.default)
+                    if journal is not None and os.path.getsize(self.journal_path) > journal[1]:
+                        self._truncate_journal(journal[1])
+        self.rev = max(rev, self.rev + 1) if self.doc is not None else rev
+        self.doc = doc
+        self._encoded = None
+        # No journal, or one for an older snapshot: the first write compacts
+        self._journal_ops = None if journal is None else len(journal[0])
+        self._signature = self._disk_signature()
+
+    def _truncate_journal(self, good):
+        """Drop a torn final line before appending after it; needs the file lock"""
+        with open(self.journal_path, 'r+b') as f:
+            f.truncate(good)
+
+    def _compact(self):
+        """Rewrite the snapshot and start an empty journal at the current revision"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        write_bytes(self.path, encode(self.doc))
+        header = {'base': self.rev, 'snapshot': _stat_key(os.stat(self.path))}
+        # Snapshot first: a crash in between leaves a stale journal that is ignored
+        write_bytes(self.journal_path, encode(header) + b'\n')
+        self._journal_ops = 0
+        self._signature = self._disk_signature()
+
+    def read(self):
+        """(rev, document); the document must not be modified by the caller"""
+        with self._lock:
+            self._refresh()
+            return self.rev, self.doc
+
+    def encoded(self):
+        """(rev, compact JSON bytes), encoded once per revision"""
+        with self._lock:
+            self._refresh()
+            if self._encoded is None or self._encoded[0] != self.rev:
+                self._encoded = (self.rev, encode(self.doc))
+            return self._encoded
+
+    def patch(self, operations, expected_rev=None):
+        """Apply JSON Patch operations; returns the new revision"""
+        with self._lock, locked(self.path):
+            self._refresh(holding_lock=True)
+            if expected_rev is not None and expected_rev != self.rev:
+                raise RevisionConflict(self.rev)
+            # Encoded first: applying may mutate the op values once the document holds them
+            line = encode({'rev': self.rev + 1, 'ops': operations}) + b'\n'
+            self.doc = apply_patch(self.doc, operations)
+            self.rev += 1
+            try:
+                if self._journal_ops is None:
+                    self._compact()
+                    return self.rev
+                with open(self.journal_path, 'ab') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal_ops += 1
+                if (self._journal_ops >= self.compact_ops or
+                        os.path.getsize(self.journal_path) > os.path.getsize(self.path)):
+                    self._compact()
+                else:
+                    self._signature = self._disk_signature()
+            except Exception:
+                self._signature = None  # Memory is ahead of disk: reload on next use
+                raise
+            return self.rev
+
+    def replace(self, doc, expected_rev=None):
+        """Replace the whole document; returns the new revision"""
+        with self._lock, locked(self.path):
+            self._refresh(holding_lock=True)
+            if expected_rev is not None and expected_rev != self.rev:
+                raise RevisionConflict(self.rev)
+            self.doc = doc
+            self.rev += 1
+            try:
+                self._compact()
+            except Exception:
+                self._signature = None
+                raise
+            return self.rev
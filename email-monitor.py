@@ -11,6 +11,10 @@ import urllib.request
 import time
 from datetime import datetime
 
+from atomic_store import read_json, write_json
+from dedup_store import DedupStore
+from notification_queue import NotificationQueue, TOPIC_PENDING
+
 # Load credentials
 ENV_FILE = '/home/madadmin/clawd/.env.agentmail'
 API_KEY = None
@@ -29,19 +33,21 @@ def load_credentials():
 load_credentials()
 BASE_URL = 'https://api.agentmail.to/v0'
 STATE_FILE = '/tmp/cosmo-email-state.json'
+NOTIF_FILE = '/home/madadmin/clawd/data/pending-notification.json'
+
+queue = NotificationQueue(TOPIC_PENDING, legacy_file=NOTIF_FILE)
+processed = DedupStore('email-monitor')
 
 def load_state():
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return {'processed_ids': [], 'last_check': None}
+    state = read_json(STATE_FILE) or {'last_check': None}
+    if 'processed_ids' in state:
+        # One-time move of the old ever-growing list into the dedup store
+        processed.add_many(state.pop('processed_ids'))
+        save_state(state)
+    return state
 
 def save_state(state):
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f)
+    write_json(STATE_FILE, state)
 
 def api_request(endpoint, method='GET', data=None):
     url = f"{BASE_URL}{endpoint}"
@@ -111,28 +117,14 @@ This is an automated response. Your message has been logged.
     # Mark as read
     mark_read(msg_id)
     
-    # Log to dashboard notification file
-    notification = {
+    # Queue dashboard notification
+    queue.enqueue({
         'type': 'email_received',
         'timestamp': datetime.now().isoformat(),
         'from': from_addr,
         'subject': subject,
         'message': f"📨 Email from {from_addr}: {subject}"
-    }
-    
-    NOTIF_FILE = '/home/madadmin/clawd/data/pending-notification.json'
-    notifications = []
-    if os.path.exists(NOTIF_FILE):
-        try:
-            with open(NOTIF_FILE, 'r') as f:
-                notifications = json.load(f)
-        except:
-            notifications = []
-    if not isinstance(notifications, list):
-        notifications = []
-    notifications.append(notification)
-    with open(NOTIF_FILE, 'w') as f:
-        json.dump(notifications, f, indent=2)
+    })
     
     return msg_id
 
@@ -143,25 +135,28 @@ def check_emails():
     if not messages or 'messages' not in messages:
         return
     
+    seen = processed.seen(msg.get('message_id') for msg in messages['messages'])
     new_count = 0
     for msg in messages['messages']:
         msg_id = msg.get('message_id')
         
         # Skip already processed
-        if msg_id in state['processed_ids']:
+        if msg_id in seen:
             continue
+        seen.add(msg_id)
         
         # Skip our own sent emails (check labels for 'sent')
         labels = msg.get('labels', [])
         if 'sent' in labels:
-            state['processed_ids'].append(msg_id)
             continue
         
         # Process new email
         process_email(msg)
-        state['processed_ids'].append(msg_id)
         new_count += 1
     
+    # Re-add every fetched ID, not just new ones: this refreshes their age, so
+    # messages that stay in the inbox never expire and get answered twice
+    processed.add_many(seen)
     state['last_check'] = datetime.now().isoformat()
     save_state(state)
     
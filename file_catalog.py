@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - File Catalogue
+Persistent, time-ordered listing of the upload and backup directories
+
+Each catalogued directory has its rows in file-catalog.db: name, size and
+mtime, indexed by (root, mtime, name). A listing first stats the directory
+itself. If its mtime is the one recorded at the last reconcile, nothing was
+added, removed or renamed, and the listing is a plain index read. If it
+changed, the names are read with os.scandir, and only new entries are
+stat()ed. Entries that disappeared are deleted. Editing a file in place does
+not touch its directory, so every root is fully re-statted at most once per
+RESCAN_INTERVAL as well.
+
+"Recent N" is therefore a bounded index read. Pages use a keyset cursor
+("<mtime>:<name>" of the last row), so deep pages cost the same as the first.
+"""
+
+import os
+import stat
+import threading
+import time
+
+from db_pool import connection
+
+CATALOG_DB = '/home/madadmin/clawd/data/file-catalog.db'
+RESCAN_INTERVAL = 300   # Seconds between full re-stats of a directory
+PAGE_DEFAULT = 100
+PAGE_MAX = 1000
+
+
+def encode_cursor(row):
+    return f"{row['mtime']!r}:{row['name']}"
+
+
+def decode_cursor(cursor):
+    """(mtime, name) from a cursor string; ValueError if malformed"""
+    mtime, name = cursor.split(':', 1)
+    return float(mtime), name
+
+
+class FileCatalog:
+    """Catalogue of the regular, non-hidden files directly inside some directories"""
+
+    def __init__(self, db_path=CATALOG_DB, rescan_interval=RESCAN_INTERVAL):
+        self.db_path = db_path
+        self.rescan_interval = rescan_interval
+        self._ready = False
+        self._lock = threading.Lock()
+        self._checked = {}   # root -> (dir mtime_ns, time of last full re-stat)
+        self._time_sources = {}   # root -> function adjusting the listed time of new rows
+
+    def set_time_source(self, root, time_source):
+        """Let time_source([(name, size, mtime), ...]) choose the time rows are listed by
+
+        For directories where a file's mtime is not when it arrived, such as
+        uploads hard-linked to an older blob with the same content.
+        """
+        self._time_sources[os.path.abspath(root)] = time_source
+
+    def _connection(self):
+        if not self._ready:
+            self._init_db()
+        return connection(self.db_path)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with connection(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    root TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    PRIMARY KEY (root, name)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_files_recent ON files(root, mtime, name)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS roots (
+                    root TEXT PRIMARY KEY,
+                    dir_mtime_ns INTEGER,
+                    rescanned REAL
+                )
+            ''')
+        self._ready = True
+
+    def _entry(self, root, name):
+        """(name, size, mtime) for a regular visible file, or None"""
+        if name.startswith('.'):
+            return None
+        try:
+            st = os.stat(os.path.join(root, name))
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return name, st.st_size, st.st_mtime
+
+    def refresh(self, root):
+        """Bring root's rows up to date; cheap when the directory did not change"""
+        root = os.path.abspath(root)
+        try:
+            dir_mtime = os.stat(root).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+        now = time.time()
+        with self._lock:
+            checked = self._checked.get(root)
+            if checked is None:
+                with self._connection() as conn:
+                    row = conn.execute('SELECT dir_mtime_ns, rescanned FROM roots WHERE root=?',
+                                       (root,)).fetchone()
+                checked = (row[0], row[1] or 0) if row else (-1, 0)
+            full = now - checked[1] >= self.rescan_interval
+            if dir_mtime == checked[0] and not full:
+                self._checked[root] = checked
+                return False
+            # A directory changed within the last second may change again without
+            # its mtime moving on coarse-timestamp filesystems: check it next time
+            recorded = dir_mtime if dir_mtime is None or now - dir_mtime / 1e9 >= 1 else -1
+            self._reconcile(root, recorded, full)
+            self._checked[root] = (recorded, now if full else checked[1])
+        return True
+
+    def _reconcile(self, root, dir_mtime, full):
+        names = set()
+        if os.path.isdir(root):
+            try:
+                with os.scandir(root) as entries:
+                    names = {entry.name for entry in entries
+                             if not entry.name.startswith('.') and entry.is_file()}
+            except OSError:
+                names = set()
+        with self._connection() as conn:
+            known = {row[0] for row in conn.execute('SELECT name FROM files WHERE root=?', (root,))}
+            gone = known - names
+            to_stat = names if full else names - known
+            rows = [entry for entry in (self._entry(root, name) for name in to_stat) if entry]
+            if rows and root in self._time_sources:
+                rows = self._time_sources[root](rows)
+            conn.executemany('DELETE FROM files WHERE root=? AND name=?',
+                             [(root, name) for name in gone])
+            conn.executemany('INSERT OR REPLACE INTO files (root, name, size, mtime) VALUES (?, ?, ?, ?)',
+                             [(root,) + entry for entry in rows])
+            conn.execute('''
+                INSERT INTO roots (root, dir_mtime_ns, rescanned) VALUES (?, ?, ?)
+                ON CONFLICT(root) DO UPDATE SET dir_mtime_ns=excluded.dir_mtime_ns,
+                    rescanned=CASE WHEN ? THEN excluded.rescanned ELSE rescanned END
+            ''', (root, dir_mtime, time.time(), 1 if full else 0))
+
+    def list(self, root, limit=PAGE_DEFAULT, cursor=None, pattern=None):
+        """(newest-first rows, next cursor or None); pattern is a GLOB on the name ('*.tar.gz')"""
+        root = os.path.abspath(root)
+        self.refresh(root)
+        limit = max(1, min(int(limit), PAGE_MAX))
+        sql = 'SELECT name, size, mtime FROM files WHERE root=?'
+        params = [root]
+        if pattern:
+            sql += ' AND name GLOB ?'
+            params.append(pattern)
+        if cursor:
+            mtime, name = decode_cursor(cursor)
+            sql += ' AND (mtime < ? OR (mtime = ? AND name < ?))'
+            params += [mtime, mtime, name]
+        sql += ' ORDER BY mtime DESC, name DESC LIMIT ?'
+        params.append(limit + 1)
+        with self._connection() as conn:
+            rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        for row in rows:
+            row['path'] = os.path.join(root, row['name'])
+        return rows[:limit], next_cursor
+
+
+catalog = FileCatalog()
@@ -6,14 +6,19 @@ Port: 9091
 """
 
 import os
-import json
-import uuid
+import tempfile
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+from notification_queue import NotificationQueue, TOPIC_NOTIFICATIONS
+from range_download import send_file_range, send_from_directory_range
+from blob_store import BlobStore
+from file_catalog import catalog as file_catalog, PAGE_DEFAULT as CATALOG_PAGE
+from chunked_upload import UploadManager, register_routes as register_upload_routes
+from backup_builder import builder as backup_builder, BackupBusy, BACKUP_DIR, EXTENSIONS as BACKUP_EXTENSIONS, snapshot_sqlite
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor'])
 
 UPLOAD_FOLDER = '/home/madadmin/.clawdbot/media/inbound'
 NOTIFICATIONS_FILE = '/home/madadmin/clawd/data/notifications.json'
@@ -26,19 +31,30 @@ ALLOWED_EXTENSIONS = {
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+notification_queue = NotificationQueue(TOPIC_NOTIFICATIONS, legacy_file=NOTIFICATIONS_FILE)
+
 def write_notification(notification):
-    """Write notification to file for Cosmo to pick up"""
-    os.makedirs(os.path.dirname(NOTIFICATIONS_FILE), exist_ok=True)
-    notifications = []
-    if os.path.exists(NOTIFICATIONS_FILE):
-        try:
-            with open(NOTIFICATIONS_FILE, 'r') as f:
-                notifications = json.load(f)
-        except:
-            notifications = []
-    notifications.append(notification)
-    with open(NOTIFICATIONS_FILE, 'w') as f:
-        json.dump(notifications, f, indent=2)
+    """Queue notification for Cosmo to pick up"""
+    notification_queue.enqueue(notification)
+
+# Resumable chunked uploads (/api/upload/init, PUT chunks, finalize)
+# Deduplicated, indexed storage behind UPLOAD_FOLDER
+blob_store = BlobStore(UPLOAD_FOLDER)
+file_catalog.set_time_source(UPLOAD_FOLDER, blob_store.upload_times)
+upload_manager = UploadManager(UPLOAD_FOLDER, allowed=ALLOWED_EXTENSIONS, store=blob_store)
+
+def on_upload_complete(info):
+    write_notification({
+        'type': 'file_uploaded',
+        'timestamp': datetime.now().isoformat(),
+        'filename': info['filename'],
+        'path': info['path'],
+        'size': info['size'],
+        'sha256': info['sha256'],
+        'channel': '1466517317403021362'
+    })
+
+register_upload_routes(app, upload_manager, on_upload_complete)
 
 from flask import make_response
 
@@ -86,19 +102,18 @@ def upload_file():
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_name = f"{uuid.uuid4()}.{ext}"
-        filepath = os.path.join(UPLOAD_FOLDER, unique_name)
-        
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        file.save(filepath)
+        # Hashed while written; duplicates become hard links to the existing blob
+        info = blob_store.add_stream(file.stream, file.filename,
+                                     uploader=request.headers.get('X-Uploader') or request.remote_addr)
+        filepath = info['path']
         
         write_notification({
             'type': 'file_uploaded',
             'timestamp': datetime.now().isoformat(),
             'filename': file.filename,
             'path': filepath,
-            'size': os.path.getsize(filepath),
+            'size': info['size'],
+            'sha256': info['sha256'],
             'channel': '1466517317403021362'
         })
         
@@ -115,48 +130,49 @@ def upload_file():
 def get_recent_uploads():
     """Get list of recent uploads"""
     try:
-        files = []
-        if os.path.exists(UPLOAD_FOLDER):
-            for f in os.listdir(UPLOAD_FOLDER):
-                filepath = os.path.join(UPLOAD_FOLDER, f)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
-                    files.append({
-                        'name': f,
-                        'size': format_file_size(stat.st_size),
-                        'path': filepath,
-                        'time': datetime.fromtimestamp(stat.st_mtime).isoformat()
-                    })
-        files.sort(key=lambda x: x['time'], reverse=True)
-        return jsonify(files[:10])
+        # Newest 10 straight from the catalogue's time index
+        rows, _ = file_catalog.list(UPLOAD_FOLDER, limit=10)
+        files = [{
+            'name': row['name'],
+            'size': format_file_size(row['size']),
+            'path': row['path'],
+            'time': datetime.fromtimestamp(row['mtime']).isoformat()
+        } for row in rows]
+        return jsonify(files)
     except Exception as e:
         return jsonify([])
 
 @app.route('/api/download/<filename>')
 def download_file(filename):
     """Download a file from the upload folder"""
-    return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=True)
+    return send_from_directory_range(UPLOAD_FOLDER, filename, as_attachment=True)
 
 @app.route('/api/files')
 def list_files():
-    """List all files (for 2-way transfer)"""
+    """List files for 2-way transfer, newest first, one page at a time"""
     try:
-        files = []
-        if os.path.exists(UPLOAD_FOLDER):
-            for f in os.listdir(UPLOAD_FOLDER):
-                filepath = os.path.join(UPLOAD_FOLDER, f)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
-                    files.append({
-                        'name': f,
-                        'original_name': f,  # Could store original name in DB
-                        'size': stat.st_size,
-                        'size_formatted': format_file_size(stat.st_size),
-                        'uploaded_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        'download_url': f'/api/download/{f}'
-                    })
-        files.sort(key=lambda x: x['uploaded_at'], reverse=True)
-        return jsonify({'files': files})
+        # One page, newest first; pass ?cursor=<next_cursor> for the next one
+        rows, next_cursor = file_catalog.list(UPLOAD_FOLDER,
+                                              limit=request.args.get('limit', CATALOG_PAGE, type=int),
+                                              cursor=request.args.get('cursor'))
+        files = [{
+            'name': row['name'],
+            'original_name': row['name'],
+            'size': row['size'],
+            'size_formatted': format_file_size(row['size']),
+            'uploaded_at': datetime.fromtimestamp(row['mtime']).isoformat(),
+            'download_url': f"/api/download/{row['name']}"
+        } for row in rows]
+        # Original names and hashes of uploads come from the blob store's index
+        indexed = blob_store.lookup(f['name'] for f in files)
+        for f in files:
+            if f['name'] in indexed:
+                f['original_name'] = indexed[f['name']]['original_name']
+                f['sha256'] = indexed[f['name']]['sha256']
+        response = jsonify({'files': files, 'next_cursor': next_cursor})
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except Exception as e:
         return jsonify({'files': [], 'error': str(e)})
 
@@ -169,44 +185,54 @@ def format_file_size(size):
 
 @app.route('/api/backups')
 def list_backups():
-    """List available backup files for Bowz and Nebula"""
+    """List available backup files for Bowz and Nebula
+
+    Each kind is paged newest first: ?type=full_backup|code_backup&cursor=
+    continues one of them from next_cursors (also sent as X-Next-Cursor).
+    """
     try:
         backups = []
+        limit = request.args.get('limit', CATALOG_PAGE, type=int)
+        kind = request.args.get('type')
+        cursor = request.args.get('cursor')
+        if cursor and kind not in ('full_backup', 'code_backup'):
+            return jsonify({'backups': [], 'error': 'cursor needs type=full_backup or type=code_backup'}), 400
+        next_cursors = {}
         
-        # Full system backups (tar.gz archives)
-        full_backup_dir = '/home/madadmin/clawd/backups'
-        if os.path.exists(full_backup_dir):
-            for f in os.listdir(full_backup_dir):
-                if f.endswith('.tar.gz') and os.path.isfile(os.path.join(full_backup_dir, f)):
-                    filepath = os.path.join(full_backup_dir, f)
-                    stat = os.stat(filepath)
-                    backups.append({
-                        'name': f,
-                        'type': 'full_backup',
-                        'size': stat.st_size,
-                        'size_formatted': format_file_size(stat.st_size),
-                        'created_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        'download_url': f'/api/download-full-backup/{f}'
-                    })
+        # Full system backups (tar.gz / tar.zst archives)
+        if kind in (None, 'full_backup'):
+            rows, next_cursors['full_backup'] = file_catalog.list(BACKUP_DIR, limit=limit, cursor=cursor,
+                                                                  pattern='*.tar.*')
+            for row in rows:
+                if not row['name'].endswith(tuple(BACKUP_EXTENSIONS.values())):
+                    continue
+                backups.append({
+                    'name': row['name'],
+                    'type': 'full_backup',
+                    'size': row['size'],
+                    'size_formatted': format_file_size(row['size']),
+                    'created_at': datetime.fromtimestamp(row['mtime']).isoformat(),
+                    'download_url': f"/api/download-full-backup/{row['name']}"
+                })
         
         # Code backups (versioned files)
-        backup_dir = '/home/madadmin/clawd/cosmo-dashboard'
-        for f in os.listdir(backup_dir):
-            if '.v' in f and os.path.isfile(os.path.join(backup_dir, f)):
-                filepath = os.path.join(backup_dir, f)
-                stat = os.stat(filepath)
+        if kind in (None, 'code_backup'):
+            backup_dir = '/home/madadmin/clawd/cosmo-dashboard'
+            rows, next_cursors['code_backup'] = file_catalog.list(backup_dir, limit=limit, cursor=cursor,
+                                                                  pattern='*.v*')
+            for row in rows:
                 backups.append({
-                    'name': f,
+                    'name': row['name'],
                     'type': 'code_backup',
-                    'size': stat.st_size,
-                    'size_formatted': format_file_size(stat.st_size),
-                    'created_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    'download_url': f'/api/download-backup/{f}'
+                    'size': row['size'],
+                    'size_formatted': format_file_size(row['size']),
+                    'created_at': datetime.fromtimestamp(row['mtime']).isoformat(),
+                    'download_url': f"/api/download-backup/{row['name']}"
                 })
         
-        # Database backup
+        # Database backup (first page only)
         db_path = '/home/madadmin/clawd/cosmo-dashboard/data/dashboard.db'
-        if os.path.exists(db_path):
+        if kind is None and os.path.exists(db_path):
             stat = os.stat(db_path)
             backups.append({
                 'name': 'dashboard.db',
@@ -218,7 +244,10 @@ def list_backups():
             })
         
         backups.sort(key=lambda x: x['created_at'], reverse=True)
-        return jsonify({'backups': backups})
+        response = jsonify({'backups': backups, 'next_cursors': next_cursors})
+        if kind and next_cursors.get(kind):
+            response.headers['X-Next-Cursor'] = next_cursors[kind]
+        return response
     except Exception as e:
         return jsonify({'backups': [], 'error': str(e)})
 
@@ -244,7 +273,18 @@ def download_backup(filename):
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 404
         
-        return send_from_directory(os.path.dirname(filepath), os.path.basename(filepath), as_attachment=True)
+        if filename == 'dashboard.db':
+            # The live file misses whatever is still in -wal: send a snapshot.
+            # The response holds its own descriptor, so the copy can go at once
+            fd, snapshot = tempfile.mkstemp(prefix='dashboard-', suffix='.db')
+            os.close(fd)
+            try:
+                snapshot_sqlite(filepath, snapshot)
+                return send_file_range(snapshot, as_attachment=True, download_name=filename)
+            finally:
+                os.unlink(snapshot)
+        
+        return send_file_range(filepath, as_attachment=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -252,11 +292,11 @@ def download_backup(filename):
 def download_full_backup(filename):
     """Download full system backup archives"""
     try:
-        # Security: only allow .tar.gz files from backups folder
-        if not filename.endswith('.tar.gz'):
+        # Security: only allow backup archives from backups folder
+        if not filename.endswith(tuple(BACKUP_EXTENSIONS.values())):
             return jsonify({'error': 'Invalid file type'}), 403
         
-        backup_dir = '/home/madadmin/clawd/backups'
+        backup_dir = BACKUP_DIR
         filepath = os.path.join(backup_dir, filename)
         
         # Security check: ensure file is within backups directory
@@ -268,10 +308,44 @@ def download_full_backup(filename):
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 404
         
-        return send_from_directory(backup_dir, filename, as_attachment=True)
+        # Range requests let multi-GB archives resume or download in parallel segments
+        return send_file_range(real_path, as_attachment=True, download_name=filename)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/backups/create', methods=['POST'])
+def create_backup():
+    """Build a backup archive into the backups folder"""
+    data = request.get_json(silent=True) or {}
+    try:
+        result = backup_builder.build(incremental=bool(data.get('incremental')),
+                                      compression=data.get('compression', 'gz'))
+        result.pop('path', None)
+        result['download_url'] = f"/api/download-full-backup/{result['name']}"
+        result['success'] = True
+        return jsonify(result)
+    except BackupBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/backups/stream')
+def stream_backup():
+    """Build a backup archive straight into the response, without saving it"""
+    incremental = request.args.get('incremental', '').lower() in ('1', 'true', 'yes')
+    compression = request.args.get('compression', 'gz')
+    try:
+        archive = backup_builder.stream(incremental=incremental, compression=compression)
+    except BackupBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    mimetype = 'application/zstd' if compression == 'zst' else 'application/gzip'
+    return Response(archive, mimetype=mimetype, direct_passthrough=True,
+                    headers={'Content-Disposition': f'attachment; filename="{archive.name}"'})
+
 if __name__ == '__main__':
     print("🚀 Starting Cosmo File Transfer Server...")
     print(f"📁 Upload folder: {UPLOAD_FOLDER}")
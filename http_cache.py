@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Conditional GET Support
+Strong ETags and Last-Modified for read APIs, validated from file stats
+
+A view wrapped with @conditional(sources) only runs when its sources changed.
+Sources are cheap stat() signatures of the files behind the response (the
+SQLite database and its WAL, sessions.json, ...) plus an in-process write
+generation, so a 304 never touches the database or the JSON encoder.
+"""
+
+import functools
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from flask import make_response, request
+
+_lock = threading.Lock()
+_generation = 0
+_stats = {'hits': 0, 'misses': 0, 'endpoints': {}}
+
+
+def bump():
+    """Mark in-process data as changed (covers writes within one mtime tick)"""
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def file_sources(*paths):
+    """(path, inode, size, mtime_ns) for each path; missing files count too"""
+    sources = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sources.append((path, st.st_ino, st.st_size, st.st_mtime_ns))
+        except OSError:
+            sources.append((path, 0, 0, 0))
+    return sources
+
+
+def sqlite_sources(db_path):
+    """Stat signature of a WAL-mode database (commits land in the -wal file)"""
+    return file_sources(db_path, db_path + '-wal')
+
+
+def _record(endpoint, hit):
+    with _lock:
+        _stats['hits' if hit else 'misses'] += 1
+        counts = _stats['endpoints'].setdefault(endpoint, {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+
+
+def _not_modified(etag, last_modified):
+    inm = request.headers.get('If-None-Match')
+    if inm:
+        tags = [t.strip() for t in inm.split(',')]
+        return etag in tags or '*' in tags
+    ims = request.headers.get('If-Modified-Since')
+    if ims and last_modified:
+        # Second-granularity dates can't see two writes in the same second
+        if time.time() - last_modified < 1:
+            return False
+        try:
+            return int(last_modified) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional(sources_fn):
+    """Decorator: answer 304 when sources_fn() is unchanged for this URL"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            sources = sources_fn()
+            digest = hashlib.sha1(
+                repr((sources, _generation, request.full_path)).encode()
+            ).hexdigest()[:24]
+            etag = f'"{digest}"'
+            mtimes = [s[3] for s in sources if len(s) > 3 and isinstance(s[3], int)]
+            last_modified = max(mtimes) / 1e9 if mtimes and max(mtimes) else None
+
+            if _not_modified(etag, last_modified):
+                _record(request.endpoint, True)
+                response = make_response('', 304)
+            else:
+                _record(request.endpoint, False)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = 'no-cache'
+            if last_modified:
+                response.headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Hit (304) / miss counters, overall and per endpoint"""
+    with _lock:
+        endpoints = {name: dict(counts) for name, counts in _stats['endpoints'].items()}
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 3) if total else 0,
+        'endpoints': endpoints
+    }
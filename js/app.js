@@ -7,7 +7,8 @@ const state = {
     ideas: [],
     tasks: [],
     logs: [],
-    systemStatus: {}
+    systemStatus: {},
+    version: 0  // Change-journal version the local state reflects
 };
 
 // Current filter for ideas
@@ -41,10 +42,12 @@ function initWebSocket() {
         
         socket.on('new_activity', (data) => {
             console.log('📝 New activity:', data);
-            // Add to logs array and re-render
-            state.logs.unshift(data);
-            if (state.logs.length > 100) state.logs.pop();
-            renderLogs();
+            // Add to logs array and re-render (skip if a delta sync already added it)
+            if (!state.logs.some(l => l.id === data.id)) {
+                state.logs.unshift(data);
+                if (state.logs.length > 100) state.logs.pop();
+                renderLogs();
+            }
             
             // Show notification
             showActivityNotification(data);
@@ -64,6 +67,9 @@ function updateConnectionStatus(connected) {
 }
 
 function handleRealtimeUpdate(update) {
+    if (update.version > state.version) {
+        syncChanges();
+    }
     if (update.type === 'system_stats') {
         // Update system stats in real-time
         document.getElementById('sys-cpu').textContent = update.data.cpu + '%';
@@ -125,25 +131,42 @@ function updateTime() {
 
 // ==================== DATA LOADING ====================
 
+// List endpoints are keyset-paginated (?after_id=&limit=), newest first.
+// The board needs every row, so pages are followed until X-Next-After-Id runs out.
+const PAGE_LIMIT = 200;
+
+async function fetchAllPages(url, rowsOf = body => body) {
+    const rows = [];
+    let afterId = null;
+    do {
+        const cursor = afterId === null ? '' : `&after_id=${encodeURIComponent(afterId)}`;
+        const res = await fetch(`${url}?limit=${PAGE_LIMIT}${cursor}`);
+        rows.push(...rowsOf(await res.json()));
+        afterId = res.headers.get('X-Next-After-Id');
+    } while (afterId !== null);
+    return rows;
+}
+
 async function loadAllData() {
     try {
+        // Remember the version first; anything newer is picked up by syncChanges()
+        const versionRes = await fetch('/api/changes');
+        const versionData = await versionRes.json();
+        
         // Load projects
-        const projectsRes = await fetch('/api/projects');
-        state.projects = await projectsRes.json();
+        state.projects = await fetchAllPages('/api/projects');
         
         // Load ideas
-        const ideasRes = await fetch('/api/ideas');
-        const ideasData = await ideasRes.json();
-        state.ideas = ideasData.ideas || [];
+        state.ideas = await fetchAllPages('/api/ideas', body => body.ideas || []);
         
         // Load tasks
-        const tasksRes = await fetch('/api/tasks');
-        state.tasks = await tasksRes.json();
+        state.tasks = await fetchAllPages('/api/tasks');
         
         // Load logs
         const logsRes = await fetch('/api/logs');
         state.logs = await logsRes.json();
         
+        state.version = versionData.version || 0;
         renderAll();
         console.log('✅ All data loaded from SQLite');
     } catch (e) {
@@ -151,6 +174,52 @@ async function loadAllData() {
     }
 }
 
+// ==================== DELTA SYNC ====================
+
+let syncInFlight = false;
+
+// Merge changed rows into a list kept newest-first by id
+function mergeRows(list, upserted, deleted, maxLength) {
+    const removed = new Set(deleted);
+    upserted.forEach(row => removed.add(row.id));
+    const merged = list.filter(item => !removed.has(item.id)).concat(upserted);
+    merged.sort((a, b) => b.id - a.id);
+    return maxLength ? merged.slice(0, maxLength) : merged;
+}
+
+async function syncChanges() {
+    if (syncInFlight) return;
+    syncInFlight = true;
+    try {
+        let more = true;
+        while (more) {
+            const res = await fetch(`/api/changes?since=${state.version}`);
+            const delta = await res.json();
+            if (delta.reset) {
+                await loadAllData();
+                return;
+            }
+            const changes = delta.changes || {};
+            const apply = (table, key, maxLength) => {
+                if (changes[table]) {
+                    state[key] = mergeRows(state[key], changes[table].upserted, changes[table].deleted, maxLength);
+                }
+            };
+            apply('projects', 'projects');
+            apply('ideas', 'ideas');
+            apply('tasks', 'tasks');
+            apply('activity_log', 'logs', 100);
+            state.version = delta.version;
+            more = delta.more;
+            if (Object.keys(changes).length) renderAll();
+        }
+    } catch (e) {
+        console.error('Delta sync failed:', e);
+    } finally {
+        syncInFlight = false;
+    }
+}
+
 function renderAll() {
     renderProjectsPreview();
     renderProjectsBoard();
@@ -681,6 +750,12 @@ function systemHealth() {
                     <div style="font-size: 1.5rem; color: var(--accent-blue);">madserver</div>
                 </div>
             </div>
+            <div style="margin-top: 1.5rem; padding: 1rem; background: var(--bg-tertiary); border-radius: 8px;">
+                <div style="color: var(--text-secondary); font-size: 0.8rem; margin-bottom: 0.5rem;">
+                    Last 6 hours — <span style="color: var(--accent-green);">CPU</span> · <span style="color: var(--accent-blue);">Memory</span>
+                </div>
+                <div id="modal-history" style="height: 120px;">Loading...</div>
+            </div>
             <div style="margin-top: 1.5rem; padding: 1rem; background: rgba(63, 185, 80, 0.1); border: 1px solid var(--accent-green); border-radius: 8px; text-align: center;">
                 ✅ All Systems Operational
             </div>
@@ -696,6 +771,27 @@ function systemHealth() {
         if (memEl) memEl.textContent = data.memory + '%';
         if (diskEl) diskEl.textContent = data.disk + '%';
     }).catch(() => {});
+
+    fetch('/api/system/history?range=6h').then(r => r.json()).then(data => {
+        const el = document.getElementById('modal-history');
+        if (el) el.innerHTML = renderHistoryChart(data, ['cpu', 'memory']);
+    }).catch(() => {});
+}
+
+// Inline SVG line chart for /api/system/history (values are percentages)
+function renderHistoryChart(data, metrics) {
+    const t = data.t || [];
+    if (t.length < 2) return '<p style="color: var(--text-secondary)">Not enough history yet</p>';
+    const colors = { cpu: 'var(--accent-green)', memory: 'var(--accent-blue)', disk: 'var(--accent-yellow)' };
+    const width = 600, height = 120;
+    const t0 = t[0], span = (t[t.length - 1] - t0) || 1;
+    const lines = metrics.map(m => {
+        const points = data[m].map((v, i) =>
+            `${((t[i] - t0) / span * width).toFixed(1)},${(height - v / 100 * height).toFixed(1)}`
+        ).join(' ');
+        return `<polyline fill="none" stroke="${colors[m]}" stroke-width="1.5" points="${points}"/>`;
+    }).join('');
+    return `<svg viewBox="0 0 ${width} ${height}" preserveAspectRatio="none" style="width: 100%; height: 100%;">${lines}</svg>`;
 }
 
 function exportLogs() {
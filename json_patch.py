@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - JSON Patch
+RFC 6902 operations (add, remove, replace, move, copy, test) over RFC 6901 pointers
+
+apply_patch() changes the document in place and records an undo step per
+operation. If any operation fails, the steps are unwound, so the document is
+either fully patched or untouched. No copy of the whole document is made.
+"""
+
+import copy
+
+
+class JsonPatchError(ValueError):
+    """The patch is malformed or cannot be applied to this document"""
+
+
+class JsonPatchTestFailed(JsonPatchError):
+    """A 'test' operation did not match"""
+
+
+def parse_pointer(pointer):
+    """'/a/b~1c/0' -> ['a', 'b/c', '0']"""
+    if not isinstance(pointer, str):
+        raise JsonPatchError(f"pointer must be a string: {pointer!r}")
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise JsonPatchError(f"pointer must start with '/': {pointer}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _index(container, token, pointer, allow_end=False):
+    if token == '-' and allow_end:
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise JsonPatchError(f"invalid array index '{token}' in {pointer}")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise JsonPatchError(f"array index {index} out of range in {pointer}")
+    return index
+
+
+def _resolve(doc, tokens, pointer):
+    """The container holding the last token"""
+    node = doc
+    for token in tokens[:-1]:
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"path not found: {pointer}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token, pointer)]
+        else:
+            raise JsonPatchError(f"path not found: {pointer}")
+    return node
+
+
+def get_value(doc, pointer):
+    node = doc
+    for token in parse_pointer(pointer):
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"path not found: {pointer}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token, pointer)]
+        else:
+            raise JsonPatchError(f"path not found: {pointer}")
+    return node
+
+
+class _Patcher:
+    """Applies operations to one document, keeping an undo log"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.undo = []
+
+    def add(self, pointer, value):
+        tokens = parse_pointer(pointer)
+        if not tokens:
+            old = self.doc
+            self.doc = value
+            self.undo.append(lambda: setattr(self, 'doc', old))
+            return
+        parent = _resolve(self.doc, tokens, pointer)
+        key = tokens[-1]
+        if isinstance(parent, dict):
+            if key in parent:
+                old = parent[key]
+                self.undo.append(lambda: parent.__setitem__(key, old))
+            else:
+                self.undo.append(lambda: parent.pop(key))
+            parent[key] = value
+        elif isinstance(parent, list):
+            index = _index(parent, key, pointer, allow_end=True)
+            parent.insert(index, value)
+            self.undo.append(lambda: parent.pop(index))
+        else:
+            raise JsonPatchError(f"path not found: {pointer}")
+
+    def remove(self, pointer):
+        tokens = parse_pointer(pointer)
+        if not tokens:
+            raise JsonPatchError("cannot remove the whole document")
+        parent = _resolve(self.doc, tokens, pointer)
+        key = tokens[-1]
+        if isinstance(parent, dict):
+            if key not in parent:
+                raise JsonPatchError(f"path not found: {pointer}")
+            old = parent.pop(key)
+            self.undo.append(lambda: parent.__setitem__(key, old))
+        elif isinstance(parent, list):
+            index = _index(parent, key, pointer)
+            old = parent.pop(index)
+            self.undo.append(lambda: parent.insert(index, old))
+        else:
+            raise JsonPatchError(f"path not found: {pointer}")
+        return old
+
+    def replace(self, pointer, value):
+        get_value(self.doc, pointer)  # Target must exist
+        tokens = parse_pointer(pointer)
+        if not tokens:
+            return self.add(pointer, value)
+        parent = _resolve(self.doc, tokens, pointer)
+        key = tokens[-1] if isinstance(parent, dict) else _index(parent, tokens[-1], pointer)
+        old = parent[key]
+        parent[key] = value
+        self.undo.append(lambda: parent.__setitem__(key, old))
+
+    def move(self, from_pointer, pointer):
+        if pointer != from_pointer and pointer.startswith(from_pointer + '/'):
+            raise JsonPatchError(f"cannot move {from_pointer} into its own child {pointer}")
+        value = self.remove(from_pointer)
+        self.add(pointer, value)
+
+    def copy(self, from_pointer, pointer):
+        self.add(pointer, copy.deepcopy(get_value(self.doc, from_pointer)))
+
+    def test(self, pointer, value):
+        actual = get_value(self.doc, pointer)
+        # JSON equality: 1 and true are different values
+        if actual != value or isinstance(actual, bool) != isinstance(value, bool):
+            raise JsonPatchTestFailed(f"test failed at {pointer}")
+
+    def apply(self, operation):
+        if not isinstance(operation, dict):
+            raise JsonPatchError(f"operation must be an object: {operation!r}")
+        op = operation.get('op')
+        if 'path' not in operation:
+            raise JsonPatchError(f"operation is missing 'path': {operation!r}")
+        path = operation['path']
+        if op in ('add', 'replace', 'test'):
+            if 'value' not in operation:
+                raise JsonPatchError(f"'{op}' operation is missing 'value'")
+            # A copy, so later operations never change the caller's value
+            getattr(self, op)(path, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            self.remove(path)
+        elif op in ('move', 'copy'):
+            if 'from' not in operation:
+                raise JsonPatchError(f"'{op}' operation is missing 'from'")
+            getattr(self, op)(operation['from'], path)
+        else:
+            raise JsonPatchError(f"unknown operation: {op!r}")
+
+    def rollback(self):
+        while self.undo:
+            self.undo.pop()()
+
+
+def apply_patch(doc, operations):
+    """Apply a list of operations to doc (in place, all or nothing); returns the document"""
+    if not isinstance(operations, list):
+        raise JsonPatchError("patch must be a list of operations")
+    patcher = _Patcher(doc)
+    try:
+        for operation in operations:
+            patcher.apply(operation)
+    except JsonPatchError:
+        patcher.rollback()
+        raise
+    except (TypeError, AttributeError) as e:
+        patcher.rollback()
+        raise JsonPatchError(str(e))
+    return patcher.doc
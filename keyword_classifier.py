@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Keyword Classifier
+Single-pass keyword rules for the evaluator (complexity, priority, ...)
+
+The keywords of every rule group are merged into one table, and compiled into
+a single regex that finds every keyword in one findall over the description.
+Whole words match, so "ai" no longer matches inside "maintain". Within a group
+the earliest matching rule wins, so the order of rules in the rules file is
+their precedence. A trailing plural "s" is accepted, and so is any run of
+spaces or punctuation inside a phrase.
+
+Rules live in evaluator_rules.json and are reloaded when the file changes.
+
+Benchmark: python3 keyword_classifier.py [descriptions]. It runs over the
+dashboard's own idea and project descriptions and over synthetic ones. The
+text is encoded and every ASCII separator translated to a space first, so the
+pattern can start with a literal space: the engine then jumps from one word
+start to the next instead of trying the alternation at every character.
+The margin is smaller on the synthetic corpus, where the substring chain
+usually stops early on a false hit ("ai" in "maintain").
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'evaluator_rules.json')
+
+
+# Every ASCII byte that is not a word character separates words
+_SEPARATORS = bytes(b for b in range(128) if not (chr(b).isalnum() or chr(b) == '_'))
+_TO_SPACE = bytes.maketrans(_SEPARATORS, b' ' * len(_SEPARATORS))
+
+
+def _prepare(text):
+    return b' ' + text.lower().encode('utf-8').translate(_TO_SPACE)
+
+
+def _normalize(keyword):
+    return b' '.join(_prepare(keyword).split())
+
+
+class KeywordClassifier:
+    """Classifies text against ordered keyword rules in every group at once"""
+
+    def __init__(self, rules):
+        self.groups = {}
+        targets = {}   # keyword -> [(group, rule index, rule), ...]
+        for group, spec in rules.items():
+            entries = spec.get('rules', [])
+            self.groups[group] = (entries, spec.get('default', {}))
+            for index, rule in enumerate(entries):
+                for keyword in rule.get('keywords', []):
+                    keyword = _normalize(keyword)
+                    if not keyword:
+                        continue
+                    keyword_targets = targets.setdefault(keyword, [])
+                    if all(target[:2] != (group, index) for target in keyword_targets):
+                        keyword_targets.append((group, index, rule))
+
+        # One alternation over every keyword, scanned once in C. Keywords are
+        # grouped under their first letter (longest first within a group). The
+        # lookahead stands in for \b, which on bytes would split at UTF-8.
+        self._targets = targets
+        self._defaults = {group: default for group, (entries, default) in self.groups.items()}
+        by_first = {}
+        for keyword in sorted(targets, key=len, reverse=True):
+            by_first.setdefault(keyword[:1], []).append(rb' +'.join(map(re.escape, keyword.split()))[len(re.escape(keyword[:1])):])
+        self._pattern = None
+        if by_first:
+            alternation = b'|'.join(re.escape(first) + b'(?:' + b'|'.join(rests) + b')' for first, rests in by_first.items())
+            self._pattern = re.compile(rb' (' + alternation + rb')s?(?![a-z0-9_\x80-\xff])')
+
+    def classify(self, text):
+        """{group: winning rule (or the group's default)} from one scan of text"""
+        result = self._defaults.copy()
+        if not text or self._pattern is None:
+            return result
+        best = {}
+        for match in self._pattern.findall(_prepare(text)):
+            keyword_targets = self._targets.get(match)
+            if keyword_targets is None:
+                keyword_targets = self._targets[b' '.join(match.split())]   # Phrase with extra spaces
+            for group, index, rule in keyword_targets:
+                if index < best.get(group, index + 1):
+                    best[group] = index
+                    result[group] = rule
+        return result
+
+
+def load_rules(path=RULES_FILE):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_classifier(path=RULES_FILE):
+    """Classifier for a rules file, rebuilt only when the file's mtime changes"""
+    mtime = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    classifier = KeywordClassifier(load_rules(path))
+    with _cache_lock:
+        _cache[path] = (mtime, classifier)
+    return classifier
+
+
+# -------------------- benchmark --------------------
+
+def _substring_classify(rules, text):
+    """The old approach: one any(word in text) scan per rule"""
+    text = text.lower()
+    result = {}
+    for group, spec in rules.items():
+        result[group] = spec.get('default', {})
+        for rule in spec.get('rules', []):
+            if any(word in text for word in rule.get('keywords', [])):
+                result[group] = rule
+                break
+    return result
+
+
+def _corpus(count, seed=42):
+    import random
+    rng = random.Random(seed)
+    filler = ('build', 'a', 'the', 'tool', 'for', 'team', 'maintain', 'daily', 'reports', 'with',
+              'users', 'data', 'pipeline', 'dashboard', 'service', 'quick', 'and', 'explain',
+              'guide', 'status', 'manage', 'plan', 'new', 'feature', 'to', 'improve', 'workflow')
+    keywords = ('AI', 'ml', 'machine learning', 'neural', 'models', 'automation', 'bot', 'scripts',
+                'cron', 'monitor', 'API', 'webhooks', 'Discord', 'slack', 'UI', 'frontend', 'CSS',
+                'react', 'YouTube', 'urgent', 'security', 'bug', 'revenue', 'income', 'business')
+    corpus = []
+    for _ in range(count):
+        words = [rng.choice(filler) for _ in range(rng.randint(15, 80))]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        corpus.append(' '.join(words))
+    return corpus
+
+
+def _real_descriptions():
+    """Titles and descriptions of the dashboard's own ideas and projects"""
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    texts = []
+    for name, key, title in (('ideas.json', 'ideas', 'title'), ('dashboard-data.json', 'projects', 'name')):
+        try:
+            with open(os.path.join(data_dir, name)) as f:
+                items = json.load(f).get(key, [])
+        except (OSError, ValueError, AttributeError):
+            continue
+        texts += [f"{item.get(title, '')} {item.get('description', '')}" for item in items
+                  if isinstance(item, dict)]
+    return [text for text in texts if text.strip()]
+
+
+def _compare(rules, classifier, corpus, label):
+    count = len(corpus)
+    print(f"📊 {count} {label}, {sum(map(len, corpus)) // count} chars on average")
+
+    # Best of five, alternating the two so neither gets the quieter moments
+    timings = {'old': [], 'new': []}
+    for _ in range(5):
+        for key, fn in (('old', lambda text: _substring_classify(rules, text)), ('new', classifier.classify)):
+            start = time.perf_counter()
+            results = [fn(text) for text in corpus]
+            timings[key].append(time.perf_counter() - start)
+            if key == 'old':
+                old = results
+            else:
+                new = results
+    old_time, new_time = min(timings['old']), min(timings['new'])
+
+    changed = sum(1 for a, b in zip(old, new)
+                  if any(a[group] is not b[group] for group in rules))
+    print(f"   substring scans: {old_time:.3f}s ({count / old_time:,.0f}/s)")
+    print(f"   compiled regex:  {new_time:.3f}s ({count / new_time:,.0f}/s)")
+    print(f"   {changed} results differ (substring false positives such as 'ai' in 'maintain')")
+
+
+def benchmark(count=50000):
+    rules = load_rules()
+    classifier = KeywordClassifier(rules)
+    real = _real_descriptions()
+    if real:
+        _compare(rules, classifier, (real * (count // len(real) + 1))[:count],
+                 f"descriptions cycled from {len(real)} real ideas and projects")
+    _compare(rules, classifier, _corpus(count), "synthetic descriptions")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
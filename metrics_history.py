@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - System Metrics History
+Compact time series of CPU, memory and disk with automatic rollups
+
+Samples from the system sampler are averaged into three tiers (5 s for the
+last hour, 1 min for a day, 1 h for 90 days). Each tier is a set of
+fixed-size array('f') ring buffers indexed by time bucket, so storage never
+grows. Closed 1 min / 1 h buckets are persisted to SQLite and reloaded on
+start, so a restart keeps the long-range history.
+"""
+
+import os
+import re
+import threading
+import time
+from array import array
+
+from db_pool import connection
+
+METRICS_DB = '/home/madadmin/clawd/data/metrics.db'
+METRICS = ('cpu', 'memory', 'disk')
+
+# (name, bucket seconds, buckets kept, persisted)
+TIERS = (
+    ('5s', 5, 720, False),        # 1 hour
+    ('1m', 60, 1440, True),       # 24 hours
+    ('1h', 3600, 24 * 90, True),  # 90 days
+)
+MAX_POINTS = 1000   # Upper bound on points returned by one query
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value, default=None):
+    """'90s', '15m', '6h', '7d' or plain seconds -> seconds"""
+    if value is None or value == '':
+        return default
+    match = re.fullmatch(r'\s*(\d+)\s*([smhd]?)\s*', str(value))
+    if not match:
+        raise ValueError(f"invalid duration: {value}")
+    return int(match.group(1)) * _UNITS[match.group(2) or 's']
+
+
+class Tier:
+    """Ring buffers of per-bucket averages, slot = bucket % capacity"""
+
+    def __init__(self, name, step, capacity, persisted):
+        self.name = name
+        self.step = step
+        self.capacity = capacity
+        self.persisted = persisted
+        self.buckets = array('q', [-1]) * capacity
+        self.values = {m: array('f', [0.0]) * capacity for m in METRICS}
+        # Bucket being accumulated
+        self.open_bucket = None
+        self.sums = dict.fromkeys(METRICS, 0.0)
+        self.count = 0
+
+    def put(self, bucket, values):
+        slot = bucket % self.capacity
+        self.buckets[slot] = bucket
+        for m in METRICS:
+            self.values[m][slot] = values[m]
+
+    def add(self, now, sample):
+        """Accumulate a sample; returns (bucket, averages) when a bucket closes"""
+        bucket = int(now // self.step)
+        closed = None
+        if self.open_bucket is not None and bucket != self.open_bucket and self.count:
+            closed = (self.open_bucket, {m: self.sums[m] / self.count for m in METRICS})
+            self.put(*closed)
+            self.sums = dict.fromkeys(METRICS, 0.0)
+            self.count = 0
+        self.open_bucket = bucket
+        for m in METRICS:
+            self.sums[m] += float(sample.get(m) or 0)
+        self.count += 1
+        return closed
+
+    def get(self, bucket):
+        """Averages for a bucket (including the open one), or None"""
+        if bucket == self.open_bucket and self.count:
+            return {m: self.sums[m] / self.count for m in METRICS}
+        slot = bucket % self.capacity
+        if self.buckets[slot] != bucket:
+            return None
+        return {m: self.values[m][slot] for m in METRICS}
+
+
+class MetricsHistory:
+    """Tiered in-memory history, persisted rollups in SQLite"""
+
+    def __init__(self, db_path=METRICS_DB, tiers=TIERS):
+        self.db_path = db_path
+        self.tiers = [Tier(*t) for t in tiers]
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def attach(self, sampler):
+        """Record every sample the system sampler takes"""
+        sampler.listeners.append(self.add)
+
+    def _init(self):
+        self._ready = True
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            with connection(self.db_path) as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS metrics (
+                        tier TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        cpu REAL, memory REAL, disk REAL,
+                        PRIMARY KEY (tier, bucket)
+                    ) WITHOUT ROWID
+                ''')
+                for tier in self.tiers:
+                    if not tier.persisted:
+                        continue
+                    rows = conn.execute(
+                        'SELECT bucket, cpu, memory, disk FROM metrics WHERE tier=? ORDER BY bucket DESC LIMIT ?',
+                        (tier.name, tier.capacity)
+                    ).fetchall()
+                    for bucket, cpu, memory, disk in reversed(rows):
+                        tier.put(bucket, {'cpu': cpu, 'memory': memory, 'disk': disk})
+        except Exception as e:
+            print(f"Metrics history load error: {e}")
+
+    def _persist(self, tier, bucket, values):
+        try:
+            with connection(self.db_path) as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO metrics (tier, bucket, cpu, memory, disk) VALUES (?, ?, ?, ?, ?)',
+                    (tier.name, bucket, values['cpu'], values['memory'], values['disk'])
+                )
+                conn.execute('DELETE FROM metrics WHERE tier=? AND bucket <= ?',
+                             (tier.name, bucket - tier.capacity))
+        except Exception as e:
+            print(f"Metrics history persist error: {e}")
+
+    def add(self, sample, now=None):
+        """Feed one {'cpu', 'memory', 'disk'} sample into every tier"""
+        now = time.time() if now is None else now
+        closed = []
+        with self._lock:
+            if not self._ready:
+                self._init()
+            for tier in self.tiers:
+                result = tier.add(now, sample)
+                if result and tier.persisted:
+                    closed.append((tier,) + result)
+        for tier, bucket, values in closed:
+            self._persist(tier, bucket, values)
+
+    def _pick_tier(self, range_seconds, step):
+        """Finest tier that covers the range, preferring one no coarser than step"""
+        covering = [t for t in self.tiers if t.step * t.capacity >= range_seconds] or self.tiers[-1:]
+        for tier in covering:
+            if tier.step <= step:
+                return tier
+        return covering[0]
+
+    def query(self, range_seconds=3600, step=None, now=None):
+        """Columnar series {'t': [...], 'cpu': [...], ...} averaged to `step` seconds"""
+        now = time.time() if now is None else now
+        if step is None:
+            step = max(range_seconds // 300, 1)
+        step = max(step, range_seconds // MAX_POINTS, 1)
+        with self._lock:
+            if not self._ready:
+                self._init()
+            tier = self._pick_tier(range_seconds, step)
+            # Output buckets are whole multiples of the tier's bucket
+            per_point = max(step // tier.step, 1)
+            step = per_point * tier.step
+            last = int(now // tier.step)
+            first = max(int((now - range_seconds) // tier.step) + 1, last - tier.capacity + 1)
+            first -= first % per_point
+
+            series = {'t': []}
+            series.update({m: [] for m in METRICS})
+            for start in range(first, last + 1, per_point):
+                points = [v for v in (tier.get(b) for b in range(start, min(start + per_point, last + 1))) if v]
+                if not points:
+                    continue
+                series['t'].append(start * tier.step)
+                for m in METRICS:
+                    series[m].append(round(sum(p[m] for p in points) / len(points), 1))
+
+        series.update({'range': range_seconds, 'step': step, 'tier': tier.name})
+        return series
+
+
+metrics_history = MetricsHistory()
@@ -1,114 +1,320 @@
 #!/usr/bin/env python3
 """
 Migrate old JSON data to SQLite database
+
+The legacy files are streamed: arrays are decoded one element at a time from
+1 MB chunks, so memory stays flat however large the files are. Rows are
+written with executemany in BATCH_SIZE transactions, and the load runs with
+synchronous=OFF in WAL mode. Sync is restored afterwards.
+
+Re-running is safe. Projects, tasks and ideas are upserted by id, and rows
+that did not change are left alone. Activity log entries have no natural key,
+so each one is recorded in migrate_seen by content hash plus occurrence
+number and is inserted only once.
 """
 
+import hashlib
 import json
-import sqlite3
 import os
+import sqlite3
+import time
+
+from document_store import load_document, snapshot_is_current
 
 DB_PATH = '/home/madadmin/clawd/cosmo-dashboard/data/dashboard.db'
 OLD_DATA_FILE = '/home/madadmin/clawd/cosmo-dashboard/data/dashboard-data.json'
 OLD_IDEAS_FILE = '/home/madadmin/clawd/cosmo-dashboard/data/ideas.json'
 
-def migrate_data():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+BATCH_SIZE = 5000            # Rows per transaction
+CHUNK_SIZE = 1024 * 1024     # Characters read from a legacy file at a time
+PROGRESS_INTERVAL = 1.0      # Seconds between progress lines
+
+# -------------------- streaming JSON --------------------
+
+class _StreamReader:
+    """Incremental JSON tokens over a file read in chunks"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of file)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal ending at the buffer edge may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """Elements of the array at the current position, one at a time"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"expected ',' or ']' at offset {self.pos - 1}")
+
+
+def iter_sections(path, chunk_size=CHUNK_SIZE):
+    """Yield (key, element) for every array element of a top-level JSON object
+
+    Non-array members are skipped; a top-level array yields (None, element).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _StreamReader(f, chunk_size)
+        char = reader.peek()
+        if char == '[':
+            for item in reader.items():
+                yield None, item
+            return
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if reader.peek() == '[':
+                for item in reader.items():
+                    yield key, item
+            else:
+                reader.value()
+            char = reader.peek()
+            reader.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"expected ',' or '}}' at offset {reader.pos - 1}")
+
+
+def iter_document(path):
+    """(key, element) pairs of a legacy file, streamed unless its journal holds PATCHes"""
+    if snapshot_is_current(path):
+        yield from iter_sections(path)
+        return
+    # Snapshot plus any PATCHes still in its journal
+    for key, value in load_document(path).items():
+        if isinstance(value, list):
+            for item in value:
+                yield key, item
+
+# -------------------- rows --------------------
+
+def project_row(p):
+    return (p.get('id'), p.get('name'), p.get('description', ''),
+            p.get('status', 'pending-review'), p.get('created', ''), p.get('created', ''))
+
+
+def task_row(t):
+    return (t.get('id'), t.get('title'), t.get('project', 'General'),
+            t.get('priority', 'medium'), 1 if t.get('done') else 0)
+
+
+def idea_row(i):
+    return (i.get('id'), i.get('title'), i.get('description', ''), i.get('priority', 'medium'),
+            i.get('status', 'open'), i.get('assignee', 'team'), i.get('created', ''),
+            i.get('createdBy', 'Cosmo'))
+
+
+def log_row(log):
+    return (log.get('time', ''), log.get('type', 'info'), log.get('message', ''))
+
+
+def _upsert(table, columns):
+    """INSERT ... ON CONFLICT(id) DO UPDATE that skips rows whose values are unchanged"""
+    others = [c for c in columns if c != 'id']
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in others)} "
+            f"WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in others)}")
+
+
+UPSERTS = {
+    'projects': _upsert('projects', ('id', 'name', 'description', 'status', 'created', 'updated')),
+    'tasks': _upsert('tasks', ('id', 'title', 'project', 'priority', 'done')),
+    'ideas': _upsert('ideas', ('id', 'title', 'description', 'priority', 'status',
+                               'assignee', 'created', 'createdBy')),
+}
+
+# Legacy section -> (table, row builder)
+SECTIONS = {
+    'projects': ('projects', project_row),
+    'tasks': ('tasks', task_row),
+    'logs': ('activity_log', log_row),
+    'ideas': ('ideas', idea_row),
+}
+
+# -------------------- engine --------------------
+
+class Migration:
+    """Batched, idempotent load of legacy rows into the dashboard database"""
+
+    def __init__(self, db_path=DB_PATH, batch_size=BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(db_path)
+        self.pending = {table: [] for table, _ in SECTIONS.values()}
+        self.counts = {table: 0 for table in self.pending}
+        self.log_occurrences = {}
+        self.rows = 0
+        self.started = time.time()
+        self.last_report = self.started
+
+    def __enter__(self):
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=OFF')   # Relaxed only for the bulk load
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS migrate_seen (
+                hash TEXT PRIMARY KEY
+            ) WITHOUT ROWID
+        ''')
+        if self.conn.execute('SELECT 1 FROM migrate_seen LIMIT 1').fetchone() is None:
+            self._seed_seen()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.conn.rollback()
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.conn.close()
+        return False
+
+    def _log_hash(self, row):
+        """Content hash plus occurrence number, so repeated identical entries are kept"""
+        digest = hashlib.sha1(json.dumps(row, ensure_ascii=False).encode()).hexdigest()
+        n = self.log_occurrences.get(digest, 0) + 1
+        self.log_occurrences[digest] = n
+        return f"{digest}:{n}"
+
+    def _seed_seen(self):
+        """Record log rows imported by runs before migrate_seen existed"""
+        cursor = self.conn.execute('SELECT time, type, message FROM activity_log ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            self.conn.executemany('INSERT OR IGNORE INTO migrate_seen (hash) VALUES (?)',
+                                  [(self._log_hash(tuple(row)),) for row in rows])
+        self.conn.commit()
+        self.log_occurrences = {}
+
+    def add(self, section, item):
+        if section not in SECTIONS or not isinstance(item, dict):
+            return
+        table, build = SECTIONS[section]
+        self.pending[table].append(build(item))
+        self.rows += 1
+        if self.rows % self.batch_size == 0:
+            self.flush()
+        self._report()
+
+    def flush(self):
+        """Write everything pending in one transaction"""
+        with self.conn:
+            for table, rows in self.pending.items():
+                if not rows:
+                    continue
+                if table == 'activity_log':
+                    keyed = [(self._log_hash(row), row) for row in rows]
+                    hashes = [(h,) for h, _ in keyed]
+                    # Insert only rows whose hash is new, then record the hashes
+                    self.conn.executemany('''
+                        INSERT INTO activity_log (time, type, message)
+                        SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM migrate_seen WHERE hash=?)
+                    ''', [row + (h,) for h, row in keyed])
+                    self.conn.executemany('INSERT OR IGNORE INTO migrate_seen (hash) VALUES (?)', hashes)
+                else:
+                    self.conn.executemany(UPSERTS[table], rows)
+                self.counts[table] += len(rows)
+                rows.clear()
+
+    def _report(self, force=False):
+        now = time.time()
+        if not force and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        print(f"   ... {self.rows} rows, {self.rows / elapsed:,.0f} rows/sec")
+
+
+def migrate_data(db_path=DB_PATH, files=(OLD_DATA_FILE, OLD_IDEAS_FILE)):
     print("🔄 Migrating data to SQLite...")
-    
-    # Migrate projects
-    if os.path.exists(OLD_DATA_FILE):
-        with open(OLD_DATA_FILE) as f:
-            old_data = json.load(f)
-        
-        projects = old_data.get('projects', [])
-        for p in projects:
-            cursor.execute('''
-                INSERT OR REPLACE INTO projects (id, name, description, status, created, updated)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                p.get('id'),
-                p.get('name'),
-                p.get('description', ''),
-                p.get('status', 'pending-review'),
-                p.get('created', ''),
-                p.get('created', '')
-            ))
-        print(f"✅ Migrated {len(projects)} projects")
-        
-        # Migrate tasks
-        tasks = old_data.get('tasks', [])
-        for t in tasks:
-            cursor.execute('''
-                INSERT OR REPLACE INTO tasks (id, title, project, priority, done)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                t.get('id'),
-                t.get('title'),
-                t.get('project', 'General'),
-                t.get('priority', 'medium'),
-                1 if t.get('done') else 0
-            ))
-        print(f"✅ Migrated {len(tasks)} tasks")
-        
-        # Migrate activity log
-        logs = old_data.get('logs', [])
-        for log in logs:
-            cursor.execute('''
-                INSERT INTO activity_log (time, type, message)
-                VALUES (?, ?, ?)
-            ''', (
-                log.get('time', ''),
-                log.get('type', 'info'),
-                log.get('message', '')
-            ))
-        print(f"✅ Migrated {len(logs)} log entries")
-    
-    # Migrate ideas
-    if os.path.exists(OLD_IDEAS_FILE):
-        with open(OLD_IDEAS_FILE) as f:
-            ideas_data = json.load(f)
-        
-        ideas = ideas_data.get('ideas', [])
-        for i in ideas:
-            cursor.execute('''
-                INSERT OR REPLACE INTO ideas (id, title, description, priority, status, assignee, created, createdBy)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                i.get('id'),
-                i.get('title'),
-                i.get('description', ''),
-                i.get('priority', 'medium'),
-                i.get('status', 'open'),
-                i.get('assignee', 'team'),
-                i.get('created', ''),
-                i.get('createdBy', 'Cosmo')
-            ))
-        print(f"✅ Migrated {len(ideas)} ideas")
-    
-    conn.commit()
-    conn.close()
+
+    with Migration(db_path) as migration:
+        for path in files:
+            if not os.path.exists(path):
+                continue
+            for section, item in iter_document(path):
+                migration.add(section, item)
+        migration.flush()
+        migration._report(force=True)
+
+    for section, (table, _) in SECTIONS.items():
+        print(f"✅ Migrated {migration.counts[table]} {section}")
     print("\n🎉 Migration complete!")
-    
+
     # Show summary
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    
+
     cursor.execute('SELECT COUNT(*) FROM projects')
     project_count = cursor.fetchone()[0]
-    
+
     cursor.execute('SELECT COUNT(*) FROM ideas')
     idea_count = cursor.fetchone()[0]
-    
+
     cursor.execute('SELECT COUNT(*) FROM tasks')
     task_count = cursor.fetchone()[0]
-    
+
     cursor.execute('SELECT COUNT(*) FROM activity_log')
     log_count = cursor.fetchone()[0]
-    
+
     conn.close()
-    
+
     print(f"\n📊 Database now contains:")
     print(f"   Projects: {project_count}")
     print(f"   Ideas: {idea_count}")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Cosmo Notification Queue
+Durable append-only queue on SQLite with per-consumer cursors
+
+Producers call enqueue(); consumers read everything after their cursor with
+consume() and move the cursor forward with ack() once a batch is handled.
+Appends are single INSERTs in WAL mode, so concurrent writers from different
+processes never lose each other's entries.
+"""
+
+import json
+import os
+from datetime import datetime
+
+from atomic_store import locked
+from db_pool import connection
+
+QUEUE_DB = '/home/madadmin/clawd/data/notifications.db'
+
+# Topics replace the old JSON files
+TOPIC_NOTIFICATIONS = 'notifications'   # was notifications.json (dashboard -> project evaluator)
+TOPIC_PENDING = 'pending'               # was pending-notification.json (monitors -> cosmo evaluator)
+
+KEEP_ACKED = 5000   # Acknowledged entries kept per topic for /api/notifications history
+
+
+class NotificationQueue:
+    """One topic of the shared notification queue"""
+
+    def __init__(self, topic=TOPIC_NOTIFICATIONS, db_path=QUEUE_DB, legacy_file=None):
+        self.topic = topic
+        self.db_path = db_path
+        self.legacy_file = legacy_file
+        self._ready = False
+
+    def _connection(self):
+        if not self._ready:
+            self._init_db()
+        return connection(self.db_path)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with connection(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS queue (
+                    offset INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    created TEXT,
+                    payload TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_topic ON queue(topic, offset)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cursors (
+                    consumer TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    offset INTEGER NOT NULL DEFAULT 0,
+                    updated TEXT,
+                    PRIMARY KEY (consumer, topic)
+                )
+            ''')
+        self._ready = True
+        self._import_legacy()
+
+    def _import_legacy(self):
+        """One-time import of unprocessed entries from the old JSON file"""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        # The lock means only one process imports the file. It is renamed
+        # only once its entries are committed, so a failed parse leaves it
+        # in place for the next start
+        with locked(self.legacy_file):
+            try:
+                with open(self.legacy_file, 'r') as f:
+                    entries = json.load(f)
+            except FileNotFoundError:
+                return
+            except Exception as e:
+                print(f"Queue: could not import {self.legacy_file}: {e}")
+                return
+            if not isinstance(entries, list):
+                entries = []
+            pending = [n for n in entries if isinstance(n, dict) and not n.get('processed')]
+            self.enqueue_many(pending)
+            os.replace(self.legacy_file, self.legacy_file + '.imported')
+        print(f"📦 Imported {len(pending)} notifications from {self.legacy_file}")
+
+    # -------------------- producers --------------------
+
+    def enqueue(self, notification):
+        """Append one notification, returns its offset"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                'INSERT INTO queue (topic, created, payload) VALUES (?, ?, ?)',
+                (self.topic, datetime.now().isoformat(), json.dumps(notification))
+            )
+            return cursor.lastrowid
+
+    def enqueue_many(self, notifications):
+        """Append several notifications in one transaction"""
+        now = datetime.now().isoformat()
+        rows = [(self.topic, now, json.dumps(n)) for n in notifications]
+        if not rows:
+            return 0
+        with self._connection() as conn:
+            conn.executemany('INSERT INTO queue (topic, created, payload) VALUES (?, ?, ?)', rows)
+        return len(rows)
+
+    # -------------------- consumers --------------------
+
+    def position(self, consumer):
+        """Last acknowledged offset for a consumer"""
+        with self._connection() as conn:
+            row = conn.execute('SELECT offset FROM cursors WHERE consumer=? AND topic=?',
+                               (consumer, self.topic)).fetchone()
+        return row[0] if row else 0
+
+    def consume(self, consumer, limit=100):
+        """Next batch after the consumer's cursor as [(offset, notification), ...]"""
+        with self._connection() as conn:
+            rows = conn.execute('''
+                SELECT offset, payload FROM queue
+                WHERE topic=? AND offset > COALESCE(
+                    (SELECT offset FROM cursors WHERE consumer=? AND topic=?), 0)
+                ORDER BY offset
+                LIMIT ?
+            ''', (self.topic, consumer, self.topic, limit)).fetchall()
+        batch = []
+        for offset, payload in rows:
+            try:
+                batch.append((offset, json.loads(payload)))
+            except ValueError:
+                batch.append((offset, {}))
+        return batch
+
+    def ack(self, consumer, offset):
+        """Move the consumer's cursor forward to offset (never backwards)"""
+        with self._connection() as conn:
+            conn.execute('''
+                INSERT INTO cursors (consumer, topic, offset, updated) VALUES (?, ?, ?, ?)
+                ON CONFLICT(consumer, topic) DO UPDATE
+                SET offset=MAX(offset, excluded.offset), updated=excluded.updated
+            ''', (consumer, self.topic, offset, datetime.now().isoformat()))
+
+    def lag(self, consumer):
+        """Number of entries the consumer has not acknowledged yet"""
+        with self._connection() as conn:
+            row = conn.execute('''
+                SELECT COUNT(*) FROM queue
+                WHERE topic=? AND offset > COALESCE(
+                    (SELECT offset FROM cursors WHERE consumer=? AND topic=?), 0)
+            ''', (self.topic, consumer, self.topic)).fetchone()
+        return row[0]
+
+    # -------------------- maintenance --------------------
+
+    def recent(self, limit=100):
+        """Most recent notifications, oldest first (same order as the old file)"""
+        with self._connection() as conn:
+            rows = conn.execute(
+                'SELECT payload FROM queue WHERE topic=? ORDER BY offset DESC LIMIT ?',
+                (self.topic, limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def prune(self, keep=KEEP_ACKED):
+        """Drop entries every consumer has acknowledged, keeping the newest `keep`"""
+        with self._connection() as conn:
+            row = conn.execute('SELECT MIN(offset) FROM cursors WHERE topic=?',
+                               (self.topic,)).fetchone()
+            acked = row[0] if row and row[0] is not None else 0
+            # Offsets are shared by all topics: count this topic's own rows
+            row = conn.execute('''
+                SELECT offset FROM queue WHERE topic=? ORDER BY offset DESC LIMIT 1 OFFSET ?
+            ''', (self.topic, keep)).fetchone()
+            if row is None:
+                return 0
+            cutoff = min(acked, row[0])
+            if cutoff <= 0:
+                return 0
+            cursor = conn.execute('DELETE FROM queue WHERE topic=? AND offset <= ?',
+                                  (self.topic, cutoff))
+            return cursor.rowcount
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - /proc Process Scanner
+Finds the background python workers (monitors, evaluators, email) without forking `ps`
+
+Each scan lists /proc once and reads every PID's stat (one small read).
+cmdline is read only for PIDs that are new, or whose start time or command
+name changed since the last scan (PID reused, or exec). Matching candidates
+get CPU and RSS from that same stat read. Results are cached for a short TTL.
+The generation, used in ETags, moves only when the result changes: which
+workers run, or the CPU and RSS figures shown for them. Idle workers
+therefore keep answering 304.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+PROC_ROOT = '/proc'
+CACHE_TTL = 2.0   # Seconds a scan result is reused
+MATCH_WORDS = ('monitor', 'evaluator', 'email')
+
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def is_background_worker(cmd):
+    """Same rule the old `ps aux` filter used"""
+    return 'python3' in cmd and any(word in cmd for word in MATCH_WORDS)
+
+
+class ProcessScanner:
+    """Incremental, TTL-cached scan of /proc for background workers"""
+
+    def __init__(self, matcher=is_background_worker, ttl=CACHE_TTL, proc_root=PROC_ROOT):
+        self.matcher = matcher
+        self.ttl = ttl
+        self.proc_root = proc_root
+        self.generation = 0       # Bumped when the scan result changes (used for ETags)
+        self._identity = None     # Digest of the last result
+        self._lock = threading.Lock()
+        self._pids = {}           # pid -> ((starttime, comm), cmdline for candidates or None)
+        self._samples = {}        # pid -> (starttime, cpu_ticks, monotonic time)
+        self._result = []
+        self._scanned_at = 0.0
+
+    def _read_cmdline(self, pid):
+        try:
+            with open(f'{self.proc_root}/{pid}/cmdline', 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+        return raw.replace(b'\0', b' ').decode(errors='replace').strip()
+
+    def _read_stat(self, pid):
+        """(starttime, utime+stime ticks, rss bytes, comm) from /proc/<pid>/stat"""
+        try:
+            with open(f'{self.proc_root}/{pid}/stat', 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+        # comm may contain spaces/parens - fields resume after the last ')'
+        end = raw.rfind(b')')
+        comm = raw[raw.find(b'(') + 1:end]
+        fields = raw[end + 2:].split()
+        try:
+            ticks = int(fields[11]) + int(fields[12])
+            starttime = int(fields[19])
+            rss = int(fields[21]) * PAGE_SIZE
+        except (IndexError, ValueError):
+            return None
+        return starttime, ticks, rss, comm
+
+    def scan(self):
+        """Current background workers with CPU% and RSS (cached for ttl seconds)"""
+        now = time.monotonic()
+        if now - self._scanned_at < self.ttl:
+            return self._result
+        with self._lock:
+            if now - self._scanned_at < self.ttl:
+                return self._result
+            try:
+                current = {int(name) for name in os.listdir(self.proc_root) if name.isdigit()}
+            except OSError:
+                current = set()
+
+            # Forget vanished PIDs. A PID whose start time or command name changed
+            # was reused or exec'd: classify it again, otherwise reuse the verdict
+            for pid in set(self._pids) - current:
+                del self._pids[pid]
+                self._samples.pop(pid, None)
+            stats = {}
+            for pid in current:
+                stat = self._read_stat(pid)
+                if stat is None:
+                    continue
+                stats[pid] = stat
+                key = (stat[0], stat[3])
+                cached = self._pids.get(pid)
+                if cached is None or cached[0] != key:
+                    cmd = self._read_cmdline(pid)
+                    self._pids[pid] = (key, cmd if cmd and self.matcher(cmd) else None)
+                    self._samples.pop(pid, None)
+
+            result = []
+            identity = hashlib.sha1()
+            for pid, (_, cmd) in sorted(self._pids.items()):
+                if cmd is None or pid not in stats:
+                    continue
+                starttime, ticks, rss, _ = stats[pid]
+                cpu = 0.0
+                previous = self._samples.get(pid)
+                if previous and previous[0] == starttime and now > previous[2]:
+                    cpu = (ticks - previous[1]) / CLK_TCK / (now - previous[2]) * 100
+                self._samples[pid] = (starttime, ticks, now)
+                cpu = round(max(cpu, 0.0), 1)
+                # Everything the response shows, so a 304 never hides new CPU/RSS figures
+                identity.update(f"{pid}\0{starttime}\0{cmd}\0{cpu}\0{rss}\n".encode())
+                result.append({
+                    'id': f"proc-{pid}",
+                    'type': 'background_process',
+                    'name': cmd[:60],
+                    'status': 'running',
+                    'pid': str(pid),
+                    'cpu_percent': cpu,
+                    'rss_bytes': rss
+                })
+
+            self._result = result
+            self._scanned_at = now
+            identity = identity.digest()
+            if identity != self._identity:
+                self._identity = identity
+                self.generation += 1
+            return result
+
+
+process_scanner = ProcessScanner()
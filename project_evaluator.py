@@ -3,10 +3,13 @@
 Project Evaluator for Cosmo Dashboard
 
 This script:
-1. Reads pending notifications from /home/madadmin/clawd/data/notifications.json
+1. Reads new notifications from the 'notifications' topic of the notification queue
 2. Evaluates projects that need review
 3. Posts evaluations to Discord channel 1466517317403021362
-4. Marks notifications as processed
+4. Acknowledges the handled batch so the next run starts after it
+
+A post that fails is recorded in failed-evaluations.json and the run moves on;
+recorded posts are retried at the start of later runs.
 
 Usage:
     python3 project_evaluator.py
@@ -16,31 +19,22 @@ Or as a one-liner from Discord/Clawdbot:
 """
 
 import json
-import os
 import sys
-from datetime import datetime
+
+from atomic_store import read_json, update_json
+from notification_queue import NotificationQueue, TOPIC_NOTIFICATIONS
 
 # Config
 NOTIFICATIONS_FILE = '/home/madadmin/clawd/data/notifications.json'
+CONSUMER = 'project-evaluator'
+BATCH_SIZE = 100
 DASHBOARD_DATA_FILE = '/home/madadmin/clawd/cosmo-dashboard/data/dashboard-data.json'
+FAILED_FILE = '/home/madadmin/clawd/data/failed-evaluations.json'
+MAX_ATTEMPTS = 5   # Runs a failed post is retried on before it is dropped
 DISCORD_CHANNEL = '1466517317403021362'
 DASHBOARD_URL = 'http://localhost:8095'
 
-def load_notifications():
-    """Load pending notifications"""
-    if not os.path.exists(NOTIFICATIONS_FILE):
-        return []
-    try:
-        with open(NOTIFICATIONS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
-
-def save_notifications(notifications):
-    """Save notifications back to file"""
-    os.makedirs(os.path.dirname(NOTIFICATIONS_FILE), exist_ok=True)
-    with open(NOTIFICATIONS_FILE, 'w') as f:
-        json.dump(notifications, f, indent=2)
+queue = NotificationQueue(TOPIC_NOTIFICATIONS, legacy_file=NOTIFICATIONS_FILE)
 
 def evaluate_project(project):
     """Generate an evaluation for a project"""
@@ -96,54 +90,96 @@ def post_evaluation_to_discord(project, evaluation, recommendation):
             headers={'Content-Type': 'application/json'},
             method='POST'
         )
-        urllib.request.urlopen(req)
+        urllib.request.urlopen(req, timeout=10)
         print(f"✅ Evaluation posted for project: {project.get('name')}")
         return True
     except Exception as e:
         print(f"❌ Failed to post evaluation: {e}")
         return False
 
+def record_failure(offset, project):
+    """Keep a project whose evaluation could not be posted, for a later run"""
+    entry = {'offset': offset, 'project': project, 'attempts': 1}
+    update_json(FAILED_FILE,
+                lambda failed: [f for f in (failed if isinstance(failed, list) else [])
+                                if f.get('offset') != offset] + [entry],
+                default=[], indent=2)
+
+def retry_failed():
+    """Post evaluations that failed on earlier runs again"""
+    failed = read_json(FAILED_FILE, [])
+    if not isinstance(failed, list) or not failed:
+        return 0
+    
+    print(f"🔁 Retrying {len(failed)} failed evaluations...")
+    posted = set()
+    for entry in failed:
+        project = entry.get('project', {})
+        evaluation, recommendation = evaluate_project(project)
+        if post_evaluation_to_discord(project, evaluation, recommendation):
+            posted.add(entry.get('offset'))
+    tried = {entry.get('offset') for entry in failed}
+    
+    def update(current):
+        kept = []
+        for entry in (current if isinstance(current, list) else []):
+            offset = entry.get('offset')
+            if offset in posted:
+                continue
+            if offset in tried:
+                entry['attempts'] = entry.get('attempts', 1) + 1
+                if entry['attempts'] > MAX_ATTEMPTS:
+                    print(f"⚠️ Giving up on evaluation for: {entry.get('project', {}).get('name')}")
+                    continue
+            kept.append(entry)
+        return kept
+    
+    update_json(FAILED_FILE, update, default=[], indent=2)
+    return len(posted)
+
 def process_notifications():
     """Main processing loop"""
     print("🔍 Checking for pending notifications...")
     
-    notifications = load_notifications()
-    processed = 0
+    processed = retry_failed()
     
-    for notification in notifications:
-        # Skip already processed notifications
-        if notification.get('processed'):
-            continue
+    while True:
+        batch = queue.consume(CONSUMER, limit=BATCH_SIZE)
+        if not batch:
+            break
         
-        notif_type = notification.get('type', '')
-        
-        if notif_type == 'project_created':
-            project = notification.get('project', {})
-            print(f"📋 Evaluating project: {project.get('name', 'Unknown')}")
+        last_done = 0
+        for offset, notification in batch:
+            notif_type = notification.get('type', '')
             
-            # Generate evaluation
-            evaluation, recommendation = evaluate_project(project)
+            if notif_type == 'project_created':
+                project = notification.get('project', {})
+                print(f"📋 Evaluating project: {project.get('name', 'Unknown')}")
+                
+                # Generate evaluation
+                evaluation, recommendation = evaluate_project(project)
+                
+                # Post to Discord - on failure record it for a later run and go on
+                if post_evaluation_to_discord(project, evaluation, recommendation):
+                    processed += 1
+                else:
+                    record_failure(offset, project)
             
-            # Post to Discord
-            if post_evaluation_to_discord(project, evaluation, recommendation):
-                notification['processed'] = True
-                notification['processedAt'] = datetime.now().isoformat()
+            elif notif_type == 'idea_approved':
+                # Ideas are handled by the dashboard directly
+                print(f"💡 Idea approved: {notification.get('idea', {}).get('title', 'Unknown')}")
                 processed += 1
+            
+            # Other notification types need no action
+            last_done = offset
         
-        elif notif_type == 'idea_approved':
-            # Ideas are handled by the dashboard directly
-            print(f"💡 Idea approved: {notification.get('idea', {}).get('title', 'Unknown')}")
-            notification['processed'] = True
-            notification['processedAt'] = datetime.now().isoformat()
-            processed += 1
-        
-        else:
-            # Mark other notifications as processed
-            notification['processed'] = True
-            notification['processedAt'] = datetime.now().isoformat()
+        # Acknowledge the handled part of the batch in one write
+        if last_done:
+            queue.ack(CONSUMER, last_done)
+        if len(batch) < BATCH_SIZE:
+            break
     
-    # Save updated notifications
-    save_notifications(notifications)
+    queue.prune()
     
     if processed > 0:
         print(f"✅ Processed {processed} notifications")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Range Downloads
+File responses with byte ranges, If-Range and strong ETags (uploads and backups)
+
+send_file_range() answers:
+  - a full GET with 200;
+  - a single "Range: bytes=a-b" with 206 and Content-Range;
+  - several ranges with a 206 multipart/byteranges body;
+  - an unsatisfiable range with 416.
+If-Range (ETag or Last-Modified) falls back to the full file when the file
+changed since the client's first request, so resumed and parallel segmented
+downloads of multi-GB backups never mix two versions. The strong ETag comes
+from inode, size and mtime, so no file content is hashed.
+
+File data is never loaded whole. When the WSGI server offers
+wsgi.file_wrapper (gunicorn, uWSGI), full and single-range bodies go through
+it, and those servers send them with sendfile(). Otherwise bodies are
+streamed in READ_SIZE pread() chunks from one descriptor per response. Each
+concurrent download holds one buffer, never a copy of the file.
+"""
+
+import mimetypes
+import os
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+
+from flask import Response, request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+READ_SIZE = 256 * 1024   # Bytes per chunk when streaming without sendfile
+MAX_RANGES = 16          # More ranges than this are answered with the full file
+
+
+def file_etag(st):
+    """Strong validator from inode, size and mtime"""
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """[(start, end inclusive), ...] sorted and merged, [] if unsatisfiable, None to ignore"""
+    if not header or not header.startswith('bytes='):
+        return None
+    ranges = []
+    for spec in header[6:].split(','):
+        spec = spec.strip()
+        if '-' not in spec:
+            return None
+        first, last = spec.split('-', 1)
+        try:
+            if first == '':
+                length = int(last)      # Suffix range: last N bytes
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def _iter_pread(fd, ranges, parts=None, close=True):
+    """Yield the bytes of ranges (with optional multipart headers) via pread"""
+    try:
+        for i, (start, end) in enumerate(ranges):
+            if parts:
+                yield parts[i]
+            offset = start
+            while offset <= end:
+                data = os.pread(fd, min(READ_SIZE, end - offset + 1), offset)
+                if not data:
+                    return
+                yield data
+                offset += len(data)
+        if parts:
+            yield parts[-1]
+    finally:
+        if close:
+            os.close(fd)
+
+
+def _if_range_matches(value, etag, mtime):
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag    # Weak validators never match (RFC 9110)
+    try:
+        return int(parsedate_to_datetime(value).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def send_file_range(path, as_attachment=False, download_name=None, mimetype=None):
+    """Response for path honouring Range, If-Range and If-None-Match"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        raise NotFound()
+    try:
+        st = os.fstat(fd)
+        if not os.path.isfile(path):
+            raise NotFound()
+    except BaseException:
+        os.close(fd)
+        raise
+
+    size = st.st_size
+    etag = file_etag(st)
+    name = download_name or os.path.basename(path)
+    mimetype = mimetype or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': formatdate(st.st_mtime, usegmt=True),
+    }
+    if as_attachment:
+        headers['Content-Disposition'] = f'attachment; filename="{name}"'
+
+    if request.headers.get('If-None-Match') in (etag, '*'):
+        os.close(fd)
+        return Response(status=304, headers=headers)
+
+    ranges = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if ranges is not None and if_range and not _if_range_matches(if_range, etag, st.st_mtime):
+        ranges = None   # File changed: send all of it
+    if ranges == []:
+        os.close(fd)
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+
+    if ranges is None or len(ranges) == 1:
+        start, end = ranges[0] if ranges else (0, size - 1)
+        length = end - start + 1 if size else 0
+        headers['Content-Length'] = str(length)
+        if ranges:
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        if file_wrapper is not None:
+            # Server-side sendfile from the current offset for Content-Length bytes
+            f = os.fdopen(fd, 'rb')
+            f.seek(start)
+            body = file_wrapper(f, READ_SIZE)
+        else:
+            body = _iter_pread(fd, [(start, end)] if length else [])
+        return Response(body, status=206 if ranges else 200, headers=headers,
+                        mimetype=mimetype, direct_passthrough=True)
+
+    # Several ranges: multipart/byteranges with an exact Content-Length
+    boundary = uuid.uuid4().hex
+    parts = [f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n'
+             f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'.encode()
+             for start, end in ranges]
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    headers['Content-Length'] = str(sum(map(len, parts)) + sum(e - s + 1 for s, e in ranges))
+    return Response(_iter_pread(fd, ranges, parts), status=206, headers=headers,
+                    content_type=f'multipart/byteranges; boundary={boundary}',
+                    direct_passthrough=True)
+
+
+def send_from_directory_range(directory, filename, **kwargs):
+    """send_file_range() for a file that must stay inside directory"""
+    path = safe_join(directory, filename)
+    if path is None:
+        raise NotFound()
+    return send_file_range(path, **kwargs)
@@ -19,17 +19,87 @@ if (!fs.existsSync(path.join(__dirname, 'data'))) {
     fs.mkdirSync(path.join(__dirname, 'data'));
 }
 
+// dashboard-data.json is written by document_store.py: a snapshot plus a
+// journal of JSON Patch lines (<file>.journal) that is only folded in on
+// compaction. Read both, the way load_document() does.
+
+function pointerTokens(pointer) {
+    return pointer === '' ? [] : pointer.slice(1).split('/').map(t => t.replace(/~1/g, '/').replace(/~0/g, '~'));
+}
+
+function applyOps(doc, ops) {
+    const root = { doc };
+    const parentOf = (pointer) => {
+        const tokens = ['doc', ...pointerTokens(pointer)];
+        let node = root;
+        for (const token of tokens.slice(0, -1)) node = node[token];
+        return [node, tokens[tokens.length - 1]];
+    };
+    const add = (pointer, value) => {
+        const [parent, key] = parentOf(pointer);
+        if (Array.isArray(parent)) parent.splice(key === '-' ? parent.length : Number(key), 0, value);
+        else parent[key] = value;
+    };
+    const remove = (pointer) => {
+        const [parent, key] = parentOf(pointer);
+        if (Array.isArray(parent)) return parent.splice(Number(key), 1)[0];
+        const value = parent[key];
+        delete parent[key];
+        return value;
+    };
+    const get = (pointer) => {
+        const [parent, key] = parentOf(pointer);
+        return parent[key];
+    };
+    for (const op of ops) {
+        // Journal entries were applied successfully once, so 'test' always holds
+        if (op.op === 'add') add(op.path, op.value);
+        else if (op.op === 'remove') remove(op.path);
+        else if (op.op === 'replace') { const [parent, key] = parentOf(op.path); parent[key] = op.value; }
+        else if (op.op === 'move') add(op.path, remove(op.from));
+        else if (op.op === 'copy') add(op.path, JSON.parse(JSON.stringify(get(op.from))));
+    }
+    return root.doc;
+}
+
+function loadDocument(file, fallback) {
+    if (!fs.existsSync(file)) return fallback;
+    const raw = fs.readFileSync(file);
+    const st = fs.statSync(file, { bigint: true });
+    let doc = JSON.parse(raw.toString('utf8') || 'null') || fallback;
+    let journal;
+    try {
+        journal = fs.readFileSync(file + '.journal', 'utf8');
+    } catch (e) {
+        return doc;
+    }
+    // Only complete lines; a torn last line is still being written
+    const lines = journal.split('\n').slice(0, -1);
+    if (!lines.length) return doc;
+    // The header names the snapshot by [inode, size, mtime_ns]; mtime_ns is
+    // beyond a double's precision, so compare the digits as text
+    const match = lines[0].match(/"snapshot":\[(\d+),(\d+),(\d+)\]/);
+    if (!match || match[1] !== String(st.ino) || match[2] !== String(st.size) || match[3] !== String(st.mtimeNs)) {
+        return doc;   // Snapshot replaced since: it is already the newest state
+    }
+    for (const line of lines.slice(1)) {
+        let entry;
+        try {
+            entry = JSON.parse(line);
+        } catch (e) {
+            break;
+        }
+        doc = applyOps(doc, entry.ops);
+    }
+    return doc;
+}
+
 // API Routes
 
 // Get dashboard data
 app.get('/api/data', (req, res) => {
     try {
-        if (fs.existsSync(DATA_FILE)) {
-            const data = JSON.parse(fs.readFileSync(DATA_FILE, 'utf8'));
-            res.json(data);
-        } else {
-            res.json({ projects: [], tasks: [], logs: [] });
-        }
+        res.json(loadDocument(DATA_FILE, { projects: [], tasks: [], logs: [] }));
     } catch (e) {
         res.json({ projects: [], tasks: [], logs: [] });
     }
@@ -38,7 +108,10 @@ app.get('/api/data', (req, res) => {
 // Save dashboard data
 app.post('/api/data', (req, res) => {
     try {
-        fs.writeFileSync(DATA_FILE, JSON.stringify(req.body, null, 2));
+        // Replace the snapshot atomically; document_store.py then ignores its stale journal
+        const tmp = `${DATA_FILE}.tmp.${process.pid}`;
+        fs.writeFileSync(tmp, JSON.stringify(req.body, null, 2));
+        fs.renameSync(tmp, DATA_FILE);
         res.json({ success: true });
     } catch (e) {
         res.status(500).json({ error: e.message });
@@ -88,12 +161,7 @@ app.get('/api/health', (req, res) => {
 // Projects API
 app.get('/api/projects', (req, res) => {
     try {
-        if (fs.existsSync(DATA_FILE)) {
-            const data = JSON.parse(fs.readFileSync(DATA_FILE, 'utf8'));
-            res.json(data.projects || []);
-        } else {
-            res.json([]);
-        }
+        res.json(loadDocument(DATA_FILE, {}).projects || []);
     } catch (e) {
         res.json([]);
     }
@@ -102,12 +170,7 @@ app.get('/api/projects', (req, res) => {
 // Tasks API
 app.get('/api/tasks', (req, res) => {
     try {
-        if (fs.existsSync(DATA_FILE)) {
-            const data = JSON.parse(fs.readFileSync(DATA_FILE, 'utf8'));
-            res.json(data.tasks || []);
-        } else {
-            res.json([]);
-        }
+        res.json(loadDocument(DATA_FILE, {}).tasks || []);
     } catch (e) {
         res.json([]);
     }
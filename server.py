@@ -5,7 +5,6 @@ Handles all data persistence with proper database
 Version: v29 - Comprehensive Activity Logging
 """
 
-import sqlite3
 import json
 import os
 import subprocess
@@ -15,6 +14,21 @@ from datetime import datetime
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
+from db_pool import connection, pool_stats
+from db_migrations import Migration, migrate
+from activity_store import ActivityStore
+from notification_queue import NotificationQueue, TOPIC_NOTIFICATIONS, QUEUE_DB
+import http_cache
+from http_cache import conditional, file_sources, sqlite_sources
+from sessions_index import MtimeCache, SESSIONS_FILE, sessions_index
+from proc_scanner import process_scanner
+from system_sampler import sampler as system_sampler
+from metrics_history import metrics_history, parse_duration
+from atomic_store import read_json, update_json
+from range_download import send_from_directory_range
+from blob_store import BlobStore
+from file_catalog import catalog as file_catalog, PAGE_DEFAULT as CATALOG_PAGE
+from chunked_upload import UploadManager, register_routes as register_upload_routes
 
 # Audit logging setup
 AUDIT_DB = '/home/madadmin/clawd/data/audit.db'
@@ -22,33 +36,39 @@ AUDIT_DB = '/home/madadmin/clawd/data/audit.db'
 def log_audit(actor, action, target_type=None, target_id=None, old_value=None, new_value=None, details=None):
     """Log audit events"""
     try:
-        conn = sqlite3.connect(AUDIT_DB)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO audit_log (timestamp, actor, action, target_type, target_id, old_value, new_value, details)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (datetime.now().isoformat(), actor, action, target_type, target_id,
-              json.dumps(old_value) if old_value else None,
-              json.dumps(new_value) if new_value else None,
-              json.dumps(details) if details else None))
-        conn.commit()
-        conn.close()
+        with connection(AUDIT_DB) as conn:
+            conn.execute('''
+                INSERT INTO audit_log (timestamp, actor, action, target_type, target_id, old_value, new_value, details)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (datetime.now().isoformat(), actor, action, target_type, target_id,
+                  json.dumps(old_value) if old_value else None,
+                  json.dumps(new_value) if new_value else None,
+                  json.dumps(details) if details else None))
     except Exception as e:
         print(f"Audit log error: {e}")
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-After-Id', 'X-Next-Cursor'])
 app.config['SECRET_KEY'] = 'cosmo-dashboard-secret'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
 DB_PATH = '/home/madadmin/clawd/cosmo-dashboard/data/dashboard.db'
 NOTIFICATIONS_FILE = '/home/madadmin/clawd/data/notifications.json'
+DETAILED_LOG_DIR = '/home/madadmin/clawd/data/detailed-activity'
+DETAILED_LOG_LEGACY = '/home/madadmin/clawd/data/detailed-activity.json'
 
-def init_db():
-    """Initialize SQLite database with proper tables"""
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    
-    conn = sqlite3.connect(DB_PATH)
+# Append-only detailed activity log (JSONL segments)
+activity_store = ActivityStore(DETAILED_LOG_DIR, legacy_file=DETAILED_LOG_LEGACY)
+
+# Notification queue for Cosmo (replaces notifications.json)
+notification_queue = NotificationQueue(TOPIC_NOTIFICATIONS, legacy_file=NOTIFICATIONS_FILE)
+
+# Tables whose row changes are recorded for /api/changes delta sync
+JOURNALED_TABLES = ('projects', 'ideas', 'tasks', 'activity_log')
+CHANGES_KEEP = 50000   # Journal rows kept; older clients get a full reload
+
+def create_tables(conn):
+    """Base tables"""
     cursor = conn.cursor()
     
     # Projects table
@@ -97,9 +117,57 @@ def init_db():
             message TEXT
         )
     ''')
-    
-    conn.commit()
-    conn.close()
+
+def create_list_indexes(conn):
+    """Indexes for filtered list endpoints (rowid is implicit, so
+    "WHERE col=? AND id<? ORDER BY id DESC" is a single index range)"""
+    cursor = conn.cursor()
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_status ON projects(status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ideas_status ON ideas(status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ideas_priority ON ideas(priority)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ideas_assignee ON ideas(assignee)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project ON tasks(project)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_done ON tasks(done)')
+
+def create_change_journal(conn):
+    """Change journal - one row per insert/update/delete, written by triggers"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+    ''')
+    for table in JOURNALED_TABLES:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {table}
+            BEGIN INSERT INTO changes (tbl, row_id, op) VALUES ('{table}', NEW.id, 'insert'); END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update AFTER UPDATE ON {table}
+            BEGIN INSERT INTO changes (tbl, row_id, op) VALUES ('{table}', NEW.id, 'update'); END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON {table}
+            BEGIN INSERT INTO changes (tbl, row_id, op) VALUES ('{table}', OLD.id, 'delete'); END
+        ''')
+
+# Schema history - append new migrations, never edit applied ones.
+# The first three use IF NOT EXISTS, so databases created before
+# versioning (user_version 0) adopt them without changes.
+SCHEMA_MIGRATIONS = [
+    Migration(1, 'base tables', create_tables),
+    Migration(2, 'list indexes', create_list_indexes),
+    Migration(3, 'change journal', create_change_journal),
+]
+
+def init_db():
+    """Bring the SQLite database up to the current schema version"""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    migrate(DB_PATH, SCHEMA_MIGRATIONS)
     print("✅ Database initialized")
 
 # Initialize on startup
@@ -114,39 +182,115 @@ def index():
 def serve_static(path):
     return send_from_directory('.', path)
 
+# ==================== LIST PAGINATION ====================
+
+PAGE_DEFAULT = 100
+PAGE_MAX = 500
+
+# Columns that can be selected with ?fields= and filtered on, per table
+LIST_COLUMNS = {
+    'projects': ('id', 'name', 'description', 'status', 'created', 'updated'),
+    'ideas': ('id', 'title', 'description', 'priority', 'status', 'assignee', 'created', 'createdBy'),
+    'tasks': ('id', 'title', 'project', 'priority', 'done')
+}
+LIST_FILTERS = {
+    'projects': ('status',),
+    'ideas': ('status', 'priority', 'assignee'),
+    'tasks': ('project', 'priority', 'done')
+}
+
+def query_page(table):
+    """Keyset-paginated, filtered SELECT driven by the request args.
+
+    ?after_id=N   rows with id < N (ids are returned newest first)
+    ?limit=N      page size (default 100, max 500)
+    ?fields=a,b   sparse field selection (id is always included)
+    ?<filter>=v   equality filter, comma-separated values mean IN (...)
+
+    Returns (rows, next_after_id); next_after_id is None on the last page.
+    """
+    args = request.args
+    columns = LIST_COLUMNS[table]
+    limit = max(1, min(args.get('limit', PAGE_DEFAULT, type=int), PAGE_MAX))
+    
+    fields = args.get('fields')
+    if fields:
+        selected = [c for c in columns if c in fields.split(',')]
+        if 'id' not in selected:
+            selected.insert(0, 'id')
+    else:
+        selected = list(columns)
+    
+    where = []
+    params = []
+    for name in LIST_FILTERS[table]:
+        value = args.get(name)
+        if value is None:
+            continue
+        values = value.split(',')
+        if len(values) == 1:
+            where.append(f'{name} = ?')
+        else:
+            where.append(f'{name} IN ({",".join("?" * len(values))})')
+        params.extend(values)
+    
+    after_id = args.get('after_id', type=int)
+    if after_id is not None:
+        where.append('id < ?')
+        params.append(after_id)
+    
+    sql = f'SELECT {", ".join(selected)} FROM {table}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY id DESC LIMIT ?'
+    params.append(limit + 1)
+    
+    with connection(DB_PATH) as conn:
+        rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+    
+    next_after_id = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after_id = rows[-1]['id']
+    return rows, next_after_id
+
+def db_sources():
+    """Validator sources for responses built from the dashboard database"""
+    return sqlite_sources(DB_PATH)
+
+def paged_response(body, next_after_id):
+    """JSON response carrying the next keyset cursor in a header"""
+    response = jsonify(body)
+    if next_after_id is not None:
+        response.headers['X-Next-After-Id'] = str(next_after_id)
+    return response
+
 # ==================== PROJECTS ====================
 
 @app.route('/api/projects', methods=['GET'])
+@conditional(db_sources)
 def get_projects():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM projects ORDER BY id DESC')
-    projects = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(projects)
+    projects, next_after_id = query_page('projects')
+    return paged_response(projects, next_after_id)
 
 @app.route('/api/projects', methods=['POST'])
 def create_project():
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     now = datetime.now().isoformat()
-    cursor.execute('''
-        INSERT INTO projects (id, name, description, status, created, updated)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        data.get('id'),
-        data.get('name'),
-        data.get('description', ''),
-        data.get('status', 'pending-review'),
-        data.get('created', now),
-        now
-    ))
     
-    conn.commit()
-    conn.close()
+    with connection(DB_PATH) as conn:
+        project_id = conn.execute('''
+            INSERT INTO projects (id, name, description, status, created, updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            data.get('id'),
+            data.get('name'),
+            data.get('description', ''),
+            data.get('status', 'pending-review'),
+            data.get('created', now),
+            now
+        )).lastrowid
+    notify_change('projects', project_id)
     
     # Write notification for Cosmo
     write_notification({
@@ -168,59 +312,50 @@ def create_project():
 @app.route('/api/projects/<int:project_id>', methods=['PUT'])
 def update_project(project_id):
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     
-    cursor.execute('''
-        UPDATE projects 
-        SET name=?, description=?, status=?, updated=?
-        WHERE id=?
-    ''', (
-        data.get('name'),
-        data.get('description'),
-        data.get('status'),
-        datetime.now().isoformat(),
-        project_id
-    ))
+    with connection(DB_PATH) as conn:
+        conn.execute('''
+            UPDATE projects 
+            SET name=?, description=?, status=?, updated=?
+            WHERE id=?
+        ''', (
+            data.get('name'),
+            data.get('description'),
+            data.get('status'),
+            datetime.now().isoformat(),
+            project_id
+        ))
+    notify_change('projects', project_id)
     
-    conn.commit()
-    conn.close()
     return jsonify({'status': 'updated'})
 
 # ==================== IDEAS ====================
 
 @app.route('/api/ideas', methods=['GET'])
+@conditional(db_sources)
 def get_ideas():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM ideas ORDER BY id DESC')
-    ideas = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify({'ideas': ideas})
+    ideas, next_after_id = query_page('ideas')
+    return paged_response({'ideas': ideas, 'next_after_id': next_after_id}, next_after_id)
 
 @app.route('/api/ideas', methods=['POST'])
 def create_idea():
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO ideas (id, title, description, priority, status, assignee, created, createdBy)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data.get('id'),
-        data.get('title'),
-        data.get('description', ''),
-        data.get('priority', 'medium'),
-        data.get('status', 'open'),
-        data.get('assignee', 'team'),
-        data.get('created', datetime.now().isoformat()),
-        data.get('createdBy', 'Bowz')
-    ))
-    
-    conn.commit()
-    conn.close()
+    with connection(DB_PATH) as conn:
+        idea_id = conn.execute('''
+            INSERT INTO ideas (id, title, description, priority, status, assignee, created, createdBy)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            data.get('id'),
+            data.get('title'),
+            data.get('description', ''),
+            data.get('priority', 'medium'),
+            data.get('status', 'open'),
+            data.get('assignee', 'team'),
+            data.get('created', datetime.now().isoformat()),
+            data.get('createdBy', 'Bowz')
+        )).lastrowid
+    notify_change('ideas', idea_id)
     
     write_notification({
         'type': 'idea_created',
@@ -236,18 +371,14 @@ def create_idea():
 @app.route('/api/ideas/<int:idea_id>/approve', methods=['POST'])
 def approve_idea(idea_id):
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute('UPDATE ideas SET status=? WHERE id=?', ('approved', idea_id))
-    conn.commit()
     
-    # Get idea details
-    cursor.execute('SELECT * FROM ideas WHERE id=?', (idea_id,))
-    row = cursor.fetchone()
-    idea = dict(row) if row else {}
-    conn.close()
+    with connection(DB_PATH) as conn:
+        conn.execute('UPDATE ideas SET status=? WHERE id=?', ('approved', idea_id))
+        
+        # Get idea details
+        row = conn.execute('SELECT * FROM ideas WHERE id=?', (idea_id,)).fetchone()
+        idea = dict(row) if row else {}
+    notify_change('ideas', idea_id)
     
     write_notification({
         'type': 'idea_approved',
@@ -264,109 +395,162 @@ def approve_idea(idea_id):
 # ==================== TASKS ====================
 
 @app.route('/api/tasks', methods=['GET'])
+@conditional(db_sources)
 def get_tasks():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks ORDER BY id DESC')
-    tasks = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(tasks)
+    tasks, next_after_id = query_page('tasks')
+    return paged_response(tasks, next_after_id)
 
 @app.route('/api/tasks', methods=['POST'])
 def create_task():
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO tasks (id, title, project, priority, done)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
-        data.get('id'),
-        data.get('title'),
-        data.get('project', 'General'),
-        data.get('priority', 'medium'),
-        1 if data.get('done') else 0
-    ))
+    with connection(DB_PATH) as conn:
+        task_id = conn.execute('''
+            INSERT INTO tasks (id, title, project, priority, done)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            data.get('id'),
+            data.get('title'),
+            data.get('project', 'General'),
+            data.get('priority', 'medium'),
+            1 if data.get('done') else 0
+        )).lastrowid
+    notify_change('tasks', task_id)
     
-    conn.commit()
-    conn.close()
     return jsonify({'status': 'created'})
 
 @app.route('/api/tasks/<int:task_id>/toggle', methods=['POST'])
 def toggle_task(task_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT done FROM tasks WHERE id=?', (task_id,))
-    result = cursor.fetchone()
-    current_done = result[0] if result else 0
-    new_done = 0 if current_done else 1
-    
-    cursor.execute('UPDATE tasks SET done=? WHERE id=?', (new_done, task_id))
-    conn.commit()
-    conn.close()
+    with connection(DB_PATH) as conn:
+        result = conn.execute('SELECT done FROM tasks WHERE id=?', (task_id,)).fetchone()
+        current_done = result[0] if result else 0
+        new_done = 0 if current_done else 1
+        
+        conn.execute('UPDATE tasks SET done=? WHERE id=?', (new_done, task_id))
+    notify_change('tasks', task_id)
     
     status = 'completed' if new_done else 'reopened'
     add_log('info' if new_done else 'success', f'Task toggled - now {status}')
     
     return jsonify({'status': 'toggled', 'done': bool(new_done)})
 
+# ==================== DELTA SYNC ====================
+
+def current_version(conn=None):
+    """Latest change-journal version (monotonic, survives trimming)"""
+    if conn is None:
+        with connection(DB_PATH) as conn:
+            return current_version(conn)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='changes'").fetchone()
+    return row[0] if row else 0
+
+def trim_changes(keep=CHANGES_KEEP):
+    """Drop journal rows older than the newest `keep`"""
+    with connection(DB_PATH) as conn:
+        cutoff = current_version(conn) - keep
+        if cutoff > 0:
+            conn.execute('DELETE FROM changes WHERE version <= ?', (cutoff,))
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Rows inserted, updated or deleted since a client's version.
+
+    Without ?since= only the current version is returned. If the journal no
+    longer reaches back to `since`, the response has reset=true and the
+    client should reload everything.
+    """
+    since = request.args.get('since', type=int)
+    limit = max(1, min(request.args.get('limit', 1000, type=int), 5000))
+    
+    with connection(DB_PATH) as conn:
+        version = current_version(conn)
+        if since is None:
+            return jsonify({'version': version})
+        
+        oldest = conn.execute('SELECT MIN(version) FROM changes').fetchone()[0]
+        if since > version or (since < version and (oldest is None or since < oldest - 1)):
+            return jsonify({'version': version, 'reset': True})
+        
+        rows = conn.execute('''
+            SELECT version, tbl, row_id, op FROM changes
+            WHERE version > ? ORDER BY version LIMIT ?
+        ''', (since, limit)).fetchall()
+        
+        # Collapse to the latest op per row
+        latest = {}
+        for row in rows:
+            latest[(row['tbl'], row['row_id'])] = row['op']
+        
+        changes = {}
+        for table in JOURNALED_TABLES:
+            ids = [row_id for (tbl, row_id), op in latest.items() if tbl == table and op != 'delete']
+            deleted = [row_id for (tbl, row_id), op in latest.items() if tbl == table and op == 'delete']
+            upserted = []
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                found = conn.execute(
+                    f'SELECT * FROM {table} WHERE id IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall()
+                upserted.extend(dict(r) for r in found)
+            # Rows that vanished after being journaled count as deletes
+            seen = {r['id'] for r in upserted}
+            deleted.extend(row_id for row_id in ids if row_id not in seen)
+            if upserted or deleted:
+                changes[table] = {'upserted': upserted, 'deleted': deleted}
+    
+    return jsonify({
+        'version': rows[-1]['version'] if rows else since,
+        'more': len(rows) == limit,
+        'changes': changes
+    })
+
 # ==================== ACTIVITY LOG ====================
 
 @app.route('/api/logs', methods=['GET'])
+@conditional(db_sources)
 def get_logs():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM activity_log ORDER BY id DESC LIMIT 100')
-    logs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with connection(DB_PATH) as conn:
+        cursor = conn.execute('SELECT * FROM activity_log ORDER BY id DESC LIMIT 100')
+        logs = [dict(row) for row in cursor.fetchall()]
     return jsonify(logs)
 
+@app.route('/api/logs/detailed', methods=['GET'])
+def get_detailed_logs():
+    """Most recent detailed activity entries (newest first)"""
+    limit = min(request.args.get('limit', 100, type=int), 10000)
+    return jsonify(activity_store.tail(limit))
+
 def add_log(log_type, message, broadcast=True, details=None):
     """Add log entry and optionally broadcast via WebSocket"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     timestamp = datetime.now().isoformat()
-    cursor.execute('''
-        INSERT INTO activity_log (time, type, message)
-        VALUES (?, ?, ?)
-    ''', (timestamp, log_type, message))
-    conn.commit()
-    conn.close()
-    
-    # Also write to detailed JSON log
-    log_entry = {
-        'time': timestamp,
-        'type': log_type,
-        'message': message,
-        'details': details or {}
-    }
+    with connection(DB_PATH) as conn:
+        log_id = conn.execute('''
+            INSERT INTO activity_log (time, type, message)
+            VALUES (?, ?, ?)
+        ''', (timestamp, log_type, message)).lastrowid
+    http_cache.bump()
+    version = current_version()
     
-    detailed_log = '/home/madadmin/clawd/data/detailed-activity.json'
-    logs = []
-    if os.path.exists(detailed_log):
-        try:
-            with open(detailed_log, 'r') as f:
-                logs = json.load(f)
-        except:
-            logs = []
-    if not isinstance(logs, list):
-        logs = []
-    logs.append(log_entry)
-    logs = logs[-10000:]  # Keep last 10k
-    with open(detailed_log, 'w') as f:
-        json.dump(logs, f, indent=2)
+    # Also append to the detailed activity log
+    try:
+        activity_store.append({
+            'time': timestamp,
+            'type': log_type,
+            'message': message,
+            'details': details or {}
+        })
+    except Exception as e:
+        print(f"Detailed log error: {e}")
     
     # Broadcast to all connected clients
     if broadcast:
         try:
             socketio.emit('new_activity', {
+                'id': log_id,
                 'time': timestamp,
                 'type': log_type,
-                'message': message
+                'message': message,
+                'version': version
             })
         except:
             pass  # Socket not initialized yet
@@ -376,84 +560,37 @@ def add_log(log_type, message, broadcast=True, details=None):
 # ==================== NOTIFICATIONS ====================
 
 def write_notification(notification):
-    """Write notification to file for Cosmo to pick up"""
-    os.makedirs(os.path.dirname(NOTIFICATIONS_FILE), exist_ok=True)
-    
-    notifications = []
-    if os.path.exists(NOTIFICATIONS_FILE):
-        try:
-            with open(NOTIFICATIONS_FILE, 'r') as f:
-                notifications = json.load(f)
-        except:
-            notifications = []
-    
-    notifications.append(notification)
-    
-    with open(NOTIFICATIONS_FILE, 'w') as f:
-        json.dump(notifications, f, indent=2)
-    
-    print(f"📝 Notification written: {notification.get('type')}")
+    """Queue notification for Cosmo to pick up"""
+    notification_queue.enqueue(notification)
+    print(f"📝 Notification queued: {notification.get('type')}")
 
 @app.route('/api/notifications', methods=['GET'])
 def get_notifications():
-    if os.path.exists(NOTIFICATIONS_FILE):
-        with open(NOTIFICATIONS_FILE, 'r') as f:
-            return jsonify(json.load(f))
-    return jsonify([])
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    return jsonify(notification_queue.recent(limit))
 
 # ==================== SYSTEM STATUS ====================
 
+metrics_history.attach(system_sampler)
+
 @app.route('/api/system', methods=['GET'])
 def system_status():
-    # Fallback if psutil not available
+    # Latest background sample - never blocks the request thread
     try:
-        import psutil
-        return jsonify({
-            'cpu': psutil.cpu_percent(interval=0.1),
-            'memory': psutil.virtual_memory().percent,
-            'disk': psutil.disk_usage('/').percent
-        })
-    except ImportError:
-        # Read from /proc filesystem
-        try:
-            # CPU - simple calculation
-            with open('/proc/stat') as f:
-                line = f.readline()
-                fields = line.split()
-                if fields[0] == 'cpu':
-                    total = sum(int(x) for x in fields[1:5])
-                    idle = int(fields[4])
-                    cpu = 100 * (1 - idle / total) if total > 0 else 0
-                else:
-                    cpu = 0
-            
-            # Memory
-            with open('/proc/meminfo') as f:
-                meminfo = f.read()
-                mem_total = 0
-                mem_available = 0
-                for line in meminfo.split('\n'):
-                    if line.startswith('MemTotal:'):
-                        mem_total = int(line.split()[1]) * 1024
-                    elif line.startswith('MemAvailable:'):
-                        mem_available = int(line.split()[1]) * 1024
-                memory = ((mem_total - mem_available) / mem_total * 100) if mem_total > 0 else 0
-            
-            # Disk
-            import os
-            stat = os.statvfs('/')
-            total = stat.f_blocks * stat.f_frsize
-            free = stat.f_bfree * stat.f_frsize
-            disk = ((total - free) / total * 100) if total > 0 else 0
-            
-            return jsonify({
-                'cpu': round(cpu, 1),
-                'memory': round(memory, 1),
-                'disk': round(disk, 1)
-            })
-        except Exception as e:
-            print(f"Error reading system stats: {e}")
-            return jsonify({'cpu': 0, 'memory': 0, 'disk': 0})
+        return jsonify(system_sampler.latest())
+    except Exception as e:
+        print(f"Error reading system stats: {e}")
+        return jsonify({'cpu': 0, 'memory': 0, 'disk': 0})
+
+@app.route('/api/system/history', methods=['GET'])
+def system_history():
+    """CPU/memory/disk history: ?range=6h&step=1m (durations or seconds)"""
+    try:
+        range_seconds = min(parse_duration(request.args.get('range'), 3600), 90 * 86400)
+        step = parse_duration(request.args.get('step'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(metrics_history.query(range_seconds, step))
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
@@ -482,67 +619,20 @@ def get_uptime():
     })
 
 @app.route('/api/tokens', methods=['GET'])
+@conditional(lambda: file_sources(SESSIONS_FILE))
 def get_tokens():
     """Get token usage data from clawdbot sessions with real-time limits"""
     try:
-        sessions_file = '/home/madadmin/.clawdbot/agents/main/sessions/sessions.json'
+        view = sessions_index.get()
         
-        if os.path.exists(sessions_file):
-            with open(sessions_file, 'r') as f:
-                sessions = json.load(f)
-            
-            total_tokens = 0
-            total_limit = 0
-            session_list = []
-            model_stats = {}
-            
-            for session_key, session_info in sessions.items():
-                # Extract session details
-                model = session_info.get('model', 'unknown')
-                provider = session_info.get('modelProvider', 'unknown')
-                input_tokens = session_info.get('inputTokens', 0)
-                output_tokens = session_info.get('outputTokens', 0)
-                context_limit = session_info.get('contextTokens', 262144)  # Default 262k
-                
-                session_total = input_tokens + output_tokens
-                total_tokens += session_total
-                total_limit += context_limit
-                
-                # Format session key for display
-                session_name = session_key.replace('agent:main:', '').replace('discord:', 'Discord ').replace('channel:', '#')
-                
-                session_list.append({
-                    'name': session_name,
-                    'agent': 'Cosmo',
-                    'model': model,
-                    'provider': provider,
-                    'status': 'active',
-                    'tokensUsed': session_total,
-                    'tokensLimit': context_limit,
-                    'percentUsed': round((session_total / context_limit) * 100, 1),
-                    'inputTokens': input_tokens,
-                    'outputTokens': output_tokens
-                })
-                
-                # Aggregate by model
-                model_key = f"{provider}/{model}"
-                if model_key not in model_stats:
-                    model_stats[model_key] = {
-                        'tokens': 0,
-                        'calls': 0,
-                        'sessions': 0
-                    }
-                model_stats[model_key]['tokens'] += session_total
-                model_stats[model_key]['calls'] += 1
-                model_stats[model_key]['sessions'] += 1
-            
+        if view is not None:
             return jsonify({
-                'todayTokens': total_tokens,
-                'todayLimit': total_limit,
-                'todayPercent': round((total_tokens / total_limit) * 100, 1) if total_limit > 0 else 0,
-                'activeSessions': len(sessions),
-                'models': model_stats,
-                'sessions': session_list,
+                'todayTokens': view['todayTokens'],
+                'todayLimit': view['todayLimit'],
+                'todayPercent': view['todayPercent'],
+                'activeSessions': view['activeSessions'],
+                'models': view['models'],
+                'sessions': view['sessions'],
                 'availableModels': [
                     {'name': 'kimi-for-coding', 'provider': 'kimi-code', 'limit': 262144, 'costPer1K': 0.0, 'alias': 'Kimi Code'},
                     {'name': 'kimi-k2-0905-preview', 'provider': 'moonshot', 'limit': 262144, 'costPer1K': 0.0, 'alias': 'Kimi K2'},
@@ -584,21 +674,17 @@ PENDING_COMMITS_FILE = '/home/madadmin/clawd/data/pending-commits.json'
 
 def load_pending_commits():
     """Load pending commits from file"""
-    if os.path.exists(PENDING_COMMITS_FILE):
-        try:
-            with open(PENDING_COMMITS_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    commits = read_json(PENDING_COMMITS_FILE, [])
+    return commits if isinstance(commits, list) else []
 
-def save_pending_commits(commits):
-    """Save pending commits to file"""
-    os.makedirs(os.path.dirname(PENDING_COMMITS_FILE), exist_ok=True)
-    with open(PENDING_COMMITS_FILE, 'w') as f:
-        json.dump(commits, f, indent=2)
+def remove_pending_commit(commit_id):
+    """Drop one commit, keeping any added while git was running"""
+    update_json(PENDING_COMMITS_FILE,
+                lambda commits: [c for c in (commits if isinstance(commits, list) else []) if c['id'] != commit_id],
+                default=[], indent=2)
 
 @app.route('/api/github/pending', methods=['GET'])
+@conditional(lambda: file_sources(PENDING_COMMITS_FILE))
 def get_pending_commits():
     """Get list of pending commits awaiting approval"""
     commits = load_pending_commits()
@@ -628,8 +714,7 @@ def approve_commit(commit_id):
         
         if result.returncode == 0:
             # Remove from pending
-            commits = [c for c in commits if c['id'] != commit_id]
-            save_pending_commits(commits)
+            remove_pending_commit(commit_id)
             
             # Log the approval
             add_log('system', f"✅ GitHub commit approved and pushed: {commit['message'][:50]}...")
@@ -666,8 +751,7 @@ def reject_commit(commit_id):
         )
         
         # Remove from pending
-        commits = [c for c in commits if c['id'] != commit_id]
-        save_pending_commits(commits)
+        remove_pending_commit(commit_id)
         
         # Log the rejection
         add_log('system', f"❌ GitHub commit rejected: {commit['message'][:50]}...")
@@ -708,85 +792,49 @@ def get_git_history():
 # Sub-Agent / Session Monitoring
 SUBAGENT_TASKS_FILE = '/home/madadmin/clawd/data/subagent-tasks.json'
 
+subagent_tasks_index = MtimeCache(
+    SUBAGENT_TASKS_FILE,
+    lambda data: {t['agent_id']: t for t in data.get('tasks', [])},
+    default={}
+)
+
 def load_subagent_tasks():
-    """Load task info for sub-agents"""
-    if os.path.exists(SUBAGENT_TASKS_FILE):
-        try:
-            with open(SUBAGENT_TASKS_FILE, 'r') as f:
-                data = json.load(f)
-                return {t['agent_id']: t for t in data.get('tasks', [])}
-        except:
-            return {}
-    return {}
+    """Load task info for sub-agents (cached until the file changes)"""
+    return subagent_tasks_index.get() or {}
+
+def subagent_sources():
+    """Session/task files plus the process scanner's generation"""
+    process_scanner.scan()
+    return file_sources(SESSIONS_FILE, SUBAGENT_TASKS_FILE) + [('processes', process_scanner.generation)]
 
 @app.route('/api/subagents', methods=['GET'])
+@conditional(subagent_sources)
 def get_subagents():
     """Get list of active spawned sub-agents/sessions"""
     try:
-        sessions_file = '/home/madadmin/.clawdbot/agents/main/sessions/sessions.json'
         tasks = load_subagent_tasks()
         subagents = []
         
-        if os.path.exists(sessions_file):
-            with open(sessions_file, 'r') as f:
-                sessions = json.load(f)
-            
-            for session_key, session_info in sessions.items():
-                # Skip main session
-                if 'main' in session_key and 'subagent' not in session_key:
-                    continue
-                
-                # Parse session info
-                agent_type = 'subagent' if 'subagent' in session_key else 'worker'
-                session_id = session_key.split(':')[-1][:8] if ':' in session_key else session_key[:8]
-                
+        view = sessions_index.get()
+        if view is not None:
+            for session in view['subagents']:
                 # Get task info if available
-                task_info = tasks.get(session_id, {})
+                task_info = tasks.get(session['id'], {})
                 
-                subagents.append({
-                    'id': session_id,
-                    'full_key': session_key,
-                    'type': agent_type,
-                    'model': session_info.get('model', 'unknown'),
-                    'provider': session_info.get('modelProvider', 'unknown'),
-                    'status': task_info.get('status', 'active'),
-                    'task': task_info.get('task', 'Unknown task'),
-                    'description': task_info.get('description', ''),
-                    'output_file': task_info.get('output_file', ''),
-                    'started': task_info.get('started', ''),
-                    'tokens_in': session_info.get('inputTokens', 0),
-                    'tokens_out': session_info.get('outputTokens', 0),
-                    'context_used': session_info.get('contextTokens', 0),
-                    'updated': session_info.get('lastMessageAt', 'unknown')
-                })
+                subagents.append(dict(
+                    session,
+                    status=task_info.get('status', 'active'),
+                    task=task_info.get('task', 'Unknown task'),
+                    description=task_info.get('description', ''),
+                    output_file=task_info.get('output_file', ''),
+                    started=task_info.get('started', '')
+                ))
         
-        # Also check for running Python processes
+        # Also check for running Python processes (cached /proc scan)
         try:
-            result = subprocess.run(
-                ['ps', 'aux'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            process_agents = []
-            for line in result.stdout.split('\n'):
-                if 'python3' in line and any(x in line for x in ['monitor', 'evaluator', 'email']):
-                    parts = line.split()
-                    if len(parts) > 10:
-                        pid = parts[1]
-                        cmd = ' '.join(parts[10:])[:60]
-                        process_agents.append({
-                            'id': f"proc-{pid}",
-                            'type': 'background_process',
-                            'name': cmd,
-                            'status': 'running',
-                            'pid': pid
-                        })
-            
-            subagents.extend(process_agents)
-        except:
-            pass
+            subagents.extend(process_scanner.scan())
+        except Exception as e:
+            print(f"Process scan error: {e}")
         
         return jsonify({
             'count': len(subagents),
@@ -803,6 +851,26 @@ ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'txt', 'md', 'json', '
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Resumable chunked uploads (/api/upload/init, PUT chunks, finalize)
+# Deduplicated, indexed storage behind UPLOAD_FOLDER
+blob_store = BlobStore(UPLOAD_FOLDER)
+file_catalog.set_time_source(UPLOAD_FOLDER, blob_store.upload_times)
+upload_manager = UploadManager(UPLOAD_FOLDER, allowed=ALLOWED_EXTENSIONS, store=blob_store)
+
+def on_upload_complete(info):
+    add_log('info', f'📤 File uploaded: "{info["filename"]}" ({format_file_size(info["size"])}) by user')
+    write_notification({
+        'type': 'file_uploaded',
+        'timestamp': datetime.now().isoformat(),
+        'filename': info['filename'],
+        'path': info['path'],
+        'size': info['size'],
+        'sha256': info['sha256'],
+        'channel': '1466517317403021362'
+    })
+
+register_upload_routes(app, upload_manager, on_upload_complete)
+
 @app.route('/upload.html')
 def upload_page():
     return send_from_directory('.', 'upload.html')
@@ -825,13 +893,11 @@ def upload_file():
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_name = f"{uuid.uuid4()}.{ext}"
-        filepath = os.path.join(UPLOAD_FOLDER, unique_name)
-        
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        file.save(filepath)
-        file_size = os.path.getsize(filepath)
+        # Hashed while written; duplicates become hard links to the existing blob
+        info = blob_store.add_stream(file.stream, file.filename,
+                                     uploader=request.headers.get('X-Uploader') or request.remote_addr)
+        filepath = info['path']
+        file_size = info['size']
         
         # Log the upload
         add_log('info', f'📤 File uploaded: "{file.filename}" ({format_file_size(file_size)}) by user')
@@ -843,6 +909,7 @@ def upload_file():
             'filename': file.filename,
             'path': filepath,
             'size': file_size,
+            'sha256': info['sha256'],
             'channel': '1466517317403021362'
         })
         
@@ -864,20 +931,15 @@ def upload_file():
 def get_recent_uploads():
     """Get list of recent uploads"""
     try:
-        files = []
-        if os.path.exists(UPLOAD_FOLDER):
-            for f in os.listdir(UPLOAD_FOLDER):
-                filepath = os.path.join(UPLOAD_FOLDER, f)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
-                    files.append({
-                        'name': f,
-                        'size': format_file_size(stat.st_size),
-                        'path': filepath,
-                        'time': datetime.fromtimestamp(stat.st_mtime).isoformat()
-                    })
-        files.sort(key=lambda x: x['time'], reverse=True)
-        return jsonify(files[:10])
+        # Newest 10 straight from the catalogue's time index
+        rows, _ = file_catalog.list(UPLOAD_FOLDER, limit=10)
+        files = [{
+            'name': row['name'],
+            'size': format_file_size(row['size']),
+            'path': row['path'],
+            'time': datetime.fromtimestamp(row['mtime']).isoformat()
+        } for row in rows]
+        return jsonify(files)
     except Exception as e:
         add_log('error', f'Error listing uploads: {str(e)}')
         return jsonify([])
@@ -888,32 +950,38 @@ def download_file(filename):
     try:
         # Log the download
         add_log('info', f'📥 File downloaded: "{filename}"')
-        return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=True)
+        return send_from_directory_range(UPLOAD_FOLDER, filename, as_attachment=True)
     except Exception as e:
         add_log('error', f'File download failed: "{filename}" - {str(e)}')
         return jsonify({'error': 'File not found'}), 404
 
 @app.route('/api/files')
 def list_files():
-    """List all files (for 2-way transfer)"""
+    """List files for 2-way transfer, newest first, one page at a time"""
     try:
-        files = []
-        if os.path.exists(UPLOAD_FOLDER):
-            for f in os.listdir(UPLOAD_FOLDER):
-                filepath = os.path.join(UPLOAD_FOLDER, f)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
-                    files.append({
-                        'name': f,
-                        'original_name': f,
-                        'size': stat.st_size,
-                        'size_formatted': format_file_size(stat.st_size),
-                        'uploaded_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        'download_url': f'/api/download/{f}'
-                    })
-        files.sort(key=lambda x: x['uploaded_at'], reverse=True)
+        # One page, newest first; pass ?cursor=<next_cursor> for the next one
+        rows, next_cursor = file_catalog.list(UPLOAD_FOLDER,
+                                              limit=request.args.get('limit', CATALOG_PAGE, type=int),
+                                              cursor=request.args.get('cursor'))
+        files = [{
+            'name': row['name'],
+            'original_name': row['name'],
+            'size': row['size'],
+            'size_formatted': format_file_size(row['size']),
+            'uploaded_at': datetime.fromtimestamp(row['mtime']).isoformat(),
+            'download_url': f"/api/download/{row['name']}"
+        } for row in rows]
+        # Original names and hashes of uploads come from the blob store's index
+        indexed = blob_store.lookup(f['name'] for f in files)
+        for f in files:
+            if f['name'] in indexed:
+                f['original_name'] = indexed[f['name']]['original_name']
+                f['sha256'] = indexed[f['name']]['sha256']
         add_log('info', f'📋 File list retrieved: {len(files)} files')
-        return jsonify({'files': files})
+        response = jsonify({'files': files, 'next_cursor': next_cursor})
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except Exception as e:
         add_log('error', f'Error listing files: {str(e)}')
         return jsonify({'files': [], 'error': str(e)})
@@ -945,77 +1013,40 @@ def handle_subscribe():
     emit('subscribed', {'channel': 'dashboard_updates'})
 
 def broadcast_update(update_type, data):
-    """Broadcast update to all connected clients"""
+    """Broadcast update to all connected clients (tagged with the data version)"""
     socketio.emit('update', {
         'type': update_type,
         'data': data,
+        'version': current_version(),
         'timestamp': datetime.now().isoformat()
     })
 
+def notify_change(table, row_id):
+    """Tell clients a row changed so they can pull /api/changes"""
+    http_cache.bump()
+    try:
+        broadcast_update('data_changed', {'table': table, 'id': row_id})
+    except Exception as e:
+        print(f"Broadcast error: {e}")
+
 def background_updater():
     """Background thread to emit periodic updates"""
+    ticks = 0
     while True:
-        try:
-            # Emit system stats every 5 seconds (using /proc fallback)
+        ticks += 1
+        if ticks % 720 == 0:  # Hourly
             try:
-                import psutil
-                stats = {
-                    'cpu': psutil.cpu_percent(interval=0.1),
-                    'memory': psutil.virtual_memory().percent,
-                    'disk': psutil.disk_usage('/').percent
-                }
-            except ImportError:
-                # Fallback to reading from /proc
-                stats = get_system_stats_fallback()
-            
-            broadcast_update('system_stats', stats)
-            
+                trim_changes()
+            except Exception as e:
+                print(f"Change journal trim error: {e}")
+        try:
+            # Emit the sampler's latest stats every 5 seconds
+            broadcast_update('system_stats', system_sampler.latest())
         except Exception as e:
             print(f"Background updater error: {e}")
         
         time.sleep(5)
 
-def get_system_stats_fallback():
-    """Get system stats without psutil"""
-    try:
-        # CPU from /proc/stat
-        with open('/proc/stat') as f:
-            line = f.readline()
-            fields = line.split()
-            if fields[0] == 'cpu':
-                total = sum(int(x) for x in fields[1:5])
-                idle = int(fields[4])
-                cpu = 100 * (1 - idle / total) if total > 0 else 0
-            else:
-                cpu = 0
-        
-        # Memory from /proc/meminfo
-        with open('/proc/meminfo') as f:
-            meminfo = f.read()
-            mem_total = 0
-            mem_available = 0
-            for line in meminfo.split('\n'):
-                if line.startswith('MemTotal:'):
-                    mem_total = int(line.split()[1]) * 1024
-                elif line.startswith('MemAvailable:'):
-                    mem_available = int(line.split()[1]) * 1024
-            memory = ((mem_total - mem_available) / mem_total * 100) if mem_total > 0 else 0
-        
-        # Disk
-        stat = os.statvfs('/')
-        total = stat.f_blocks * stat.f_frsize
-        free = stat.f_bfree * stat.f_frsize
-        disk = ((total - free) / total * 100) if total > 0 else 0
-        
-        return {
-            'cpu': round(cpu, 1),
-            'memory': round(memory, 1),
-            'disk': round(disk, 1)
-        }
-    except Exception as e:
-        print(f"Fallback stats error: {e}")
-        return {'cpu': 0, 'memory': 0, 'disk': 0}
-
 # ==================== AUDIT LOG ENDPOINTS ====================
 
 @app.route('/api/audit', methods=['GET'])
@@ -1023,16 +1054,13 @@ def get_audit_log():
     """Get audit log entries"""
     try:
         limit = request.args.get('limit', 100, type=int)
-        conn = sqlite3.connect(AUDIT_DB)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT timestamp, actor, action, target_type, target_id, details
-            FROM audit_log
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limit,))
-        rows = cursor.fetchall()
-        conn.close()
+        with connection(AUDIT_DB) as conn:
+            rows = conn.execute('''
+                SELECT timestamp, actor, action, target_type, target_id, details
+                FROM audit_log
+                ORDER BY timestamp DESC
+                LIMIT ?
+            ''', (limit,)).fetchall()
         
         return jsonify([{
             'timestamp': r[0],
@@ -1049,19 +1077,17 @@ def get_audit_log():
 def get_audit_stats():
     """Get audit statistics"""
     try:
-        conn = sqlite3.connect(AUDIT_DB)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM audit_log')
-        total = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT action, COUNT(*) FROM audit_log GROUP BY action')
-        actions = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        cursor.execute('SELECT actor, COUNT(*) FROM audit_log GROUP BY actor')
-        actors = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        conn.close()
+        with connection(AUDIT_DB) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT COUNT(*) FROM audit_log')
+            total = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT action, COUNT(*) FROM audit_log GROUP BY action')
+            actions = {row[0]: row[1] for row in cursor.fetchall()}
+            
+            cursor.execute('SELECT actor, COUNT(*) FROM audit_log GROUP BY actor')
+            actors = {row[0]: row[1] for row in cursor.fetchall()}
         
         return jsonify({
             'total_entries': total,
@@ -1071,6 +1097,16 @@ def get_audit_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Conditional GET (304) hit ratio for the read APIs"""
+    return jsonify(http_cache.cache_stats())
+
+@app.route('/api/db/pool', methods=['GET'])
+def get_db_pool_stats():
+    """Connection pool hit/miss statistics per database"""
+    return jsonify(pool_stats())
+
 # ==================== STAR WARS API ====================
 
 STAR_WARS_DB = '/home/madadmin/clawd/projects/star-wars/database/star-wars.db'
@@ -1088,23 +1124,22 @@ def get_starwars_stats():
                 'status': 'database_not_found'
             })
         
-        conn = sqlite3.connect(STAR_WARS_DB)
-        cursor = conn.cursor()
-        
-        stats = {}
-        cursor.execute('SELECT COUNT(*) FROM eras')
-        stats['eras'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM characters')
-        stats['characters'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM factions')
-        stats['factions'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM geetsly_videos')
-        stats['videos'] = cursor.fetchone()[0]
+        with connection(STAR_WARS_DB, read_only=True) as conn:
+            cursor = conn.cursor()
+            
+            stats = {}
+            cursor.execute('SELECT COUNT(*) FROM eras')
+            stats['eras'] = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM characters')
+            stats['characters'] = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM factions')
+            stats['factions'] = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM geetsly_videos')
+            stats['videos'] = cursor.fetchone()[0]
         
-        conn.close()
         stats['status'] = 'ok'
         return jsonify(stats)
     except Exception as e:
@@ -1121,15 +1156,10 @@ def get_starwars_data(table):
         if table not in valid_tables:
             return jsonify({'error': 'Invalid table'}), 400
         
-        conn = sqlite3.connect(STAR_WARS_DB)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute(f'SELECT * FROM {table}')
-        rows = cursor.fetchall()
+        with connection(STAR_WARS_DB, read_only=True) as conn:
+            rows = conn.execute(f'SELECT * FROM {table}').fetchall()
         
         result = [dict(row) for row in rows]
-        conn.close()
         
         return jsonify(result)
     except Exception as e:
@@ -1142,19 +1172,14 @@ def get_character(name):
         if not os.path.exists(STAR_WARS_DB):
             return jsonify({'error': 'Database not found'}), 404
         
-        conn = sqlite3.connect(STAR_WARS_DB)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM characters WHERE name LIKE ?', (f'%{name}%',))
-        row = cursor.fetchone()
+        with connection(STAR_WARS_DB, read_only=True) as conn:
+            row = conn.execute('SELECT * FROM characters WHERE name LIKE ?', (f'%{name}%',)).fetchone()
         
         if row:
             result = dict(row)
         else:
             result = {'error': 'Character not found'}
         
-        conn.close()
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1162,30 +1187,27 @@ def get_character(name):
 if __name__ == '__main__':
     # Initialize audit database
     try:
-        conn = sqlite3.connect(AUDIT_DB)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                actor TEXT NOT NULL,
-                action TEXT NOT NULL,
-                target_type TEXT,
-                target_id TEXT,
-                old_value TEXT,
-                new_value TEXT,
-                details TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with connection(AUDIT_DB) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS audit_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    actor TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    target_type TEXT,
+                    target_id TEXT,
+                    old_value TEXT,
+                    new_value TEXT,
+                    details TEXT
+                )
+            ''')
         print(f"🔍 Audit database initialized: {AUDIT_DB}")
     except Exception as e:
         print(f"Audit init error: {e}")
     
     print("🚀 Starting Cosmo Dashboard Server v27 (WebSocket Enabled)...")
     print(f"📊 Database: {DB_PATH}")
-    print(f"🔔 Notifications: {NOTIFICATIONS_FILE}")
+    print(f"🔔 Notifications: {QUEUE_DB} ({TOPIC_NOTIFICATIONS})")
     print(f"🐙 GitHub Approval: {PENDING_COMMITS_FILE}")
     print(f"🔍 Audit Log: {AUDIT_DB}")
     
@@ -1193,6 +1215,8 @@ if __name__ == '__main__':
     updater_thread = threading.Thread(target=background_updater, daemon=True)
     updater_thread.start()
     print("📡 Background updater started")
+    system_sampler.start()
+    print(f"📈 System sampler started ({system_sampler.interval}s interval)")
     
     # Run with SocketIO (allow_unsafe_werkzeug for production use)
     socketio.run(app, host='0.0.0.0', port=8095, debug=False, allow_unsafe_werkzeug=True)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - Sessions Index
+Parse-once views of clawdbot's sessions.json for /api/tokens and /api/subagents
+
+The file is re-parsed only when its (inode, size, mtime_ns) signature changes;
+otherwise both endpoints read precomputed structures straight from memory.
+"""
+
+import json
+import os
+import threading
+
+SESSIONS_FILE = '/home/madadmin/.clawdbot/agents/main/sessions/sessions.json'
+DEFAULT_CONTEXT_LIMIT = 262144  # Default 262k
+
+
+class MtimeCache:
+    """Parse a JSON file and derive a view from it, rebuilt only on change"""
+
+    def __init__(self, path, build, default=None):
+        self.path = path
+        self.build = build
+        self.default = default
+        self._key = None
+        self._value = default
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'rebuilds': 0, 'errors': 0}
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self):
+        key = self._signature()
+        if key == self._key:
+            self.stats['hits'] += 1
+            return self._value
+        with self._lock:
+            if key == self._key:
+                self.stats['hits'] += 1
+                return self._value
+            if key is None:
+                value = self.default
+            else:
+                try:
+                    with open(self.path, 'r') as f:
+                        value = self.build(json.load(f))
+                except Exception as e:
+                    # Keep serving the last good view; a writer finishing a
+                    # partial write changes the signature and triggers a retry
+                    self.stats['errors'] += 1
+                    print(f"Could not index {self.path}: {e}")
+                    self._key = key
+                    return self._value
+            self._key = key
+            self._value = value
+            self.stats['rebuilds'] += 1
+            return value
+
+
+def build_sessions_view(sessions):
+    """Precompute token totals, per-session rows, per-model stats and sub-agent rows"""
+    total_tokens = 0
+    total_limit = 0
+    session_list = []
+    model_stats = {}
+    subagents = []
+
+    for session_key, session_info in sessions.items():
+        model = session_info.get('model', 'unknown')
+        provider = session_info.get('modelProvider', 'unknown')
+        input_tokens = session_info.get('inputTokens', 0)
+        output_tokens = session_info.get('outputTokens', 0)
+        context_limit = session_info.get('contextTokens', DEFAULT_CONTEXT_LIMIT)
+
+        session_total = input_tokens + output_tokens
+        total_tokens += session_total
+        total_limit += context_limit
+
+        # Format session key for display
+        session_name = session_key.replace('agent:main:', '').replace('discord:', 'Discord ').replace('channel:', '#')
+
+        session_list.append({
+            'name': session_name,
+            'agent': 'Cosmo',
+            'model': model,
+            'provider': provider,
+            'status': 'active',
+            'tokensUsed': session_total,
+            'tokensLimit': context_limit,
+            'percentUsed': round((session_total / context_limit) * 100, 1) if context_limit else 0,
+            'inputTokens': input_tokens,
+            'outputTokens': output_tokens
+        })
+
+        # Aggregate by model
+        model_key = f"{provider}/{model}"
+        if model_key not in model_stats:
+            model_stats[model_key] = {'tokens': 0, 'calls': 0, 'sessions': 0}
+        model_stats[model_key]['tokens'] += session_total
+        model_stats[model_key]['calls'] += 1
+        model_stats[model_key]['sessions'] += 1
+
+        # Sub-agent rows (the main session is not a sub-agent)
+        if 'main' in session_key and 'subagent' not in session_key:
+            continue
+        subagents.append({
+            'id': session_key.split(':')[-1][:8] if ':' in session_key else session_key[:8],
+            'full_key': session_key,
+            'type': 'subagent' if 'subagent' in session_key else 'worker',
+            'model': model,
+            'provider': provider,
+            'tokens_in': input_tokens,
+            'tokens_out': output_tokens,
+            'context_used': session_info.get('contextTokens', 0),
+            'updated': session_info.get('lastMessageAt', 'unknown')
+        })
+
+    return {
+        'todayTokens': total_tokens,
+        'todayLimit': total_limit,
+        'todayPercent': round((total_tokens / total_limit) * 100, 1) if total_limit > 0 else 0,
+        'activeSessions': len(sessions),
+        'models': model_stats,
+        'sessions': session_list,
+        'subagents': subagents
+    }
+
+
+sessions_index = MtimeCache(SESSIONS_FILE, build_sessions_view)
@@ -5,156 +5,313 @@ Serves static files from the current directory
 """
 
 import http.server
-import socketserver
 import os
+import selectors
+import signal
 import sys
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from notification_queue import NotificationQueue, TOPIC_NOTIFICATIONS
+from system_sampler import sampler as system_sampler
+from discord_outbox import outbox as discord_outbox
+from document_store import DocumentStore, RevisionConflict
+from json_patch import JsonPatchError, JsonPatchTestFailed
+
 PORT = 8095
 DIRECTORY = "."
+WORKERS = 16              # Connections served in parallel
+MAX_CONNECTIONS = 64      # Served + queued connections before answering 503
+KEEPALIVE_TIMEOUT = 15    # Seconds an idle keep-alive connection stays open (parked, no worker)
+REQUEST_TIMEOUT = 10      # Seconds a worker waits on a slow client mid-request
+NOTIFICATIONS_FILE = '/home/madadmin/clawd/data/notifications.json'
+
+notification_queue = NotificationQueue(TOPIC_NOTIFICATIONS, legacy_file=NOTIFICATIONS_FILE)
 
-# Try to import psutil, fallback to /proc reading
-try:
-    import psutil
-    HAS_PSUTIL = True
-except ImportError:
-    HAS_PSUTIL = False
-    print("⚠️ psutil not available, using /proc fallback")
+# Revisioned documents behind GET/POST/PATCH /api/data and /api/ideas
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+data_store = DocumentStore(os.path.join(DATA_DIR, 'dashboard-data.json'),
+                           lambda: {"projects": [], "tasks": [], "logs": []})
+ideas_store = DocumentStore(os.path.join(DATA_DIR, 'ideas.json'), lambda: {"ideas": []})
+DOCUMENT_STORES = {'/api/data': data_store, '/api/ideas': ideas_store}
 
 
 def get_system_stats():
-    """Get CPU, memory, and disk usage percentages"""
-    stats = {"cpu": 0, "memory": 0, "disk": 0}
-    
-    if HAS_PSUTIL:
-        # Use psutil for cross-platform compatibility
-        stats["cpu"] = psutil.cpu_percent(interval=0.1)
-        stats["memory"] = psutil.virtual_memory().percent
-        stats["disk"] = psutil.disk_usage('/').percent
-    else:
-        # Fallback to reading from /proc filesystem (Linux only)
+    """Get CPU, memory, and disk usage percentages (latest background sample)"""
+    try:
+        return system_sampler.latest()
+    except Exception as e:
+        print(f"Error reading system stats: {e}")
+        return {"cpu": 0, "memory": 0, "disk": 0}
+
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """HTTPServer that hands each request to a bounded worker pool
+
+    A worker serves one request, then parks a kept-alive connection in a
+    selector watched by one idle thread. Idle browser connections therefore
+    hold no worker: the connection goes back to the pool when its next
+    request arrives, and is closed after KEEPALIVE_TIMEOUT. When every
+    connection slot is taken, the longest-idle connection is closed to make
+    room before a new one is turned away.
+    """
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address, handler, workers=WORKERS, max_connections=MAX_CONNECTIONS,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.keepalive_timeout = keepalive_timeout
+        self.draining = False
+        self.selector = selectors.DefaultSelector()
+        self.parked = {}                # socket -> (handler, idle deadline)
+        self.idle_lock = threading.Lock()
+        self.idle_stop = threading.Event()
+        self.idle_thread = threading.Thread(target=self.watch_idle, name='http-idle', daemon=True)
+        self.idle_thread.start()
+
+    def acquire_slot(self):
+        if self.slots.acquire(blocking=False):
+            return True
+        with self.idle_lock:
+            oldest = min(self.parked.values(), key=lambda item: item[1], default=None)
+        if oldest is not None and self.unpark(oldest[0].connection) is not None:
+            self.close(oldest[0])
+            return self.slots.acquire(blocking=False)
+        return False
+
+    def process_request(self, request, client_address):
+        if self.draining or not self.acquire_slot():
+            self.reject(request)
+            return
         try:
-            # CPU usage - calculate from /proc/stat
-            with open('/proc/stat', 'r') as f:
-                line = f.readline()
-                fields = line.split()
-                if fields[0] == 'cpu':
-                    user = int(fields[1])
-                    nice = int(fields[2])
-                    system = int(fields[3])
-                    idle = int(fields[4])
-                    total = user + nice + system + idle
-                    used = user + nice + system
-                    stats["cpu"] = round((used / total) * 100, 1) if total > 0 else 0
-            
-            # Memory usage from /proc/meminfo
-            with open('/proc/meminfo', 'r') as f:
-                meminfo = f.read()
-                mem_total = 0
-                mem_available = 0
-                for line in meminfo.split('\n'):
-                    if line.startswith('MemTotal:'):
-                        mem_total = int(line.split()[1]) * 1024
-                    elif line.startswith('MemAvailable:'):
-                        mem_available = int(line.split()[1]) * 1024
-                if mem_total > 0:
-                    stats["memory"] = round(((mem_total - mem_available) / mem_total) * 100, 1)
-            
-            # Disk usage using os.statvfs
-            statvfs = os.statvfs('/')
-            total_blocks = statvfs.f_blocks
-            free_blocks = statvfs.f_bfree
-            block_size = statvfs.f_frsize
-            total_size = total_blocks * block_size
-            free_size = free_blocks * block_size
-            if total_size > 0:
-                stats["disk"] = round(((total_size - free_size) / total_size) * 100, 1)
-                
-        except Exception as e:
-            print(f"Error reading /proc stats: {e}")
-    
-    return stats
+            self.pool.submit(self.process_request_thread, request, client_address)
+        except RuntimeError:  # Pool already shut down
+            self.slots.release()
+            self.reject(request)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            self.slots.release()
+            return
+        self.after_request(handler)
+
+    def serve_next(self, handler):
+        try:
+            handler.handle()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            handler.close_connection = True
+        self.after_request(handler)
+
+    def after_request(self, handler):
+        if handler.close_connection or self.draining:
+            self.close(handler)
+        elif self.request_pending(handler):
+            self.serve_next(handler)    # Pipelined: the next request is already here
+        else:
+            self.park(handler)
+
+    def request_pending(self, handler):
+        """Whether bytes of the next request are buffered or readable, without blocking"""
+        handler.connection.settimeout(0)
+        try:
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            return True                 # Let the handler run into the error
+        finally:
+            handler.connection.settimeout(handler.timeout)
+
+    def park(self, handler):
+        with self.idle_lock:
+            if not self.draining:
+                self.parked[handler.connection] = (handler, time.monotonic() + self.keepalive_timeout)
+                self.selector.register(handler.connection, selectors.EVENT_READ)
+                return
+        self.close(handler)
+
+    def unpark(self, sock):
+        """Take a connection out of the selector; None if it was not parked"""
+        with self.idle_lock:
+            item = self.parked.pop(sock, None)
+            if item is None:
+                return None
+            self.selector.unregister(sock)
+        return item[0]
+
+    def watch_idle(self):
+        while not self.idle_stop.is_set():
+            try:
+                events = self.selector.select(timeout=1)
+            except (OSError, ValueError):
+                events = []
+            for key, _ in events:
+                handler = self.unpark(key.fileobj)
+                if handler is None:
+                    continue
+                try:
+                    self.pool.submit(self.serve_next, handler)
+                except RuntimeError:    # Pool already shut down
+                    self.close(handler)
+            now = time.monotonic()
+            with self.idle_lock:
+                expired = [handler for handler, deadline in self.parked.values() if deadline <= now]
+            for handler in expired:
+                if self.unpark(handler.connection) is not None:
+                    self.close(handler)
+
+    def close(self, handler):
+        try:
+            handler.close()
+        except Exception:
+            pass
+        self.shutdown_request(handler.request)
+        self.slots.release()
+
+    def close_idle(self):
+        with self.idle_lock:
+            sockets = list(self.parked)
+        for sock in sockets:
+            handler = self.unpark(sock)
+            if handler is not None:
+                self.close(handler)
+
+    def reject(self, request):
+        """Over the connection limit: answer 503 without tying up a worker"""
+        try:
+            request.sendall(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n'
+                            b'Retry-After: 1\r\nConnection: close\r\n\r\n')
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def drain(self):
+        """Stop accepting and wait for in-flight requests (call off the serving thread)"""
+        self.draining = True
+        self.shutdown()
+        self.close_idle()
+        self.pool.shutdown(wait=True)
+
+    def server_close(self):
+        self.draining = True
+        self.close_idle()
+        self.idle_stop.set()
+        self.idle_thread.join()
+        self.selector.close()
+        super().server_close()
 
 
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # Keep-alive
+    timeout = REQUEST_TIMEOUT
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
     
+    def handle(self):
+        # One request per call: PooledHTTPServer parks the connection between requests
+        self.close_connection = True
+        self.handle_one_request()
+    
+    def finish(self):
+        pass  # The connection outlives this request; close() ends it
+    
+    def close(self):
+        super().finish()
+    
     def end_headers(self):
         # Add CORS headers
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        self.send_header('Access-Control-Expose-Headers', 'ETag, X-Revision')
+        if getattr(self.server, 'draining', False):
+            # Shutting down: finish this response, then drop the connection
+            self.close_connection = True
+            self.send_header('Connection', 'close')
         super().end_headers()
     
+    def send_json(self, payload, status=200, headers=None, body=None):
+        """Send a JSON response with Content-Length (required for keep-alive)"""
+        if body is None:
+            body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # Client went away
+    
+    def revision_headers(self, rev):
+        return {'X-Revision': str(rev), 'ETag': f'"{rev}"'}
+    
+    def expected_revision(self, body=None):
+        """Client's base revision from the body's "rev" or an If-Match header"""
+        if isinstance(body, dict) and body.get('rev') is not None:
+            return int(body['rev'])
+        if_match = self.headers.get('If-Match')
+        if if_match and if_match.strip() != '*':
+            return int(if_match.strip().lstrip('W/').strip('"'))
+        return None
+    
+    def read_body(self):
+        """Read exactly the request body (never past it into the next request)"""
+        content_length = int(self.headers.get('Content-Length', 0) or 0)
+        return self.rfile.read(content_length) if content_length > 0 else b''
+    
     def do_GET(self):
         # Handle /api/system endpoint
         if self.path == '/api/system':
             stats = get_system_stats()
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(stats).encode())
+            self.send_json(stats)
             return
         
         # Handle /api/tokens endpoint
         if self.path == '/api/tokens':
             token_stats = self.get_token_stats()
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(token_stats).encode())
+            self.send_json(token_stats)
             return
         
         # Handle /api/uptime endpoint
         if self.path == '/api/uptime':
             uptime_data = self.get_uptime_data()
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(uptime_data).encode())
+            self.send_json(uptime_data)
             return
         
-        # Handle GET /api/data - load saved dashboard data
-        if self.path == '/api/data':
+        # Handle /api/discord/outbox - delivery queue status
+        if self.path == '/api/discord/outbox':
             try:
-                data_file = 'data/dashboard-data.json'
-                if os.path.exists(data_file):
-                    with open(data_file) as f:
-                        data = json.load(f)
-                else:
-                    data = {"projects": [], "tasks": [], "logs": []}
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(data).encode())
+                self.send_json(discord_outbox.stats())
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
+                self.send_json({"error": str(e)}, 500)
             return
         
-        # Handle GET /api/ideas - load saved ideas
-        if self.path == '/api/ideas':
+        # Handle GET /api/data and /api/ideas - saved dashboard data / ideas
+        if self.path in DOCUMENT_STORES:
             try:
-                ideas_file = 'data/ideas.json'
-                if os.path.exists(ideas_file):
-                    with open(ideas_file) as f:
-                        data = json.load(f)
+                rev, body = DOCUMENT_STORES[self.path].encoded()
+                if self.headers.get('If-None-Match') == f'"{rev}"':
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    for name, value in self.revision_headers(rev).items():
+                        self.send_header(name, value)
+                    self.end_headers()
                 else:
-                    data = {"ideas": []}
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(data).encode())
+                    self.send_json(None, headers=self.revision_headers(rev), body=body)
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
+                self.send_json({"error": str(e)}, 500)
             return
         
         # Default: serve static files
@@ -254,17 +411,17 @@ class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_POST(self):
         # Handle CORS preflight
         if self.headers.get('Origin'):
+            self.read_body()  # Drain it so the kept-alive connection stays in sync
             self.send_response(200)
-            self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            self.send_header('Content-Length', '0')
             self.end_headers()
             return
             
         # Handle Discord notification endpoint
         if self.path == '/api/notify-discord':
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
+            post_data = self.read_body()
             
             try:
                 data = json.loads(post_data)
@@ -288,24 +445,17 @@ class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                     plan = data.get('plan', '')
                     success = self.send_discord_notification(idea, plan, channel)
                 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
                 if success:
-                    self.wfile.write(json.dumps({"status": "sent", "type": notification_type}).encode())
+                    self.send_json({"status": "queued", "type": notification_type})
                 else:
-                    self.wfile.write(json.dumps({"status": "failed", "error": "Discord send failed"}).encode())
+                    self.send_json({"status": "failed", "error": "Discord queue failed"})
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
+                self.send_json({"error": str(e)}, 500)
             return
         
         # Handle project evaluation endpoint (for Cosmo to post evaluations)
         if self.path == '/api/project-evaluation':
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
+            post_data = self.read_body()
             
             try:
                 data = json.loads(post_data)
@@ -335,211 +485,111 @@ Reply with "go" to approve and start work!"""
                 
                 # Also update the project's status to "evaluated" in the data file
                 try:
-                    data_file = 'data/dashboard-data.json'
-                    if os.path.exists(data_file):
-                        with open(data_file, 'r') as f:
-                            dashboard_data = json.load(f)
-                        
-                        # Find and update the project
-                        for p in dashboard_data.get('projects', []):
-                            if p.get('id') == project.get('id'):
-                                p['status'] = 'planning'  # Move to planning after evaluation
-                                p['evaluation'] = evaluation
-                                p['evaluatedAt'] = datetime.now().isoformat()
-                                break
-                        
-                        with open(data_file, 'w') as f:
-                            json.dump(dashboard_data, f, indent=2)
+                    rev, dashboard_data = data_store.read()
+                    for index, p in enumerate(dashboard_data.get('projects', [])):
+                        if p.get('id') == project.get('id'):
+                            path = f'/projects/{index}'
+                            data_store.patch([
+                                {"op": "test", "path": f'{path}/id', "value": p.get('id')},
+                                {"op": "add", "path": f'{path}/status', "value": 'planning'},  # Move to planning after evaluation
+                                {"op": "add", "path": f'{path}/evaluation', "value": evaluation},
+                                {"op": "add", "path": f'{path}/evaluatedAt', "value": datetime.now().isoformat()}
+                            ], expected_rev=rev)
+                            break
                 except Exception as e:
                     print(f"Could not update project status: {e}")
                 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    "status": "sent" if success else "failed",
+                self.send_json({
+                    "status": "queued" if success else "failed",
                     "type": "project_evaluation"
-                }).encode())
-            except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
-            return
-        
-        # Handle saving ideas
-        if self.path == '/api/ideas':
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
-            
-            try:
-                ideas_data = json.loads(post_data)
-                with open('data/ideas.json', 'w') as f:
-                    json.dump(ideas_data, f, indent=2)
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"status": "saved"}).encode())
+                })
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
+                self.send_json({"error": str(e)}, 500)
             return
         
-        # Handle saving dashboard data (tasks, projects, logs)
-        if self.path == '/api/data':
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
+        # Handle saving ideas / dashboard data (tasks, projects, logs) as whole documents
+        if self.path in DOCUMENT_STORES:
+            post_data = self.read_body()
             
             try:
                 data = json.loads(post_data)
-                print(f"Saving data: {len(data.get('projects', []))} projects, {len(data.get('tasks', []))} tasks")
-                
-                # Use absolute path to avoid working directory issues
-                import os
-                data_file = os.path.join(os.path.dirname(__file__), 'data', 'dashboard-data.json')
-                print(f"Writing to: {data_file}")
-                
-                with open(data_file, 'w') as f:
-                    json.dump(data, f, indent=2)
-                
-                print(f"Data saved successfully to {data_file}")
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                try:
-                    self.wfile.write(json.dumps({"status": "saved"}).encode())
-                except:
-                    pass
+                rev = DOCUMENT_STORES[self.path].replace(data, self.expected_revision())
+                self.send_json({"status": "saved", "rev": rev}, headers=self.revision_headers(rev))
+            except RevisionConflict as e:
+                self.send_json({"error": str(e), "rev": e.current}, 409, self.revision_headers(e.current))
             except Exception as e:
-                print(f"Error saving data: {e}")
-                import traceback
-                traceback.print_exc()
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                try:
-                    self.wfile.write(json.dumps({"error": str(e)}).encode())
-                except:
-                    pass
+                print(f"Error saving {self.path}: {e}")
+                self.send_json({"error": str(e)}, 500)
             return
         
         # Handle notification queue for Cosmo
         if self.path == '/api/notify':
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
+            post_data = self.read_body()
             
             try:
                 notification = json.loads(post_data)
                 print(f"Received notification: {notification.get('type', 'unknown')}")
                 
-                # Write to notifications file for Cosmo to pick up
-                notifications_file = '/home/madadmin/clawd/data/notifications.json'
-                
-                # Read existing notifications
-                notifications = []
-                if os.path.exists(notifications_file):
-                    try:
-                        with open(notifications_file) as f:
-                            notifications = json.load(f)
-                        print(f"Read {len(notifications)} existing notifications")
-                    except Exception as read_err:
-                        print(f"Error reading notifications: {read_err}")
-                        notifications = []
-                
-                # Add new notification
-                notifications.append(notification)
-                print(f"Added notification, total now: {len(notifications)}")
-                
-                # Save back
-                try:
-                    os.makedirs(os.path.dirname(notifications_file), exist_ok=True)
-                    with open(notifications_file, 'w') as f:
-                        json.dump(notifications, f, indent=2)
-                    print(f"Saved notifications to {notifications_file}")
-                except Exception as write_err:
-                    print(f"Error writing notifications: {write_err}")
-                    raise
+                # Queue for Cosmo to pick up
+                offset = notification_queue.enqueue(notification)
+                print(f"Queued notification at offset {offset}")
                 
                 # Send response immediately
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                try:
-                    self.wfile.write(json.dumps({"status": "queued"}).encode())
-                except:
-                    pass  # Client may have disconnected
+                self.send_json({"status": "queued"})
             except Exception as e:
                 print(f"Error in notify handler: {e}")
                 import traceback
                 traceback.print_exc()
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                try:
-                    self.wfile.write(json.dumps({"error": str(e)}).encode())
-                except:
-                    pass
+                self.send_json({"error": str(e)}, 500)
             return
         
+        self.read_body()
         self.send_response(404)
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
-    def get_discord_token(self):
-        """Get Discord bot token from config"""
-        # Try clawdbot config first
-        try:
-            with open('/home/madadmin/.clawdbot/clawdbot.json') as f:
-                config = json.load(f)
-                token = config.get('channels', {}).get('discord', {}).get('token')
-                if token:
-                    return token
-        except Exception as e:
-            print(f"Could not read clawdbot config: {e}")
+    def do_PATCH(self):
+        """RFC 6902 patch of /api/data or /api/ideas: {"rev": n, "ops": [...]} or ops + If-Match"""
+        post_data = self.read_body()
+        store = DOCUMENT_STORES.get(self.path)
+        if store is None:
+            self.send_json({"error": "Not found"}, 404)
+            return
         
-        # Fallback to token file
         try:
-            with open('/home/madadmin/.clawdbot/discord_token.txt') as f:
-                return f.read().strip()
+            body = json.loads(post_data or b'null')
+            operations = body.get('ops') if isinstance(body, dict) else body
+            rev = store.patch(operations, self.expected_revision(body))
+            self.send_json({"status": "patched", "rev": rev}, headers=self.revision_headers(rev))
+        except RevisionConflict as e:
+            self.send_json({"error": str(e), "rev": e.current}, 409, self.revision_headers(e.current))
+        except JsonPatchTestFailed as e:
+            self.send_json({"error": str(e), "rev": store.rev}, 409, self.revision_headers(store.rev))
+        except JsonPatchError as e:
+            self.send_json({"error": str(e)}, 422)
+        except ValueError as e:
+            self.send_json({"error": f"Invalid request: {e}"}, 400)
         except Exception as e:
-            print(f"Failed to read Discord token: {e}")
-            return None
+            print(f"Error patching {self.path}: {e}")
+            self.send_json({"error": str(e)}, 500)
+    
+    def do_OPTIONS(self):
+        # CORS preflight
+        self.read_body()
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PATCH, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-Match, If-None-Match')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
     
     def send_discord_message(self, channel_id, message, mentions=None):
-        """Send a message to Discord channel"""
-        import urllib.request
-        import urllib.error
-        
-        token = self.get_discord_token()
-        if not token:
-            print("No Discord token available")
-            return False
-        
+        """Queue a message for Discord; the outbox worker delivers it in the background"""
         try:
-            webhook_data = {"content": message}
-            if mentions:
-                webhook_data["allowed_mentions"] = {"users": mentions}
-            
-            req = urllib.request.Request(
-                f'https://discord.com/api/v10/channels/{channel_id}/messages',
-                data=json.dumps(webhook_data).encode(),
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bot {token}'
-                },
-                method='POST'
-            )
-            urllib.request.urlopen(req)
-            print(f'Discord message sent to channel {channel_id}')
+            outbox_id = discord_outbox.enqueue(channel_id, message, mentions)
+            print(f'Discord message queued for channel {channel_id} (outbox #{outbox_id})')
             return True
-        except urllib.error.HTTPError as e:
-            print(f"Discord API error: {e.code} - {e.read().decode()}")
-            return False
         except Exception as e:
-            print(f"Failed to send Discord message: {e}")
+            print(f"Failed to queue Discord message: {e}")
             return False
     
     def send_discord_notification(self, idea, plan, channel):
@@ -585,13 +635,29 @@ Cosmo will evaluate and provide recommendations shortly."""
 if __name__ == "__main__":
     os.chdir(DIRECTORY)
     
-    socketserver.TCPServer.allow_reuse_address = True
-    with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
-        print(f"🚀 Dashboard server running at http://localhost:{PORT}")
-        print(f"📁 Serving files from: {os.path.abspath(DIRECTORY)}")
-        print("Press Ctrl+C to stop")
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\n👋 Server stopped")
-            sys.exit(0)
+    system_sampler.start()
+    discord_outbox.start()
+    httpd = PooledHTTPServer(("", PORT), MyHTTPRequestHandler)
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if stopping.is_set():
+            return
+        stopping.set()
+        print("\n⏳ Shutting down, finishing in-flight requests...")
+        # drain() waits for serve_forever to return, so it can't run on this thread
+        threading.Thread(target=httpd.drain, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"🚀 Dashboard server running at http://localhost:{PORT}")
+    print(f"📁 Serving files from: {os.path.abspath(DIRECTORY)}")
+    print(f"🧵 {WORKERS} workers, up to {MAX_CONNECTIONS} connections, keep-alive {KEEPALIVE_TIMEOUT}s")
+    print("Press Ctrl+C to stop")
+    httpd.serve_forever()
+    httpd.pool.shutdown(wait=True)
+    httpd.server_close()
+    discord_outbox.stop(timeout=5)
+    print("👋 Server stopped")
+    sys.exit(0)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Cosmo Dashboard - System Stats Sampler
+Background sampling of CPU, memory and disk shared by every server
+
+A daemon thread reads /proc/stat, /proc/meminfo and statvfs once per tick.
+CPU is the busy share of the jiffies elapsed since the previous tick, for the
+whole machine and each core, not the lifetime average a single /proc/stat
+read gives. Endpoints call latest() and never block.
+"""
+
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+SAMPLE_INTERVAL = 1.0   # Seconds between samples
+HISTORY_SIZE = 300      # Samples kept in the ring buffer (5 min at 1 s)
+
+# Try to import psutil, only needed where /proc is not available
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+
+def read_cpu_times():
+    """{'cpu': (busy, total), 'cpu0': (busy, total), ...} from /proc/stat"""
+    times = {}
+    with open('/proc/stat', 'r') as f:
+        for line in f:
+            if not line.startswith('cpu'):
+                break
+            fields = line.split()
+            # user nice system idle iowait irq softirq steal (guest is already in user)
+            values = [int(x) for x in fields[1:9]]
+            total = sum(values)
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            times[fields[0]] = (total - idle, total)
+    return times
+
+
+def read_memory_percent():
+    mem_total = 0
+    mem_available = 0
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
+            if line.startswith('MemTotal:'):
+                mem_total = int(line.split()[1]) * 1024
+            elif line.startswith('MemAvailable:'):
+                mem_available = int(line.split()[1]) * 1024
+            if mem_total and mem_available:
+                break
+    return ((mem_total - mem_available) / mem_total * 100) if mem_total > 0 else 0
+
+
+def read_disk_percent(path='/'):
+    stat = os.statvfs(path)
+    total = stat.f_blocks * stat.f_frsize
+    free = stat.f_bfree * stat.f_frsize
+    return ((total - free) / total * 100) if total > 0 else 0
+
+
+def cpu_delta(previous, current):
+    busy = current[0] - previous[0]
+    total = current[1] - previous[1]
+    return round(busy / total * 100, 1) if total > 0 else 0.0
+
+
+class SystemSampler:
+    """Samples system stats on a background thread into a ring buffer"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history=HISTORY_SIZE, disk_path='/'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.samples = deque(maxlen=history)
+        self.listeners = []        # Called with every new sample
+        self._use_proc = os.path.exists('/proc/stat')
+        self._cpu_times = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start the sampling thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._prime()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='system-sampler')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _prime(self):
+        """Take the baseline counters the first delta is measured from"""
+        try:
+            if self._use_proc:
+                self._cpu_times = read_cpu_times()
+            elif HAS_PSUTIL:
+                psutil.cpu_percent(interval=None, percpu=True)
+        except Exception as e:
+            print(f"Sampler prime error: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Sampler error: {e}")
+
+    def sample(self):
+        """Take one sample now (deltas are measured from the previous call)"""
+        if self._use_proc:
+            times = read_cpu_times()
+            previous = self._cpu_times or {}
+            self._cpu_times = times
+            cpu = cpu_delta(previous['cpu'], times['cpu']) if 'cpu' in previous else 0.0
+            per_cpu = [
+                cpu_delta(previous[name], times[name]) if name in previous else 0.0
+                for name in sorted((n for n in times if n != 'cpu'), key=lambda n: int(n[3:]))
+            ]
+            memory = read_memory_percent()
+            disk = read_disk_percent(self.disk_path)
+        elif HAS_PSUTIL:
+            per_cpu = psutil.cpu_percent(interval=None, percpu=True)
+            cpu = round(sum(per_cpu) / len(per_cpu), 1) if per_cpu else 0.0
+            memory = psutil.virtual_memory().percent
+            disk = psutil.disk_usage(self.disk_path).percent
+        else:
+            cpu, per_cpu, memory, disk = 0.0, [], 0, 0
+
+        sample = {
+            'cpu': cpu,
+            'memory': round(memory, 1),
+            'disk': round(disk, 1),
+            'per_cpu': per_cpu,
+            'timestamp': datetime.now().isoformat()
+        }
+        self.samples.append(sample)
+        for listener in list(self.listeners):
+            try:
+                listener(sample)
+            except Exception as e:
+                print(f"Sampler listener error: {e}")
+        return sample
+
+    def latest(self):
+        """Most recent sample; never waits for the next tick"""
+        if self._thread is None:
+            self.start()
+        try:
+            return self.samples[-1]
+        except IndexError:
+            # Nothing sampled yet: measure from the baseline taken at start()
+            with self._lock:
+                if not self.samples:
+                    return self.sample()
+            return self.samples[-1]
+
+    def history(self, count=None):
+        """Recent samples, oldest first"""
+        samples = list(self.samples)
+        return samples[-count:] if count else samples
+
+
+sampler = SystemSampler()